@@ -0,0 +1,204 @@
+"""
+Concurrent OpenAI Enrichment Engine for Online Campus
+Runs the batched enrichment prompts on the async OpenAI client with:
+1. A cap on in-flight requests (ENRICH_CONCURRENCY)
+2. Token-bucket pacing against requests-per-minute and tokens-per-minute
+   limits, shared by every call in the process (and so by sync pairs
+   running side by side)
+3. Backoff on 429s that honours the retry-after header, and on 5xx/network errors
+
+Results come back in the same order as the input records. Point
+OPENAI_BASE_URL at a local stub server to exercise it without the real API.
+The openai package is imported, and the client built, only once some city
+misses the gazetteer and the city cache.
+"""
+
+import asyncio
+import random
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from batch_enrich import (
+    MODEL, BATCH_SIZE, SYSTEM_PROMPT, RESPONSE_FORMAT, UNKNOWN, VALIDATION_RETRIES,
+    build_batch_prompt, parse_batch_response, add_usage, local_lookup
+)
+from enrichment_cache import save_cached_location
+from rate_limit import TokenBucket
+from run_report import record_openai_call, record_openai_rows
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+MAX_IN_FLIGHT = int(os.getenv('ENRICH_CONCURRENCY', 8))
+RPM_LIMIT = int(os.getenv('OPENAI_RPM_LIMIT', 500))
+TPM_LIMIT = int(os.getenv('OPENAI_TPM_LIMIT', 200_000))
+MAX_RETRIES = 5
+COMPLETION_TOKENS_PER_RECORD = 10  # {"i":12,"c":"IN"}
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# ============= HELPERS =============
+def shared_buckets(rpm_limit, tpm_limit, max_in_flight):
+    """The process-wide (request, token) buckets for these limits"""
+    key = (rpm_limit, tpm_limit, max_in_flight)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = (TokenBucket(rpm_limit, capacity=max_in_flight), TokenBucket(tpm_limit))
+        return _buckets[key]
+
+def estimate_tokens(prompt, n_records):
+    """Rough prompt + completion token estimate used for TPM pacing"""
+    return (len(SYSTEM_PROMPT) + len(prompt)) // 4 + n_records * COMPLETION_TOKENS_PER_RECORD
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying, preferring the server's retry-after"""
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+def is_retryable(error):
+    from openai import APIConnectionError, APIStatusError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+# ============= ASYNC ENGINE =============
+async def request_batch_async(client, items, semaphore, request_bucket, token_bucket):
+    """Send one batched request with pacing and retries; returns ({id: result}, usage)"""
+    from openai import RateLimitError
+
+    prompt = build_batch_prompt(items)
+    expected_ids = {item_id for item_id, _ in items}
+
+    for attempt in range(MAX_RETRIES + 1):
+        await request_bucket.acquire_async(1)
+        await token_bucket.acquire_async(estimate_tokens(prompt, len(items)))
+        try:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format=RESPONSE_FORMAT,
+                    temperature=0.3
+                )
+        except Exception as e:
+            record_openai_call(time.perf_counter() - start, ok=False)
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                print(f"  ⚠️  Error with OpenAI: {e}")
+                return {}, None
+            delay = retry_delay(e, attempt)
+            if isinstance(e, RateLimitError):
+                # Hold every worker back, not just this one
+                request_bucket.pause(delay)
+            await asyncio.sleep(delay)
+            continue
+
+        record_openai_call(time.perf_counter() - start, response.usage)
+        return parse_batch_response(response.choices[0].message.content, expected_ids), response.usage
+
+    return {}, None
+
+async def request_pending(client, records, pending, results, usage_totals, batch_size,
+                          max_in_flight, rpm_limit, tpm_limit):
+    """
+    Fill results[idx] for every idx in pending from OpenAI, batch_size
+    cities per request; returns the indexes left Unknown after validation
+    retries
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+    unresolved = set()
+    request_bucket, token_bucket = shared_buckets(rpm_limit, tpm_limit, max_in_flight)
+
+    async def run_chunk(chunk, attempt=0):
+        items = [(n, records[idx]['city']) for n, idx in enumerate(chunk, 1)]
+        parsed, usage = await request_batch_async(client, items, semaphore, request_bucket, token_bucket)
+        add_usage(usage_totals, usage)
+
+        missing = []
+        for n, idx in enumerate(chunk, 1):
+            if n in parsed:
+                results[idx] = parsed[n]
+            else:
+                missing.append(idx)
+
+        # Rows dropped or failing validation are asked again, together
+        if missing and attempt < VALIDATION_RETRIES:
+            record_openai_rows(retried=len(missing))
+            await run_chunk(missing, attempt + 1)
+        elif missing:
+            record_openai_rows(unresolved=len(missing))
+            print(f"  ⚠️  {len(missing)} cities still invalid after {VALIDATION_RETRIES} retries, set to Unknown")
+            for idx in missing:
+                results[idx] = dict(UNKNOWN)
+                unresolved.add(idx)
+
+    chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    done = 0
+    for finished in asyncio.as_completed([run_chunk(chunk) for chunk in chunks]):
+        await finished
+        done += 1
+        print(f"      Batches done: {done}/{len(chunks)}")
+    return unresolved
+
+async def enrich_async(records, conn=None, batch_size=BATCH_SIZE, max_in_flight=MAX_IN_FLIGHT,
+                       rpm_limit=RPM_LIMIT, tpm_limit=TPM_LIMIT, client=None):
+    """
+    Enrich {'city', ...} records concurrently.
+
+    Returns (results in input order, usage totals), the same shape as
+    batch_enrich.enrich_batch. Without a client, one is created for the
+    call, and only if some city has to go to OpenAI.
+    """
+    results = [None] * len(records)
+    usage_totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+    # Serve what we can from the gazetteer and city cache first
+    pending = []
+    for idx, record in enumerate(records):
+        cached = local_lookup(conn, record['city'])
+        if cached:
+            results[idx] = cached
+        else:
+            pending.append(idx)
+
+    if not pending:
+        return results, usage_totals
+
+    args = (records, pending, results, usage_totals, batch_size, max_in_flight, rpm_limit, tpm_limit)
+    if client is None:
+        from openai import AsyncOpenAI
+
+        # Closed here, while its event loop is still running
+        async with AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0) as client:
+            unresolved = await request_pending(client, *args)
+    else:
+        unresolved = await request_pending(client, *args)
+
+    if conn is not None:
+        # Unresolved cities are not cached, so the next run asks again
+        for idx in pending:
+            if idx not in unresolved:
+                save_cached_location(conn, records[idx]['city'], results[idx])
+
+    return results, usage_totals
+
+def enrich_concurrent(records, conn=None, batch_size=BATCH_SIZE, **kwargs):
+    """Blocking wrapper around enrich_async for the sync scripts"""
+    return asyncio.run(enrich_async(records, conn, batch_size, **kwargs))
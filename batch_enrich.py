@@ -0,0 +1,212 @@
+"""
+Batched OpenAI Enrichment for Online Campus
+Packs several cities into one chat completion and reads back a compact
+structured-output answer, so the system prompt is paid once per batch
+instead of once per member.
+
+The model only returns the ISO 3166-1 alpha-2 code of each city, in a
+strict JSON schema with short keys: {"r": [{"i": 1, "c": "IN"}, ...]}.
+Codes are checked against the closed list in data/countries.csv, which
+also supplies the country name and continent, so every stored value
+comes from the same table the gazetteer uses. Rows that come back
+missing or with a code outside that list are asked again, on their own
+batch, up to VALIDATION_RETRIES times instead of silently becoming
+"Unknown". Phone numbers are not sent: they are normalized locally by
+phone_normalize once the country is known.
+"""
+
+import json
+import os
+import time
+
+from enrichment_cache import get_cached_location, save_cached_location
+from gazetteer import resolve_location, load_index, COUNTRIES
+from run_report import record_openai_call, record_openai_rows
+
+# Configuration
+MODEL = "gpt-4o-mini"
+BATCH_SIZE = 20
+VALIDATION_RETRIES = 2  # extra requests for the rows whose answer fails validation
+
+UNKNOWN_CODE = "XX"     # the model's answer for a city it cannot place
+SYSTEM_PROMPT = (
+    "Give the ISO 3166-1 alpha-2 country code of each numbered city. "
+    f"Use {UNKNOWN_CODE} if a city cannot be placed."
+)
+
+UNKNOWN = {"country": "Unknown", "continent": "Unknown"}
+
+# Only the shape is enforced by the API; putting every country code in an
+# enum would add ~500 prompt tokens to each request, so codes are checked here
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "countries",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "r": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"i": {"type": "integer"}, "c": {"type": "string"}},
+                        "required": ["i", "c"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["r"],
+            "additionalProperties": False
+        }
+    }
+}
+
+_client = None
+
+# ============= PROMPT / PARSING =============
+def build_batch_prompt(items):
+    """One "id: city" line per (id, city) tuple"""
+    return '\n'.join(f"{item_id}: {' '.join(str(city).split())}" for item_id, city in items)
+
+def validate_code(code):
+    """The {'country', 'continent'} result for a country code, or None if it is not in the closed list"""
+    if not isinstance(code, str):
+        return None
+    code = code.strip().upper()
+    if code == UNKNOWN_CODE:
+        return dict(UNKNOWN)
+    load_index()
+    country = COUNTRIES.get(code)
+    if country is None:
+        return None
+    return {"country": country['name'], "continent": country['continent']}
+
+def parse_batch_response(content, expected_ids):
+    """Return {id: result} for the entries that parsed and validated"""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return {}
+
+    entries = data.get('r') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return {}
+
+    parsed = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            item_id = int(entry.get('i'))
+        except (TypeError, ValueError):
+            continue
+        result = validate_code(entry.get('c'))
+        if item_id in expected_ids and result is not None:
+            parsed[item_id] = result
+    return parsed
+
+def local_lookup(conn, city):
+    """Offline gazetteer first, then the SQLite city cache; None means ask OpenAI"""
+    result = resolve_location(city)
+    if result is None and conn is not None:
+        result = get_cached_location(conn, city)
+    return result
+
+def add_usage(totals, usage):
+    """Accumulate an OpenAI usage object into a plain dict"""
+    if usage:
+        totals['prompt_tokens'] += usage.prompt_tokens
+        totals['completion_tokens'] += usage.completion_tokens
+        totals['total_tokens'] += usage.total_tokens
+
+# ============= OPENAI REQUESTS =============
+def get_client():
+    """The process-wide OpenAI client, imported and built on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return _client
+
+def request_batch(client, items):
+    """Send one batched request; returns ({id: result}, usage)"""
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": build_batch_prompt(items)}
+            ],
+            response_format=RESPONSE_FORMAT,
+            temperature=0.3
+        )
+    except Exception as e:
+        record_openai_call(time.perf_counter() - start, ok=False)
+        print(f"  ⚠️  Error with OpenAI batch: {e}")
+        return {}, None
+    record_openai_call(time.perf_counter() - start, response.usage)
+
+    expected_ids = {item_id for item_id, _ in items}
+    return parse_batch_response(response.choices[0].message.content, expected_ids), response.usage
+
+# ============= BATCH ENRICHMENT =============
+def enrich_batch(client, records, conn=None, batch_size=BATCH_SIZE):
+    """
+    Enrich a list of {'city', ...} records, batch_size rows per request.
+
+    Returns (results in input order, usage totals). Each result is a
+    {'country', 'continent'} dict. With client=None the shared client from
+    get_client() is used, and only built if some city misses the
+    gazetteer and the cache.
+    """
+    results = [None] * len(records)
+    usage_totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+    # Serve what we can from the gazetteer and city cache first
+    pending = []
+    for idx, record in enumerate(records):
+        cached = local_lookup(conn, record['city'])
+        if cached:
+            results[idx] = cached
+        else:
+            pending.append(idx)
+
+    if pending and client is None:
+        client = get_client()
+
+    total_batches = (len(pending) + batch_size - 1) // batch_size
+    for batch_no, start in enumerate(range(0, len(pending), batch_size), 1):
+        chunk = pending[start:start + batch_size]
+        items = [(n, records[idx]['city']) for n, idx in enumerate(chunk, 1)]
+        print(f"      Batch [{batch_no}/{total_batches}] {len(items)} records...")
+
+        parsed, usage = request_batch(client, items)
+        add_usage(usage_totals, usage)
+
+        # Ask again only for the rows that were dropped or failed validation
+        for _ in range(VALIDATION_RETRIES):
+            retry = [(n, city) for n, city in items if n not in parsed]
+            if not retry:
+                break
+            record_openai_rows(retried=len(retry))
+            more, usage = request_batch(client, retry)
+            add_usage(usage_totals, usage)
+            parsed.update(more)
+
+        unresolved = 0
+        for n, idx in enumerate(chunk, 1):
+            if n not in parsed:
+                # Not cached, so the next run asks again
+                unresolved += 1
+                results[idx] = dict(UNKNOWN)
+                continue
+            results[idx] = parsed[n]
+            if conn is not None:
+                save_cached_location(conn, records[idx]['city'], results[idx])
+        if unresolved:
+            record_openai_rows(unresolved=unresolved)
+            print(f"  ⚠️  {unresolved} cities still invalid after {VALIDATION_RETRIES} retries, set to Unknown")
+
+    return results, usage_totals
@@ -0,0 +1,283 @@
+"""
+Offline Benchmark for Online Campus
+Runs the weekly sync and the standalone stage scripts end to end against
+the fakes in fake_backends.py: in-memory Google Sheets (behind the real
+gspread client) and a local stub OpenAI server with latency and rate
+limits. Nothing touches the network and no credentials are needed.
+
+For each size it generates synthetic members, runs every scenario in a
+fresh temporary directory (so sync_tracker.db and the city cache start
+cold) and reports wall time, rows/s, Sheets and OpenAI calls, and peak
+traced memory (tracemalloc) per stage.
+
+Usage:
+    python benchmark.py                              # 1k and 10k rows
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+    python benchmark.py --scenario weekly --openai-latency-ms 800 --openai-rpm 60
+    python benchmark.py --scenario weekly --pairs 4     # four sync pairs side by side
+
+tracemalloc slows Python code down noticeably; use --no-memory when only
+the timings matter. Rows appended to the fake sheets live in the same
+process, so they count towards the peak of the stages that upload. The
+weekly sync's stages run side by side, so their peaks come from its run
+report: traced memory sampled at each chunk boundary, process-wide.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Configuration
+DEFAULT_SIZES = [1000, 10_000]
+EXISTING_MEMBERS = 10
+LEGACY_SOURCE_HEADER = ['Email Address', 'Name', 'City', 'Phone Number']
+
+# Which count each weekly_sync stage's rows/s is based on
+WEEKLY_STAGE_ROWS = {
+    'fetch': 'read', 'validate': 'read', 'merge': 'read', 'dedupe': 'read',
+    'enrich': 'uploaded', 'phones': 'uploaded', 'upload': 'uploaded', 'pipeline': 'read',
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark with fake Sheets and OpenAI backends")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="new rows per run")
+    parser.add_argument('--scenario', choices=['weekly', 'stages', 'all'], default='all')
+    parser.add_argument('--openai-latency-ms', type=float, default=300)
+    parser.add_argument('--openai-jitter-ms', type=float, default=100)
+    parser.add_argument('--openai-rpm', type=int, default=500)
+    parser.add_argument('--openai-tpm', type=int, default=200_000)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-invalid-rate', type=float, default=0.0,
+                        help="share of cities the stub answers with a code outside the country list")
+    parser.add_argument('--sheets-latency-ms', type=float, default=50)
+    parser.add_argument('--sheets-rpm', type=int, default=0,
+                        help="SHEETS_RPM_LIMIT for the run (0: no pacing, the fake has no quota)")
+    parser.add_argument('--pairs', type=int, default=1,
+                        help="weekly scenario: sync pairs run side by side, each with --sizes new rows")
+    parser.add_argument('--unknown-share', type=float, default=0.2,
+                        help="share of cities the gazetteer cannot place")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    parser.add_argument('--verbose', action='store_true', help="show the scripts' own output")
+    return parser.parse_args()
+
+# ============= HELPERS =============
+@contextlib.contextmanager
+def workspace(verbose):
+    """Run in a fresh temporary directory, with the scripts' prints silenced"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='campus-bench-') as path:
+        os.chdir(path)
+        try:
+            if verbose:
+                yield path
+            else:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    yield path
+        finally:
+            os.chdir(previous)
+
+def install_sheets(sheets, source_tab_rows, dest_tab_rows, source=None, dest=None, clear=True):
+    """Load a source and a destination spreadsheet into FakeSheets and make it the shared client"""
+    import sheets_client
+    from sync_config import DEFAULT_SOURCE_SHEET, DEFAULT_DEST_SHEET
+
+    if clear:
+        sheets.spreadsheets.clear()
+    sheets.add_spreadsheet(source or DEFAULT_SOURCE_SHEET, [('Form Responses 1', source_tab_rows)])
+    sheets.add_spreadsheet(dest or DEFAULT_DEST_SHEET, [('Sheet1', []), ('Sheet2', dest_tab_rows)])
+    sheets_client._client = sheets.client()
+
+def install_pairs(sheets, synced, new_by_pair):
+    """One form and one destination per pair, plus the sync_pairs.json naming them"""
+    from fake_backends import source_rows, dest_rows
+    from sync_config import SYNC_CONFIG
+
+    sheets.spreadsheets.clear()
+    pairs = []
+    for n, new in enumerate(new_by_pair, 1):
+        pair = {'name': f'campus{n}', 'source_sheet': f'CAMPUS {n} FORM', 'dest_sheet': f'CAMPUS {n} MAIN'}
+        install_sheets(sheets, source_rows(synced + new), dest_rows(synced),
+                       pair['source_sheet'], pair['dest_sheet'], clear=False)
+        pairs.append(pair)
+    with open(SYNC_CONFIG, 'w') as f:
+        json.dump({'max_parallel': len(pairs), 'pairs': pairs}, f)
+
+def measure(name, rows, fn, memory):
+    """Run fn() once and return its timing, call counts and peak traced memory"""
+    from run_report import METRICS, reset_metrics
+
+    reset_metrics()
+    if memory:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    result = {
+        'stage': name,
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_s': round(rows / seconds, 1) if seconds else None,
+        'sheets_calls': METRICS['sheets']['calls'],
+        'openai_calls': METRICS['openai']['calls'],
+    }
+    if memory:
+        result['peak_mib'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20, 2)
+    return result
+
+# ============= SCENARIOS =============
+def bench_weekly(size, args, sheets, stub):
+    """weekly_sync.sync_weekly() over `size` new form responses (per pair)"""
+    import weekly_sync
+    from fake_backends import make_members, source_rows, dest_rows
+
+    synced = list(make_members(EXISTING_MEMBERS, args.seed + 1, invalid_share=0, repeat_share=0, near_share=0))
+    # Each pair gets its own members, so later pairs do not just hit the city cache
+    new_by_pair = [list(make_members(size, args.seed + 100 * n, args.unknown_share)) for n in range(args.pairs)]
+    stub_before = dict(stub.stats)
+
+    with workspace(args.verbose):
+        if args.pairs == 1:
+            install_sheets(sheets, source_rows(synced + new_by_pair[0]), dest_rows(synced))
+        else:
+            install_pairs(sheets, synced, new_by_pair)
+        total = measure('total', size * args.pairs, weekly_sync.sync_weekly, not args.no_memory)
+        conn = sqlite3.connect(weekly_sync.DB_FILE)
+        report = json.loads(conn.execute('SELECT report FROM runs ORDER BY id DESC LIMIT 1').fetchone()[0])
+        conn.close()
+
+    # sync_weekly's own run report has the per-stage split
+    stages = []
+    for name, seconds in report['stages_s'].items():
+        rows = report['counts'].get(WEEKLY_STAGE_ROWS.get(name), 0)
+        stage = {'stage': name, 'rows': rows, 'seconds': seconds,
+                 'rows_per_s': round(rows / seconds, 1) if rows and seconds else None}
+        if name in report['stages_peak_mib']:
+            stage['peak_mib'] = report['stages_peak_mib'][name]
+        stages.append(stage)
+    stages.append(total)
+
+    if 'pairs' in report['counts']:
+        for name, counts in report['counts']['pairs'].items():
+            stages.append({'stage': name, 'rows': counts['read'], 'seconds': counts['seconds'],
+                           'rows_per_s': round(counts['read'] / counts['seconds'], 1) if counts['seconds'] else None})
+
+    return {
+        'scenario': 'weekly' if args.pairs == 1 else f'weekly x{args.pairs} pairs',
+        'size': size,
+        'status': report['status'],
+        'stages': stages,
+        'counts': report['counts'],
+        'openai_latency_ms': report['openai']['latency_ms'],
+        'openai_rows': {key: report['openai'][key] for key in
+                        ('prompt_tokens', 'completion_tokens', 'retried_rows', 'unresolved_rows')},
+        'stub': {key: stub.stats[key] - stub_before[key] for key in stub.stats},
+    }
+
+def bench_stages(size, args, sheets, stub):
+    """sync_sheets -> enrich_data -> clean_phones -> upload_to_sheets, one at a time"""
+    import sync_sheets
+    import enrich_data
+    import clean_phones
+    import upload_to_sheets
+    from fake_backends import make_members, dest_rows
+
+    synced = list(make_members(EXISTING_MEMBERS, args.seed + 1, invalid_share=0, repeat_share=0, near_share=0))
+    new = list(make_members(size, args.seed, args.unknown_share))
+    stub_before = dict(stub.stats)
+    memory = not args.no_memory
+
+    with workspace(args.verbose):
+        # The stage scripts expect Email, Name, City, Phone in columns A-D
+        install_sheets(sheets, [LEGACY_SOURCE_HEADER] + [list(member) for member in new], dest_rows(synced))
+        stages = [
+            measure('sync_sheets', size, sync_sheets.sync_sheets, memory),
+            measure('enrich_data', size, enrich_data.process_newcomers, memory),
+            measure('clean_phones', size, clean_phones.process_phone_numbers, memory),
+            measure('upload_to_sheets', size, upload_to_sheets.upload_to_sheets, memory),
+        ]
+
+    total = {'stage': 'total', 'rows': size, 'seconds': round(sum(stage['seconds'] for stage in stages), 3)}
+    total['rows_per_s'] = round(size / total['seconds'], 1) if total['seconds'] else None
+    if memory:
+        total['peak_mib'] = max(stage['peak_mib'] for stage in stages)
+    return {
+        'scenario': 'stages',
+        'size': size,
+        'status': 'completed',
+        'stages': stages + [total],
+        'stub': {key: stub.stats[key] - stub_before[key] for key in stub.stats},
+    }
+
+# ============= OUTPUT =============
+def print_result(result):
+    print(f"\n{result['scenario']} - {result['size']:,} rows ({result['status']})")
+    print(f"  {'stage':<18}{'rows':>9}{'seconds':>10}{'rows/s':>12}{'sheets':>8}{'openai':>8}{'peak MiB':>10}")
+    for stage in result['stages']:
+        rate = f"{stage['rows_per_s']:,.0f}" if stage.get('rows_per_s') else '-'
+        print(f"  {stage['stage']:<18}{stage['rows']:>9,}{stage['seconds']:>10.3f}{rate:>12}"
+              f"{stage.get('sheets_calls', ''):>8}{stage.get('openai_calls', ''):>8}{stage.get('peak_mib', ''):>10}")
+    stub = result['stub']
+    print(f"  stub OpenAI: {stub['requests']} requests, {stub['cities']} cities, "
+          f"{stub['rate_limited']} rate limited, {stub['errors']} errors, {stub['invalid']} invalid answers")
+    if result.get('openai_latency_ms'):
+        print(f"  OpenAI latency (ms): {result['openai_latency_ms']}")
+    if result.get('openai_rows'):
+        print(f"  OpenAI rows/tokens: {result['openai_rows']}")
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ['SHEETS_RPM_LIMIT'] = str(args.sheets_rpm)
+    from fake_backends import FakeSheets, StubOpenAIServer
+
+    stub = StubOpenAIServer(
+        latency=args.openai_latency_ms / 1000,
+        jitter=args.openai_jitter_ms / 1000,
+        rpm=args.openai_rpm,
+        tpm=args.openai_tpm,
+        error_rate=args.openai_error_rate,
+        invalid_rate=args.openai_invalid_rate,
+        seed=args.seed,
+    ).start()
+    # Set before the enrichment modules are imported: they build their clients from these
+    os.environ['OPENAI_BASE_URL'] = stub.url
+    os.environ['OPENAI_API_KEY'] = 'benchmark'
+    sheets = FakeSheets(latency=args.sheets_latency_ms / 1000)
+
+    # Load the gazetteer up front so the first run does not pay for it
+    from gazetteer import load_index
+    load_index()
+
+    scenarios = ['weekly', 'stages'] if args.scenario == 'all' else [args.scenario]
+    benches = {'weekly': bench_weekly, 'stages': bench_stages}
+
+    if not args.no_memory:
+        tracemalloc.start()
+    results = []
+    try:
+        for size in args.sizes:
+            for scenario in scenarios:
+                result = benches[scenario](size, args, sheets, stub)
+                print_result(result)
+                results.append(result)
+    finally:
+        stub.stop()
+        if not args.no_memory:
+            tracemalloc.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+        print(f"\n📝 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
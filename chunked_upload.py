@@ -0,0 +1,189 @@
+"""
+Chunked, Resumable Uploader for Online Campus
+Appends rows to the destination sheet UPLOAD_CHUNK_SIZE rows at a time
+instead of one append_rows call for the whole batch.
+
+Every chunk is written to an upload_chunks commit log in sync_tracker.db,
+keyed by an idempotency key (a hash of the destination and all the rows).
+Re-running the same upload after a crash skips chunks that were already
+committed. A chunk left 'pending' (the process died mid-call) is checked
+against the destination tail before it is sent again, so no row is
+appended twice. After a successful run, committed entries older than
+UPLOAD_LOG_DAYS are pruned, so the log stays the size of recent uploads.
+
+upload_rows() reports where each chunk landed: from the append response,
+from the tail probe that found it already written, or from the range the
+commit log stored for it.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import time
+
+from dest_tail import init_dest_tail, probe_tail, record_append
+
+# Configuration
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 500))
+UPLOAD_LOG_DAYS = int(os.getenv('UPLOAD_LOG_DAYS', 30))
+MAX_UPLOAD_RETRIES = 5
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# ============= DATABASE FUNCTIONS =============
+def init_upload_log(conn):
+    """Create the chunk commit log if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_chunks (
+            upload_id TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            dest_sheet TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            last_email TEXT,
+            status TEXT NOT NULL,
+            updated_range TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (upload_id, chunk_index)
+        )
+    ''')
+    conn.commit()
+    init_dest_tail(conn)
+    return conn
+
+def get_chunk_status(conn, upload_id, chunk_index):
+    """Return (status, updated_range) of a chunk, or (None, None) if it was never sent"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT status, updated_range FROM upload_chunks WHERE upload_id = ? AND chunk_index = ?',
+        (upload_id, chunk_index)
+    )
+    row = cursor.fetchone()
+    return tuple(row) if row else (None, None)
+
+def set_chunk_status(conn, upload_id, chunk_index, dest_sheet, chunk, status, updated_range=None):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO upload_chunks
+            (upload_id, chunk_index, dest_sheet, row_count, last_email, status, updated_range, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(upload_id, chunk_index) DO UPDATE SET
+            status = excluded.status,
+            updated_range = COALESCE(excluded.updated_range, upload_chunks.updated_range),
+            updated_at = excluded.updated_at
+    ''', (upload_id, chunk_index, dest_sheet, len(chunk), chunk[-1][0], status, updated_range))
+    conn.commit()
+
+def prune_upload_log(conn, dest_sheet, days=UPLOAD_LOG_DAYS):
+    """Drop committed chunks older than days; returns how many were dropped"""
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM upload_chunks WHERE dest_sheet = ? AND status = 'committed' AND updated_at < datetime('now', ?)",
+        (dest_sheet, f'-{days} days')
+    )
+    conn.commit()
+    return cursor.rowcount
+
+# ============= HELPERS =============
+def upload_key(dest_sheet, rows):
+    """Idempotency key: the same rows to the same sheet always hash the same"""
+    payload = json.dumps([dest_sheet, [[str(cell) for cell in row] for row in rows]])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def status_code(error):
+    from gspread.exceptions import APIError
+
+    if isinstance(error, APIError):
+        return error.response.status_code
+    return None
+
+def is_retryable(error):
+    from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+    if isinstance(error, (RequestsConnectionError, Timeout)):
+        return True
+    return status_code(error) in RETRYABLE_STATUS
+
+def range_first_row(updated_range):
+    """First row number of an A1 range such as "Sheet2!A102:F104", or None"""
+    match = re.search(r'(?:^|!)[A-Z]+(\d+)', updated_range or '')
+    return int(match.group(1)) if match else None
+
+def written_range(first_row, chunk):
+    """The column A range a chunk occupies, for a chunk found already written"""
+    return f'A{first_row}:A{first_row + len(chunk) - 1}'
+
+def chunk_already_written(worksheet, chunk):
+    """
+    First destination row of this chunk if the last len(chunk) rows of the
+    destination are its emails, else None
+    """
+    last_row, _ = probe_tail(worksheet)
+    if last_row < len(chunk):
+        return None
+    first_row = last_row - len(chunk) + 1
+    values = worksheet.get(f'A{first_row}:A{last_row}')
+    written = [row[0] if row else '' for row in values]
+    return first_row if written == [str(row[0]) for row in chunk] else None
+
+def append_with_retry(worksheet, chunk):
+    """
+    append_rows with exponential backoff on 429/5xx and network errors.
+    Returns the append response; for a failed call that had in fact landed,
+    a response carrying the range the probe found it at.
+    """
+    for attempt in range(MAX_UPLOAD_RETRIES + 1):
+        try:
+            return worksheet.append_rows(chunk)
+        except Exception as e:
+            if attempt == MAX_UPLOAD_RETRIES or not is_retryable(e):
+                raise
+            # The failed call may still have landed: never send it twice
+            first_row = chunk_already_written(worksheet, chunk)
+            if first_row:
+                return {'updates': {'updatedRange': written_range(first_row, chunk)}}
+            delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+            print(f"      ⚠️  Upload failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+# ============= UPLOAD =============
+def upload_rows(conn, dest_sheet, worksheet, rows, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Append rows in chunks, resuming from the commit log.
+
+    Returns [(first_row, chunk)] for every chunk, including ones an earlier,
+    interrupted run already committed. first_row is the destination row the
+    chunk starts at, or None if that is not known (a chunk committed before
+    the log kept ranges).
+    """
+    init_upload_log(conn)
+    upload_id = upload_key(dest_sheet, rows)
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    placed = []
+
+    for chunk_index, chunk in enumerate(chunks):
+        status, updated_range = get_chunk_status(conn, upload_id, chunk_index)
+        if status == 'committed':
+            print(f"      Chunk [{chunk_index + 1}/{len(chunks)}] already uploaded, skipping")
+            placed.append((range_first_row(updated_range), chunk))
+            continue
+        first_row = chunk_already_written(worksheet, chunk) if status == 'pending' else None
+        if first_row:
+            print(f"      Chunk [{chunk_index + 1}/{len(chunks)}] found in destination, marking uploaded")
+            updated_range = written_range(first_row, chunk)
+            set_chunk_status(conn, upload_id, chunk_index, dest_sheet, chunk, 'committed', updated_range)
+            record_append(conn, dest_sheet, {'updates': {'updatedRange': updated_range}}, chunk[-1][0])
+            placed.append((first_row, chunk))
+            continue
+
+        set_chunk_status(conn, upload_id, chunk_index, dest_sheet, chunk, 'pending')
+        response = append_with_retry(worksheet, chunk)
+        updated_range = (response or {}).get('updates', {}).get('updatedRange')
+        set_chunk_status(conn, upload_id, chunk_index, dest_sheet, chunk, 'committed', updated_range)
+        record_append(conn, dest_sheet, response, chunk[-1][0])
+        placed.append((range_first_row(updated_range), chunk))
+
+        print(f"      Chunk [{chunk_index + 1}/{len(chunks)}] uploaded {len(chunk)} rows")
+
+    return placed
@@ -1,44 +1,53 @@
-from openpyxl import load_workbook
-import re
+from phone_normalize import sheet_phone, OK as PHONE_OK
+from parallel_clean import normalize_phones, regroup
+from intermediate import read_chunks, TableWriter, export_xlsx, EXPORT_XLSX
 
 # Configuration
-INPUT_FILE = "newcomers_enriched.xlsx"
-OUTPUT_FILE = "newcomers_final.xlsx"
-
-def clean_phone_number(phone):
-    """Remove all non-digit characters from phone number"""
-    if not phone:
-        return phone
-    # Keep only digits
-    cleaned = re.sub(r'[^0-9]', '', str(phone))
-    return cleaned
+INPUT_NAME = "newcomers_enriched"
+OUTPUT_NAME = "newcomers_final"
+MAX_FLAGGED_SHOWN = 50
 
 def process_phone_numbers():
-    print(f"Loading {INPUT_FILE}...")
-    wb = load_workbook(INPUT_FILE)
-    ws = wb.active
-    
-    # Find the Phone Number column (should be column 4, index D)
-    phone_col_idx = 4  # Column D (1-indexed)
-    
-    total_rows = ws.max_row - 1
-    print(f"Processing {total_rows} phone numbers...\n")
-    
-    # Process each row (skip header)
-    for row_idx in range(2, ws.max_row + 1):
-        original_phone = ws.cell(row=row_idx, column=phone_col_idx).value
-        cleaned_phone = clean_phone_number(original_phone)
-        
-        # Update the cell
-        ws.cell(row=row_idx, column=phone_col_idx).value = cleaned_phone
-        
-        if original_phone != cleaned_phone:
-            print(f"Row {row_idx-1}: {original_phone} → {cleaned_phone}")
-    
+    print(f"Loading {INPUT_NAME}...")
+
+    # Phone Number is column D, Country is column E (0-indexed below)
+    phone_col_idx = 3
+    country_col_idx = 4
+
+    header, chunks = read_chunks(INPUT_NAME)
+    output = TableWriter(OUTPUT_NAME, header, title="Enriched Newcomers")
+
+    # Stream the rows chunk by chunk (skip header), normalizing each chunk in one pass;
+    # with CLEAN_WORKERS set, chunks are regrouped so each spreads over the worker pool
+    total_rows = 0
+    flagged_count = 0
+    for rows in regroup(chunks):
+        results = normalize_phones(
+            [row[phone_col_idx] for row in rows],
+            [row[country_col_idx] for row in rows]
+        )
+        for row, (phone, status) in zip(rows, results):
+            total_rows += 1
+            original_phone = row[phone_col_idx]
+            row[phone_col_idx] = sheet_phone(phone)
+            output.append(row)
+
+            if status != PHONE_OK:
+                flagged_count += 1
+                if flagged_count <= MAX_FLAGGED_SHOWN:
+                    print(f"Row {total_rows}: {original_phone} flagged ({status})")
+        print(f"Processed {total_rows} phone numbers...")
+
+    if flagged_count > MAX_FLAGGED_SHOWN:
+        print(f"... and {flagged_count - MAX_FLAGGED_SHOWN} more flagged rows")
+
     # Save the file
-    wb.save(OUTPUT_FILE)
-    print(f"\n✅ Saved cleaned data to {OUTPUT_FILE}")
+    output.close()
+    print(f"\n✅ Saved cleaned data to {output.path}")
+    if EXPORT_XLSX:
+        print(f"📄 Exported a copy to {export_xlsx(OUTPUT_NAME, 'Enriched Newcomers')}")
     print(f"Total records processed: {total_rows}")
+    print(f"Flagged phone numbers: {flagged_count}")
 
 if __name__ == "__main__":
     try:
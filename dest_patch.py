@@ -0,0 +1,262 @@
+"""
+Diff-and-Patch Writer for Online Campus
+Corrects rows already in the destination sheet in place, instead of
+editing them by hand: after a change to clean_name, the phone rules or
+the gazetteer, the fixed values are written back over the old ones.
+
+Only cells whose value actually changes are sent. Changed cells next to
+each other in a row become one range, and ranges covering the same
+columns on consecutive rows are stacked into one rectangle, so a rule
+change touching a whole column goes out as a single range. Rectangles are
+packed into values:batchUpdate calls of up to PATCH_MAX_CELLS cells, so
+even 10k rows take a handful of API calls.
+
+    python dest_patch.py --rules names phones countries --dry-run
+    python dest_patch.py --rules names --pair kochi
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from batch_validate import clean_name, NAME_SUFFIX
+from gazetteer import resolve_location
+from phone_normalize import normalize_phones, sheet_phone, OK as PHONE_OK
+
+# Configuration
+DB_FILE = 'sync_tracker.db'
+PATCH_MAX_CELLS = int(os.getenv('PATCH_MAX_CELLS', 40_000))  # per values:batchUpdate call
+MAX_PATCH_RETRIES = 5
+DEST_FIRST_ROW = 2   # row 1 is the header
+DEST_RANGE_END = 'F'
+EMAIL, NAME, CITY, PHONE, COUNTRY, CONTINENT = range(6)
+RULES = ('names', 'phones', 'countries')
+
+# ============= DIFF =============
+def column_letter(col):
+    """1 -> A, 27 -> AA"""
+    letters = ''
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def diff_rows(current, desired, first_row=DEST_FIRST_ROW):
+    """
+    {(row, col): value} for every cell where desired differs from current.
+    Rows are lists of cell values starting at column A; a None in desired
+    leaves that cell as it is.
+    """
+    changes = {}
+    for offset, (old, new) in enumerate(zip(current, desired)):
+        for col, value in enumerate(new, 1):
+            if value is None:
+                continue
+            before = old[col - 1] if col <= len(old) else ''
+            if str(before) != str(value):
+                changes[(first_row + offset, col)] = value
+    return changes
+
+def row_runs(rows):
+    """Group sorted row numbers into [first, last] runs of consecutive rows"""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return runs
+
+def read_rows(worksheet, rows, last_column=DEST_RANGE_END):
+    """{row: values} for the given rows, read in one batch_get (consecutive rows as one range)"""
+    runs = row_runs(sorted(set(rows)))
+    if not runs:
+        return {}
+    blocks = worksheet.batch_get([f'A{first}:{last_column}{last}' for first, last in runs])
+    values = {}
+    for (first, last), block in zip(runs, blocks):
+        for row in range(first, last + 1):
+            offset = row - first
+            values[row] = list(block[offset]) if offset < len(block) else []
+    return values
+
+# ============= COALESCING =============
+def row_segments(changes):
+    """Runs of adjacent changed cells in each row: [(row, first_col, values)] in sheet order"""
+    segments = []
+    for row, col in sorted(changes):
+        last = segments[-1] if segments else None
+        if last and last[0] == row and last[1] + len(last[2]) == col:
+            last[2].append(changes[(row, col)])
+        else:
+            segments.append((row, col, [changes[(row, col)]]))
+    return segments
+
+def coalesce(changes):
+    """
+    Merge changed cells into rectangles [(top_row, first_col, rows of values)]:
+    row segments spanning the same columns on consecutive rows are stacked.
+    """
+    rectangles = []
+    open_by_span = {}   # (first_col, width) -> rectangle whose last row is the previous one
+    for row, col, values in row_segments(changes):
+        span = (col, len(values))
+        rectangle = open_by_span.get(span)
+        if rectangle is not None and rectangle[0] + len(rectangle[2]) == row:
+            rectangle[2].append(values)
+        else:
+            rectangle = (row, col, [values])
+            rectangles.append(rectangle)
+            open_by_span[span] = rectangle
+    return rectangles
+
+def a1_range(top, col, values):
+    bottom = top + len(values) - 1
+    right = col + len(values[0]) - 1
+    return f"{column_letter(col)}{top}:{column_letter(right)}{bottom}"
+
+def pack_calls(rectangles, max_cells=PATCH_MAX_CELLS):
+    """Group rectangles into batchUpdate bodies of at most max_cells cells (a bigger rectangle is split by rows)"""
+    calls, data, cells = [], [], 0
+    for top, col, values in rectangles:
+        width = len(values[0])
+        step = max(1, max_cells // width)
+        for start in range(0, len(values), step):
+            block = values[start:start + step]
+            size = width * len(block)
+            if data and cells + size > max_cells:
+                calls.append(data)
+                data, cells = [], 0
+            data.append({'range': a1_range(top + start, col, block), 'values': block})
+            cells += size
+    if data:
+        calls.append(data)
+    return calls
+
+# ============= SENDING =============
+def update_with_retry(worksheet, data):
+    """values:batchUpdate with backoff on 429/5xx; rewriting the same values is harmless"""
+    from chunked_upload import is_retryable
+
+    for attempt in range(MAX_PATCH_RETRIES + 1):
+        try:
+            return worksheet.batch_update([dict(item) for item in data])
+        except Exception as e:
+            if attempt == MAX_PATCH_RETRIES or not is_retryable(e):
+                raise
+            delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+            print(f"      ⚠️  Patch failed ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+def patch_cells(worksheet, changes, max_cells=PATCH_MAX_CELLS, dry_run=False):
+    """
+    Write {(row, col): value} changes in as few ranges and calls as possible.
+    Returns {'cells', 'ranges', 'calls'}.
+    """
+    calls = pack_calls(coalesce(changes), max_cells)
+    stats = {'cells': len(changes), 'ranges': sum(len(data) for data in calls), 'calls': len(calls)}
+    if not dry_run:
+        for data in calls:
+            update_with_retry(worksheet, data)
+    return stats
+
+def patch_rows(worksheet, current, desired, first_row=DEST_FIRST_ROW, dry_run=False):
+    """Diff desired rows against the current ones and write only the changed cells"""
+    return patch_cells(worksheet, diff_rows(current, desired, first_row), dry_run=dry_run)
+
+# ============= CORRECTION RULES =============
+def reclean_name(name):
+    """clean_name() again, on a name that already carries the suffix"""
+    name = str(name or '')
+    base = name[:-len(NAME_SUFFIX)] if name.endswith(NAME_SUFFIX) else name
+    return clean_name(base) if base.strip() else name
+
+def apply_rules(rows, rules):
+    """Desired rows for the current destination rows under the given rules (None = unchanged)"""
+    desired = [[None] * (CONTINENT + 1) for _ in rows]
+    padded = [list(row) + [''] * (CONTINENT + 1 - len(row)) for row in rows]
+
+    if 'countries' in rules:
+        for row, want in zip(padded, desired):
+            location = resolve_location(row[CITY]) if row[CITY] else None
+            if location:
+                want[COUNTRY], want[CONTINENT] = location['country'], location['continent']
+                row[COUNTRY], row[CONTINENT] = location['country'], location['continent']
+
+    if 'names' in rules:
+        for row, want in zip(padded, desired):
+            if row[NAME]:
+                want[NAME] = reclean_name(row[NAME])
+
+    if 'phones' in rules:
+        # Sheet phones are E.164 digits without the '+'; only numbers that
+        # now validate for the row's country are rewritten
+        phones = normalize_phones([row[PHONE] for row in padded], [row[COUNTRY] for row in padded])
+        for row, want, (phone, status) in zip(padded, desired, phones):
+            if row[PHONE] and status == PHONE_OK:
+                want[PHONE] = sheet_phone(phone)
+
+    return desired
+
+def correct_pair(conn, pair, rules, dry_run=False):
+    """Read one destination once, apply the rules and patch the differences"""
+    from run_report import stage_timer
+    from sheets_client import open_worksheet
+
+    dest = pair['dest_sheet']
+    print(f"\n▶️  {pair['name']}: {dest}")
+    worksheet = open_worksheet(conn, dest, pair['dest_tab'])
+
+    with stage_timer('fetch'):
+        current = worksheet.get(f'A{DEST_FIRST_ROW}:{DEST_RANGE_END}')
+    with stage_timer('diff'):
+        desired = apply_rules(current, rules)
+    with stage_timer('upload'):
+        stats = patch_rows(worksheet, current, desired, dry_run=dry_run)
+
+    stats['rows'] = len(current)
+    verb = 'Would patch' if dry_run else 'Patched'
+    print(f"      {verb} {stats['cells']} cells in {stats['ranges']} ranges, "
+          f"{stats['calls']} API calls ({stats['rows']} rows read)")
+    return stats
+
+def correct_destinations(rules, pair_names=None, dry_run=False):
+    from run_report import init_runs, start_run, finish_run
+    from sheets_client import init_sheet_ids
+    from sync_config import load_pairs
+
+    print("=" * 60)
+    print(f"ONLINE CAMPUS DESTINATION CORRECTIONS ({', '.join(rules)})")
+    print("=" * 60)
+
+    conn = init_runs(init_sheet_ids(sqlite3.connect(DB_FILE)))
+    run = start_run('dest_patch')
+    totals = {'rows': 0, 'cells': 0, 'ranges': 0, 'calls': 0}
+    status = 'failed'
+    try:
+        for pair in load_pairs(names=pair_names):
+            for key, value in correct_pair(conn, pair, rules, dry_run).items():
+                totals[key] += value
+        status = 'dry_run' if dry_run else 'completed'
+    finally:
+        finish_run(conn, run, status, dict(totals, read=totals['rows']))
+        conn.close()
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-apply cleaning rules to rows already in the destination sheets")
+    parser.add_argument('--rules', nargs='+', choices=RULES, required=True,
+                        help="names: clean_name again; phones: E.164 for the row's country; "
+                             "countries: country/continent from the gazetteer")
+    parser.add_argument('--pair', action='append', dest='pairs', metavar='NAME',
+                        help="only correct this pair's destination (repeatable)")
+    parser.add_argument('--dry-run', action='store_true', help="count the changes without writing them")
+    args = parser.parse_args()
+
+    try:
+        correct_destinations(args.rules, args.pairs, args.dry_run)
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        exit(1)
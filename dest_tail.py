@@ -0,0 +1,91 @@
+"""
+Destination Tail Probe for Online Campus
+Finds the last non-empty row of EFAMILY MAIN Sheet2 without downloading
+the whole sheet. It uses the worksheet's row count (already known from
+opening the spreadsheet) and reads a small window of column A upwards
+from the bottom.
+
+The result is cached in sync_tracker.db and refreshed after every append.
+Only when the probe and the cached tail disagree do we scan the full
+column to settle it.
+"""
+
+import re
+
+# Configuration
+PROBE_WINDOW = 50
+EMAIL_COLUMN = 'A'
+
+# ============= DATABASE FUNCTIONS =============
+def init_dest_tail(conn):
+    """Create the destination tail table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dest_tail (
+            dest_sheet TEXT PRIMARY KEY,
+            last_row INTEGER NOT NULL,
+            last_email TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def get_cached_tail(conn, dest_sheet):
+    """Return (last_row, last_email) from the last run, or None"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT last_row, last_email FROM dest_tail WHERE dest_sheet = ?', (dest_sheet,))
+    return cursor.fetchone()
+
+def save_tail(conn, dest_sheet, last_row, last_email):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO dest_tail (dest_sheet, last_row, last_email, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(dest_sheet) DO UPDATE SET
+            last_row = excluded.last_row,
+            last_email = excluded.last_email,
+            updated_at = excluded.updated_at
+    ''', (dest_sheet, last_row, last_email))
+    conn.commit()
+
+# ============= PROBING =============
+def probe_tail(worksheet, window=PROBE_WINDOW):
+    """Return (last_row, last_email) by reading column A from the bottom up"""
+    end = worksheet.row_count
+    while end >= 1:
+        start = max(1, end - window + 1)
+        values = worksheet.get(f'{EMAIL_COLUMN}{start}:{EMAIL_COLUMN}{end}')
+        for offset in range(len(values) - 1, -1, -1):
+            if values[offset] and str(values[offset][0]).strip():
+                return start + offset, values[offset][0]
+        end = start - 1
+        window *= 2
+    return 0, None
+
+def scan_tail(worksheet):
+    """Full column scan, used only to settle a disagreement"""
+    column = worksheet.col_values(1)
+    for idx in range(len(column) - 1, -1, -1):
+        if str(column[idx]).strip():
+            return idx + 1, column[idx]
+    return 0, None
+
+def get_dest_tail(conn, dest_sheet, worksheet):
+    """Return (last_row, last_email) of the destination, probing first"""
+    tail = probe_tail(worksheet)
+    cached = get_cached_tail(conn, dest_sheet)
+
+    if cached is not None and tuple(cached) != tail:
+        print(f"      ⚠️  Destination tail moved (cached row {cached[0]}, probe row {tail[0]}), rescanning")
+        tail = scan_tail(worksheet)
+
+    save_tail(conn, dest_sheet, *tail)
+    return tail
+
+def record_append(conn, dest_sheet, response, last_email):
+    """Update the cached tail from an append_rows response"""
+    updated_range = (response or {}).get('updates', {}).get('updatedRange', '')
+    match = re.search(r'(\d+)$', updated_range)
+    if match:
+        save_tail(conn, dest_sheet, int(match.group(1)), last_email)
@@ -0,0 +1,190 @@
+"""
+Member Email Index for Online Campus
+Keeps two lookups in sync_tracker.db, both keyed on the normalized
+(trimmed, lowercased) email:
+
+- source_emails: where an email first appears in the form sheet, so the
+  sync boundary is found with one indexed lookup plus a range read instead
+  of a linear scan over get_all_values()
+- member_emails: every member already in the destination, with a unique
+  index, so people who submit the form twice are dropped before we pay
+  OpenAI to enrich them again
+
+Run this file directly to seed member_emails in bulk from the current
+destination sheet of every configured sync pair.
+"""
+
+import sqlite3
+
+from source_watermark import SOURCE_RANGE_END, pad_row
+
+# Configuration
+DB_FILE = 'sync_tracker.db'
+
+# ============= DATABASE FUNCTIONS =============
+def init_email_index(conn):
+    """Create the email index tables if they do not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS member_emails (
+            dest_sheet TEXT NOT NULL,
+            email_norm TEXT NOT NULL,
+            dest_row INTEGER,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_member_emails
+        ON member_emails (dest_sheet, email_norm)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS source_emails (
+            source_sheet TEXT NOT NULL,
+            email_norm TEXT NOT NULL,
+            source_row INTEGER NOT NULL,
+            PRIMARY KEY (source_sheet, email_norm)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def normalize_email(email):
+    return str(email or '').strip().lower()
+
+# ============= SOURCE BOUNDARY =============
+def index_source_rows(conn, source_sheet, first_row_number, rows):
+    """Record the sheet row of every email in a block of source rows (first occurrence wins)"""
+    index_numbered_rows(conn, source_sheet, enumerate(rows, first_row_number))
+
+def index_numbered_rows(conn, source_sheet, numbered_rows):
+    """Like index_source_rows, for (row_number, row) pairs that need not be consecutive"""
+    entries = [
+        (source_sheet, normalize_email(row[1]), row_number)
+        for row_number, row in numbered_rows
+        if len(row) > 1 and normalize_email(row[1])
+    ]
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT OR IGNORE INTO source_emails (source_sheet, email_norm, source_row) VALUES (?, ?, ?)',
+        entries
+    )
+    conn.commit()
+
+def reindex_source(conn, source_sheet, rows):
+    """Rebuild a sheet's index from a full read (rows[0] is sheet row 1), forgetting rows that moved"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM source_emails WHERE source_sheet = ?', (source_sheet,))
+    index_source_rows(conn, source_sheet, 1, rows)
+
+def find_source_row(conn, source_sheet, email):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT source_row FROM source_emails WHERE source_sheet = ? AND email_norm = ?',
+        (source_sheet, normalize_email(email))
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def locate_boundary(conn, source_sheet, worksheet, email):
+    """
+    Find email in the source via the index and read from that row on.
+
+    Returns (boundary_row, rows) with rows[0] being the boundary row itself,
+    or None when the email is not indexed or that row no longer holds it.
+    """
+    boundary_row = find_source_row(conn, source_sheet, email)
+    if boundary_row is None:
+        return None
+
+    values = worksheet.get(f'A{boundary_row}:{SOURCE_RANGE_END}')
+    if not values or len(values[0]) < 2 or normalize_email(values[0][1]) != normalize_email(email):
+        return None
+
+    rows = [pad_row(row) for row in values]
+    index_source_rows(conn, source_sheet, boundary_row, rows)
+    return boundary_row, rows
+
+# ============= DESTINATION MEMBERS =============
+def member_count(conn, dest_sheet):
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM member_emails WHERE dest_sheet = ?', (dest_sheet,))
+    return cursor.fetchone()[0]
+
+def add_members(conn, dest_sheet, emails, first_dest_row=None):
+    """Bulk-insert emails now present in the destination"""
+    entries = [
+        (dest_sheet, normalize_email(email), first_dest_row + offset if first_dest_row else None)
+        for offset, email in enumerate(emails)
+        if normalize_email(email)
+    ]
+    cursor = conn.cursor()
+    cursor.executemany(
+        'INSERT OR IGNORE INTO member_emails (dest_sheet, email_norm, dest_row) VALUES (?, ?, ?)',
+        entries
+    )
+    conn.commit()
+
+def seed_from_destination(conn, dest_sheet, worksheet):
+    """Load every email in column A of the destination into the index"""
+    column = worksheet.col_values(1)
+    # Row 1 is the header
+    add_members(conn, dest_sheet, column[1:], first_dest_row=2)
+    return member_count(conn, dest_sheet)
+
+def find_member_rows(conn, dest_sheet, emails):
+    """{normalized email: destination row} for the given emails that are members with a known row"""
+    keys = list({normalize_email(email) for email in emails})
+    cursor = conn.cursor()
+    rows = {}
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        cursor.execute(
+            f'SELECT email_norm, dest_row FROM member_emails WHERE dest_sheet = ? '
+            f'AND dest_row IS NOT NULL AND email_norm IN ({",".join("?" * len(batch))})',
+            [dest_sheet] + batch
+        )
+        rows.update(cursor.fetchall())
+    return rows
+
+def is_known_member(conn, dest_sheet, email):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT 1 FROM member_emails WHERE dest_sheet = ? AND email_norm = ?',
+        (dest_sheet, normalize_email(email))
+    )
+    return cursor.fetchone() is not None
+
+def drop_known_members(conn, dest_sheet, records, seen=None):
+    """
+    Split {'email', ...} records into (new, duplicates), also catching
+    repeats within the batch. Pass the same `seen` set across calls to
+    catch repeats across chunks of a stream.
+    """
+    if seen is None:
+        seen = set()
+    new_records, duplicates = [], []
+    for record in records:
+        key = normalize_email(record['email'])
+        if key in seen or is_known_member(conn, dest_sheet, key):
+            duplicates.append(record)
+        else:
+            seen.add(key)
+            new_records.append(record)
+    return new_records, duplicates
+
+if __name__ == "__main__":
+    from sheets_client import init_sheet_ids, open_worksheet
+    from sync_config import load_pairs
+
+    try:
+        conn = init_sheet_ids(init_email_index(sqlite3.connect(DB_FILE)))
+        for pair in load_pairs():
+            dest = pair['dest_sheet']
+            dest_sheet2 = open_worksheet(conn, dest, pair['dest_tab'])
+
+            print(f"Seeding email index from {dest}...")
+            total = seed_from_destination(conn, dest, dest_sheet2)
+            print(f"✅ Email index for {dest} now holds {total:,} members")
+        conn.close()
+    except Exception as e:
+        print(f"Error: {e}")
@@ -1,7 +1,8 @@
-from openai import OpenAI
-from openpyxl import load_workbook, Workbook
-import json
 from dotenv import load_dotenv
+from enrichment_cache import open_cache, cache_summary
+from gazetteer import gazetteer_summary
+from batch_enrich import enrich_batch, BATCH_SIZE
+from intermediate import read_chunks, TableWriter
 import os
 
 # Load environment variables
@@ -9,113 +10,67 @@ load_dotenv()
 
 # Configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-INPUT_FILE = "newcomers.xlsx"
-OUTPUT_FILE = "newcomers_enriched.xlsx"
-
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def get_location_and_phone_info(city, phone):
-    """Use OpenAI to get country, continent, and validate phone number"""
-    
-    prompt = f"""Given the following information:
-City: {city}
-Phone: {phone}
-
-Please provide a JSON response with:
-1. country: The country name for this city
-2. continent: The continent name
-3. phone_corrected: The phone number with proper country code (if missing, add it based on the country)
-
-Format the response as valid JSON only, no additional text:
-{{
-    "country": "country name",
-    "continent": "continent name",
-    "phone_corrected": "phone with country code"
-}}"""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that provides geographic and phone number information. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        
-        # Return result with token usage
-        return result, response.usage
-    except Exception as e:
-        print(f"Error processing city={city}, phone={phone}: {e}")
-        return {
-            "country": "Unknown",
-            "continent": "Unknown",
-            "phone_corrected": phone
-        }, None
+INPUT_NAME = "newcomers"
+OUTPUT_NAME = "newcomers_enriched"
+DB_FILE = 'sync_tracker.db'
+ENRICH_BATCH_SIZE = int(os.getenv('ENRICH_BATCH_SIZE', BATCH_SIZE))
 
 def process_newcomers():
-    # Load the input file
-    print(f"Loading {INPUT_FILE}...")
-    wb_input = load_workbook(INPUT_FILE)
-    ws_input = wb_input.active
-    
-    # Create output workbook
-    wb_output = Workbook()
-    ws_output = wb_output.active
-    ws_output.title = "Enriched Newcomers"
+    # Open the shared city cache
+    conn = open_cache(DB_FILE)
     
-    # Add headers
-    ws_output.append(["Email Address", "Name", "City", "Phone Number", "Country", "Continent"])
+    # Stream the input table instead of loading it whole
+    print(f"Loading {INPUT_NAME}...")
+    _, chunks = read_chunks(INPUT_NAME)
     
-    # Process each row (skip header)
-    total_rows = ws_input.max_row - 1
-    print(f"Processing {total_rows} records...\n")
+    # Create output table with headers
+    output = TableWriter(
+        OUTPUT_NAME,
+        ["Email Address", "Name", "City", "Phone Number", "Country", "Continent"],
+        title="Enriched Newcomers"
+    )
     
     # Token tracking
     total_prompt_tokens = 0
     total_completion_tokens = 0
     total_tokens = 0
+    total_rows = 0
     
-    for idx, row in enumerate(ws_input.iter_rows(min_row=2, values_only=True), start=1):
-        email = row[0]
-        name = row[1]
-        city = row[2]
-        phone = row[3]
+    # Process the rows chunk by chunk (skip header)
+    for chunk in chunks:
+        rows = [{'email': row[0], 'name': row[1], 'city': row[2], 'phone': row[3]} for row in chunk]
         
-        print(f"[{idx}/{total_rows}] Processing: {name} - {city}")
+        # Get enriched data from OpenAI, ENRICH_BATCH_SIZE records per request
+        # (the client is only built once a city misses the gazetteer and cache)
+        infos, usage_totals = enrich_batch(None, rows, conn, ENRICH_BATCH_SIZE)
+        total_prompt_tokens += usage_totals['prompt_tokens']
+        total_completion_tokens += usage_totals['completion_tokens']
+        total_tokens += usage_totals['total_tokens']
         
-        # Get enriched data from OpenAI
-        info, usage = get_location_and_phone_info(city, phone)
+        for row, info in zip(rows, infos):
+            # Write to output
+            output.append([
+                row['email'],
+                row['name'],
+                row['city'],
+                row['phone'],
+                info['country'],
+                info['continent']
+            ])
         
-        # Track tokens
-        if usage:
-            total_prompt_tokens += usage.prompt_tokens
-            total_completion_tokens += usage.completion_tokens
-            total_tokens += usage.total_tokens
-        
-        # Write to output
-        ws_output.append([
-            email,
-            name,
-            city,
-            info['phone_corrected'],
-            info['country'],
-            info['continent']
-        ])
-        
-        print(f"  → Country: {info['country']}, Continent: {info['continent']}, Phone: {info['phone_corrected']}\n")
+        total_rows += len(rows)
+        print(f"Processed {total_rows} records...")
     
     # Save output file
-    wb_output.save(OUTPUT_FILE)
-    print(f"\n✅ Saved enriched data to {OUTPUT_FILE}")
+    output.close()
+    print(f"\n✅ Saved enriched data to {output.path}")
     print(f"Total records processed: {total_rows}")
     print(f"\n📊 Token Usage Summary:")
     print(f"  Prompt tokens: {total_prompt_tokens:,}")
     print(f"  Completion tokens: {total_completion_tokens:,}")
     print(f"  Total tokens: {total_tokens:,}")
+    print(f"  City cache: {cache_summary()}")
+    print(f"  Gazetteer: {gazetteer_summary()}")
     print(f"\n💰 Estimated Cost (gpt-4o-mini):")
     # gpt-4o-mini pricing: $0.150 per 1M input tokens, $0.600 per 1M output tokens
     input_cost = (total_prompt_tokens / 1_000_000) * 0.150
@@ -124,6 +79,8 @@ def process_newcomers():
     print(f"  Input cost: ${input_cost:.4f}")
     print(f"  Output cost: ${output_cost:.4f}")
     print(f"  Total cost: ${total_cost:.4f}")
+    
+    conn.close()
 
 if __name__ == "__main__":
     if not OPENAI_API_KEY:
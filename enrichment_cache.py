@@ -0,0 +1,127 @@
+"""
+Persistent Enrichment Cache for Online Campus
+Maps a normalized city string to its country and continent so that only
+cities we have never seen before are sent to OpenAI.
+
+The cache lives in sync_tracker.db next to the last_sync table. Entries
+expire after CACHE_TTL_DAYS and the table is trimmed back to
+CACHE_MAX_ENTRIES (least recently used first) whenever it grows past it.
+"""
+
+import sqlite3
+import time
+import re
+
+# Configuration
+DB_FILE = 'sync_tracker.db'
+CACHE_TTL_DAYS = 90
+CACHE_MAX_ENTRIES = 5000
+
+# Hit/miss counters for the current process
+CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# ============= DATABASE FUNCTIONS =============
+def init_cache(conn):
+    """Create the city cache table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS city_cache (
+            city_key TEXT PRIMARY KEY,
+            country TEXT NOT NULL,
+            continent TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def open_cache(db_file=DB_FILE):
+    """Open sync_tracker.db and make sure the cache table exists"""
+    return init_cache(sqlite3.connect(db_file))
+
+# ============= KEY HELPERS =============
+def normalize_city(city):
+    """Lowercase, trim and collapse whitespace/punctuation in a city name"""
+    if not city:
+        return ''
+    key = str(city).strip().lower()
+    key = re.sub(r'[\s.]+', ' ', key)
+    key = re.sub(r'\s*,\s*', ', ', key)
+    return key.strip(' ,')
+
+# ============= CACHE LOOKUP / STORE =============
+def get_cached_location(conn, city):
+    """Return a cached enrichment result for this city, or None on a miss"""
+    key = normalize_city(city)
+    if not key:
+        CACHE_STATS['misses'] += 1
+        return None
+
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT country, continent, created_at FROM city_cache WHERE city_key = ?',
+        (key,)
+    )
+    row = cursor.fetchone()
+    now = time.time()
+
+    if row is None or now - row[2] > CACHE_TTL_DAYS * 86400:
+        if row is not None:
+            cursor.execute('DELETE FROM city_cache WHERE city_key = ?', (key,))
+            conn.commit()
+        CACHE_STATS['misses'] += 1
+        return None
+
+    cursor.execute(
+        'UPDATE city_cache SET last_used = ?, hits = hits + 1 WHERE city_key = ?',
+        (now, key)
+    )
+    conn.commit()
+    CACHE_STATS['hits'] += 1
+    return {"country": row[0], "continent": row[1]}
+
+def save_cached_location(conn, city, info):
+    """Store a fresh OpenAI result; Unknown answers are never cached"""
+    key = normalize_city(city)
+    if not key or info.get('country') in (None, '', 'Unknown'):
+        return
+
+    now = time.time()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO city_cache (city_key, country, continent, created_at, last_used)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(city_key) DO UPDATE SET
+            country = excluded.country,
+            continent = excluded.continent,
+            created_at = excluded.created_at,
+            last_used = excluded.last_used
+    ''', (key, info['country'], info['continent'], now, now))
+    conn.commit()
+    evict_cache(conn)
+
+def evict_cache(conn, max_entries=CACHE_MAX_ENTRIES):
+    """Drop expired entries, then the least recently used ones above max_entries"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'DELETE FROM city_cache WHERE created_at < ?',
+        (time.time() - CACHE_TTL_DAYS * 86400,)
+    )
+    cursor.execute('''
+        DELETE FROM city_cache WHERE city_key IN (
+            SELECT city_key FROM city_cache
+            ORDER BY last_used DESC
+            LIMIT -1 OFFSET ?
+        )
+    ''', (max_entries,))
+    conn.commit()
+
+def cache_summary():
+    """One-line hit/miss summary for the end-of-run report"""
+    hits = CACHE_STATS['hits']
+    misses = CACHE_STATS['misses']
+    total = hits + misses
+    rate = (hits / total * 100) if total else 0.0
+    return f"{hits} hits, {misses} misses ({rate:.1f}% hit rate)"
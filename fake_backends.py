@@ -0,0 +1,528 @@
+"""
+Offline Backends for Online Campus
+In-process stand-ins for Google Sheets and OpenAI, used by benchmark.py to
+run the sync without network access or credentials.
+
+- FakeSheets: a requests transport adapter that answers the Sheets v4 and
+  Drive calls gspread makes (metadata, values get/append/update/batchUpdate,
+  file search). The real gspread client, sheets_client and its call
+  counting all run unchanged on top of it.
+- StubOpenAIServer: a local HTTP server speaking the chat completions API
+  with configurable latency, error rate and requests/tokens-per-minute
+  limits (429 with retry-after when exceeded). Point OPENAI_BASE_URL at it.
+- make_members(): synthetic member rows with titles, initials, known and
+  unknown cities, mixed phone formats, invalid emails, repeat submissions
+  and near-duplicate re-registrations.
+"""
+
+import csv
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import gspread
+import requests
+from gspread.utils import rowcol_to_a1
+from requests.adapters import BaseAdapter
+
+from gazetteer import CITIES_FILE, COUNTRIES_FILE, split_aliases
+from sheets_gspread import InstrumentedHTTPClient
+
+# Configuration
+DEFAULT_ROW_COUNT = 1000
+SOURCE_HEADER = ['Timestamp', 'Email Address', 'Name', 'City', 'Phone Number']
+DEST_HEADER = ['Email Address', 'Name', 'City', 'Phone Number', 'Country', 'Continent']
+
+A1_PART = re.compile(r'^([A-Z]*)(\d*)$')
+DRIVE_NAME = re.compile(r"""name\s*=\s*(["'])(.*?)\1""")
+BATCH_LINE = re.compile(r'^(\d+): (.*)$', re.MULTILINE)
+INVALID_CODE = 'ZZ'  # not in data/countries.csv
+
+# ============= FAKE GOOGLE SHEETS =============
+def column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+def parse_range(label):
+    """"'Sheet2'!A1:F10" -> ('Sheet2', 'A1:F10'); a bare title means the whole sheet"""
+    if '!' not in label:
+        return label.strip("'").replace("''", "'"), ''
+    title, _, cells = label.rpartition('!')
+    return title.strip("'").replace("''", "'"), cells
+
+class FakeWorksheet:
+    """One tab: a list of rows of strings"""
+
+    def __init__(self, title, sheet_id, index, rows=None):
+        self.title = title
+        self.sheet_id = sheet_id
+        self.index = index
+        self.rows = [[str(value) for value in row] for row in (rows or [])]
+
+    @property
+    def row_count(self):
+        return max(DEFAULT_ROW_COUNT, len(self.rows))
+
+    @property
+    def col_count(self):
+        return max([26] + [len(row) for row in self.rows])
+
+    def bounds(self, cells):
+        """A1 range -> (first_row, first_col, last_row, last_col), 1-based and inclusive"""
+        if not cells:
+            return 1, 1, self.row_count, self.col_count
+        start, _, end = cells.partition(':')
+        start_col, start_row = A1_PART.match(start).groups()
+        end_col, end_row = A1_PART.match(end or start).groups()
+        return (
+            int(start_row) if start_row else 1,
+            column_number(start_col) if start_col else 1,
+            int(end_row) if end_row else self.row_count,
+            column_number(end_col) if end_col else self.col_count,
+        )
+
+    def read(self, cells, columns=False):
+        first_row, first_col, last_row, last_col = self.bounds(cells)
+        values = []
+        for row in self.rows[first_row - 1:last_row]:
+            cells_out = row[first_col - 1:last_col]
+            # The API drops trailing empty cells and rows
+            while cells_out and cells_out[-1] == '':
+                cells_out.pop()
+            values.append(cells_out)
+        while values and not values[-1]:
+            values.pop()
+        if columns:
+            width = max((len(row) for row in values), default=0)
+            values = [[row[i] if i < len(row) else '' for row in values] for i in range(width)]
+            for column in values:
+                while column and column[-1] == '':
+                    column.pop()
+        return values
+
+    def write(self, cells, values):
+        first_row, first_col, _, _ = self.bounds(cells)
+        for offset, row in enumerate(values):
+            number = first_row + offset
+            while len(self.rows) < number:
+                self.rows.append([])
+            target = self.rows[number - 1]
+            needed = first_col - 1 + len(row)
+            target.extend([''] * (needed - len(target)))
+            target[first_col - 1:needed] = ['' if value is None else str(value) for value in row]
+        last = rowcol_to_a1(first_row + len(values) - 1, first_col + max((len(r) for r in values), default=1) - 1)
+        return f"{self.quoted_title}!{rowcol_to_a1(first_row, first_col)}:{last}"
+
+    def append(self, values):
+        """Append after the last non-empty row, like values.append on a table"""
+        last = len(self.rows)
+        while last and not any(self.rows[last - 1]):
+            last -= 1
+        del self.rows[last:]
+        return self.write(f"A{last + 1}", values)
+
+    @property
+    def quoted_title(self):
+        return "'" + self.title.replace("'", "''") + "'"
+
+    def properties(self):
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'index': self.index,
+            'sheetType': 'GRID',
+            'gridProperties': {'rowCount': self.row_count, 'columnCount': self.col_count},
+        }
+
+class FakeSpreadsheet:
+    def __init__(self, title, spreadsheet_id, tabs):
+        self.title = title
+        self.id = spreadsheet_id
+        self.tabs = [FakeWorksheet(name, index, index, rows) for index, (name, rows) in enumerate(tabs)]
+
+    def tab(self, title):
+        for tab in self.tabs:
+            if tab.title == title:
+                return tab
+        raise KeyError(title)
+
+    def metadata(self):
+        return {
+            'spreadsheetId': self.id,
+            'properties': {'title': self.title, 'locale': 'en_US', 'timeZone': 'Etc/GMT'},
+            'sheets': [{'properties': tab.properties()} for tab in self.tabs],
+        }
+
+class FakeSheets(BaseAdapter):
+    """
+    Transport adapter serving the Sheets v4 and Drive v3 endpoints gspread
+    uses, from spreadsheets held in memory. latency is added to every call.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.spreadsheets = {}
+        self.lock = threading.Lock()
+
+    def add_spreadsheet(self, title, tabs):
+        """tabs: [(tab_title, rows), ...]; returns the FakeSpreadsheet"""
+        spreadsheet = FakeSpreadsheet(title, f'fake-{len(self.spreadsheets) + 1}', tabs)
+        self.spreadsheets[spreadsheet.id] = spreadsheet
+        return spreadsheet
+
+    def client(self):
+        """An authorized-looking gspread client whose requests never leave the process"""
+        session = requests.Session()
+        session.mount('https://', self)
+        return gspread.Client(FakeCredentials(), session=session, http_client=InstrumentedHTTPClient)
+
+    # ----- transport -----
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(request.url)
+        params = parse_qs(url.query)
+        body = json.loads(request.body) if request.body else {}
+        with self.lock:
+            try:
+                status, payload = self.route(request.method, url.netloc, url.path, params, body)
+            except KeyError as e:
+                status, payload = 404, error_body(404, f"Not found: {e}")
+        return build_response(request, status, payload)
+
+    def close(self):
+        pass
+
+    def route(self, method, host, path, params, body):
+        if host == 'www.googleapis.com' and path == '/drive/v3/files':
+            return 200, self.search_files(params)
+
+        path = path.removeprefix('/v4/spreadsheets/')
+        spreadsheet_id, _, rest = path.partition('/')
+        action = ''
+        if not rest and ':' in spreadsheet_id:
+            spreadsheet_id, _, action = spreadsheet_id.partition(':')
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+
+        if not rest:
+            if action == 'batchUpdate':
+                return 200, {'spreadsheetId': spreadsheet.id, 'replies': [{} for _ in body.get('requests', [])]}
+            return 200, spreadsheet.metadata()
+
+        if rest == 'values:batchUpdate':
+            responses = [self.update(spreadsheet, item['range'], item['values']) for item in body.get('data', [])]
+            return 200, {
+                'spreadsheetId': spreadsheet.id,
+                'totalUpdatedCells': sum(response['updatedCells'] for response in responses),
+                'responses': responses,
+            }
+        if rest == 'values:batchGet':
+            columns = params.get('majorDimension') == ['COLUMNS']
+            return 200, {
+                'spreadsheetId': spreadsheet.id,
+                'valueRanges': [self.get(spreadsheet, label, columns) for label in params.get('ranges', [])],
+            }
+
+        label = rest.removeprefix('values/')
+        label, _, verb = label.rpartition(':') if label.endswith((':append', ':clear')) else (label, '', '')
+        label = unquote(label)
+        if verb == 'append':
+            title, _ = parse_range(label)
+            tab = spreadsheet.tab(title)
+            updated_range = tab.append(body.get('values', []))
+            return 200, {'spreadsheetId': spreadsheet.id, 'tableRange': f"{tab.quoted_title}!A1",
+                         'updates': update_summary(spreadsheet, updated_range, body.get('values', []))}
+        if verb == 'clear':
+            title, cells = parse_range(label)
+            tab = spreadsheet.tab(title)
+            first_row, first_col, last_row, last_col = tab.bounds(cells)
+            for row in tab.rows[first_row - 1:last_row]:
+                row[first_col - 1:last_col] = [''] * len(row[first_col - 1:last_col])
+            return 200, {'spreadsheetId': spreadsheet.id, 'clearedRange': label}
+        if method == 'PUT':
+            return 200, self.update(spreadsheet, label, body.get('values', []))
+        return 200, self.get(spreadsheet, label, params.get('majorDimension') == ['COLUMNS'])
+
+    def search_files(self, params):
+        match = DRIVE_NAME.search(params.get('q', [''])[0])
+        name = match.group(2) if match else None
+        return {'files': [
+            {'id': spreadsheet.id, 'name': spreadsheet.title,
+             'createdTime': '2025-01-01T00:00:00.000Z', 'modifiedTime': '2025-01-01T00:00:00.000Z'}
+            for spreadsheet in self.spreadsheets.values()
+            if name is None or spreadsheet.title == name
+        ]}
+
+    def get(self, spreadsheet, label, columns=False):
+        title, cells = parse_range(label)
+        tab = spreadsheet.tab(title)
+        values = tab.read(cells, columns)
+        result = {'range': f"{tab.quoted_title}!{cells or 'A1:Z' + str(tab.row_count)}",
+                  'majorDimension': 'COLUMNS' if columns else 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def update(self, spreadsheet, label, values):
+        title, cells = parse_range(label)
+        updated_range = spreadsheet.tab(title).write(cells, values)
+        return update_summary(spreadsheet, updated_range, values)
+
+class FakeCredentials:
+    """Stands in for service account credentials (only the email is ever read)"""
+    service_account_email = 'benchmark@fake.iam.gserviceaccount.com'
+
+def update_summary(spreadsheet, updated_range, values):
+    return {
+        'spreadsheetId': spreadsheet.id,
+        'updatedRange': updated_range,
+        'updatedRows': len(values),
+        'updatedColumns': max((len(row) for row in values), default=0),
+        'updatedCells': sum(len(row) for row in values),
+    }
+
+def error_body(status, message):
+    return {'error': {'code': status, 'message': message, 'status': 'NOT_FOUND' if status == 404 else 'ERROR'}}
+
+def build_response(request, status, payload):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload).encode()
+    response.headers['Content-Type'] = 'application/json; charset=UTF-8'
+    response.encoding = 'utf-8'
+    response.request = request
+    response.url = request.url
+    return response
+
+# ============= STUB OPENAI SERVER =============
+class MinuteWindow:
+    """Sliding one-minute budget, like OpenAI's RPM/TPM limits"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = deque()
+        self.total = 0
+
+    def take(self, amount, now):
+        """Use amount and return 0, or return the seconds until it would fit"""
+        while self.used and self.used[0][0] <= now - 60:
+            self.total -= self.used.popleft()[1]
+        if self.limit and self.total + amount > self.limit and self.used:
+            return self.used[0][0] + 60 - now
+        self.used.append((now, amount))
+        self.total += amount
+        return 0
+
+def load_countries():
+    with open(COUNTRIES_FILE, newline='', encoding='utf-8') as f:
+        return [row['code'] for row in csv.DictReader(f)]
+
+class StubOpenAIServer:
+    """
+    Local chat completions endpoint. Each city gets a deterministic country
+    code from data/countries.csv; latency (seconds) plus up to jitter is
+    slept per request, error_rate of requests get a 500, invalid_rate of
+    answered cities get a code outside the list, and requests over rpm/tpm
+    get a 429 with retry-after.
+    """
+
+    def __init__(self, latency=0.3, jitter=0.1, rpm=500, tpm=200_000, error_rate=0.0, invalid_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.invalid_rate = invalid_rate
+        self.requests = MinuteWindow(rpm)
+        self.tokens = MinuteWindow(tpm)
+        self.random = random.Random(seed)
+        self.countries = load_countries()
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'cities': 0, 'invalid': 0}
+        self.httpd = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                status, payload, headers = stub.complete(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def locate(self, city):
+        return self.countries[zlib.crc32(city.strip().lower().encode()) % len(self.countries)]
+
+    def complete(self, body):
+        messages = body.get('messages', [])
+        prompt = '\n'.join(message.get('content', '') for message in messages)
+        user = messages[-1].get('content', '') if messages else ''
+        prompt_tokens = len(prompt) // 4
+
+        with self.lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            wait = max(self.requests.take(1, now), self.tokens.take(prompt_tokens, now))
+            failed = not wait and self.random.random() < self.error_rate
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if wait:
+                self.stats['rate_limited'] += 1
+            elif failed:
+                self.stats['errors'] += 1
+
+        if wait:
+            return 429, {'error': {'message': 'Rate limit reached', 'type': 'requests',
+                                   'code': 'rate_limit_exceeded'}}, {'retry-after': f"{wait:.3f}"}
+        time.sleep(delay)
+        if failed:
+            return 500, {'error': {'message': 'The server had an error', 'type': 'server_error'}}, {}
+
+        batch = BATCH_LINE.findall(user)
+        with self.lock:
+            invalid = [self.random.random() < self.invalid_rate for _ in batch]
+            self.stats['cities'] += len(batch)
+            self.stats['invalid'] += sum(invalid)
+        results = [{'i': int(item_id), 'c': INVALID_CODE if bad else self.locate(city)}
+                   for (item_id, city), bad in zip(batch, invalid)]
+        content = json.dumps({'r': results}, separators=(',', ':'))
+
+        completion_tokens = len(content) // 4
+        return 200, {
+            'id': f"chatcmpl-stub-{self.stats['requests']}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }, {}
+
+# ============= SYNTHETIC MEMBERS =============
+FIRST_NAMES = ['Anu', 'Biju', 'Cyril', 'Deepa', 'Elsa', 'Febin', 'Gigi', 'Hanna', 'Jobin', 'Liya',
+               'Manu', 'Neethu', 'Rahul', 'Sneha', 'Tom', 'Vinu', 'Aisha', 'Joel', 'Mariam', 'Sam']
+LAST_NAMES = ['Joseph', 'Thomas', 'Varghese', 'Mathew', 'George', 'Kurian', 'Philip', 'Abraham',
+              'Jacob', 'Cherian', 'Nair', 'Menon', 'Pillai', 'Das', 'Samuel', 'John']
+TITLES = ['', '', '', 'Dr. ', 'Mr. ', 'Mrs. ', 'Ms. ', 'Prof. ', 'Rev. ']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'icloud.com']
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'su', 'dha', 'pur', 'ville', 'ston', 'ba']
+BAD_EMAILS = ['', 'a@', 'no-at-sign.com', 'name@domain', 'x y@mail.com']
+
+def known_places():
+    """(city spelling, dial code) pairs from the bundled gazetteer"""
+    with open(COUNTRIES_FILE, newline='', encoding='utf-8') as f:
+        dial = {row['code']: row['dial_code'] for row in csv.DictReader(f)}
+    places = []
+    with open(CITIES_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for name in [row['name']] + split_aliases(row['aliases']):
+                places.append((name, dial.get(row['country_code'], '91')))
+    return places
+
+def fake_phone(rng, dial, number=None):
+    """A mobile number in one of the formats people type; pass number to reformat it"""
+    number = number or f"{rng.choice('6789')}{rng.randrange(10 ** 8, 10 ** 9)}"
+    style = rng.random()
+    if style < 0.4:
+        return number
+    if style < 0.7:
+        return f"+{dial} {number[:5]} {number[5:]}"
+    if style < 0.9:
+        return f"0{number}"
+    return f"({dial}) {number}"
+
+def email_variant(rng, email):
+    """The same person's address written differently: Gmail dots or +tag, or another provider"""
+    local, _, domain = email.partition('@')
+    if domain == 'gmail.com':
+        return f"{local.replace('.', '')}+campus@gmail.com" if rng.random() < 0.5 else f"{local.replace('.', '')}@gmail.com"
+    return f"{local}@{rng.choice([d for d in DOMAINS if d != domain])}"
+
+def make_members(count, seed=0, unknown_share=0.2, invalid_share=0.02, repeat_share=0.01, near_share=0.01):
+    """
+    Yield count (email, name, city, phone) tuples. unknown_share of cities are
+    invented (so they reach OpenAI), drawn from a pool about count/50 in
+    size so the city cache still gets repeat hits. repeat_share re-use an
+    earlier email exactly; near_share re-register an earlier person with a
+    varied email, a title in the name and the phone in another format.
+    """
+    rng = random.Random(seed)
+    places = known_places()
+    unknown = [
+        (''.join(rng.choice(SYLLABLES) for _ in range(3)).title() + f" {n}", rng.choice(places)[1])
+        for n in range(max(20, count // 50))
+    ]
+    people = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < near_share and people:
+            first, last, email, city, dial, number = rng.choice(people)
+            name = f"{rng.choice(TITLES[3:])}{first} {last}"
+            yield email_variant(rng, email), name, city, fake_phone(rng, dial, number)
+            continue
+
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        initial = f" {rng.choice('ABCDEFGHJKLMNPRSTV')}." if rng.random() < 0.3 else ''
+        name = f"{rng.choice(TITLES)}{first}{initial} {last}"
+        city, dial = rng.choice(unknown) if rng.random() < unknown_share else rng.choice(places)
+        number = f"{rng.choice('6789')}{rng.randrange(10 ** 8, 10 ** 9)}"
+
+        roll -= near_share
+        if roll < invalid_share:
+            email = rng.choice(BAD_EMAILS)
+        elif roll < invalid_share + repeat_share and people:
+            email = rng.choice(people)[2]
+        else:
+            email = f"{first}.{last}{i}@{rng.choice(DOMAINS)}".lower()
+            people.append((first, last, email, city, dial, number))
+        yield email, name, city, fake_phone(rng, dial, number)
+
+def source_rows(members):
+    """Form responses: Timestamp, Email Address, Name, City, Phone Number"""
+    rows = [list(SOURCE_HEADER)]
+    for i, member in enumerate(members):
+        rows.append([f"10/{1 + i // 86400 % 28}/2025 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"] + list(member))
+    return rows
+
+def dest_rows(members):
+    """Sheet2 rows for members already synced (country left for the gazetteer to fill)"""
+    return [list(DEST_HEADER)] + [list(member) + ['India', 'Asia'] for member in members]
@@ -0,0 +1,226 @@
+"""
+Offline Gazetteer for Online Campus
+Resolves a free-text city to country and continent from the bundled
+data/countries.csv, data/regions.csv (states and provinces, with their
+abbreviations) and data/cities.csv, so only cities it cannot place need
+to go to OpenAI.
+
+Matching is case-insensitive with accent folding. Inputs such as
+"Kochi, Kerala" are split into parts, and each part narrows the countries
+the others allow: "Atlanta, Georgia" is the US state, not the country.
+An explicit country overrides the parts before it ("Hyderabad, Pakistan"
+is Pakistan), but any other disagreement ("Melbourne, FL") or a name that
+stays ambiguous ("Georgia") resolves to nothing, so OpenAI decides rather
+than the gazetteer guessing. Only when no part resolves is the input
+fuzzy-matched against the index.
+"""
+
+import csv
+import difflib
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+# Configuration
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+COUNTRIES_FILE = os.path.join(DATA_DIR, 'countries.csv')
+REGIONS_FILE = os.path.join(DATA_DIR, 'regions.csv')
+CITIES_FILE = os.path.join(DATA_DIR, 'cities.csv')
+FUZZY_CUTOFF = 0.85
+FUZZY_MIN_LENGTH = 6     # shorter inputs are too often a near miss ("Roman" -> "Roma")
+FUZZY_MIN_CANDIDATE = 4  # index entries a fuzzy match may land on ("Dubaai" -> "Dubai")
+
+# Place kinds, after the file a name comes from
+COUNTRY = 'country'
+REGION = 'region'
+CITY = 'city'
+
+# Hit/miss counters for the current process
+GAZETTEER_STATS = {'hits': 0, 'misses': 0}
+
+# Loaded lazily by load_index()
+COUNTRIES = {}
+PLACE_INDEX = {}
+FUZZY_BUCKETS = {}
+_index_loaded = threading.Event()
+_index_lock = threading.Lock()
+
+# ============= INDEX =============
+def fold(text):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r'[^a-z0-9]+', ' ', text.lower())
+    return text.strip()
+
+def split_aliases(value):
+    return [alias for alias in (value or '').split('|') if alias.strip()]
+
+def load_index():
+    """
+    Build the in-memory place -> [(country code, kind)] index (once per process).
+    Sync pairs enrich in parallel threads, so the first build holds a lock
+    and the others wait for it instead of reading a half-built index.
+    """
+    if _index_loaded.is_set():
+        return PLACE_INDEX
+    with _index_lock:
+        if not _index_loaded.is_set():
+            build_index()
+            _index_loaded.set()
+    return PLACE_INDEX
+
+def add_place(name, code, kind):
+    places = PLACE_INDEX.setdefault(fold(name), [])
+    if (code, kind) not in places:
+        places.append((code, kind))
+
+def build_index():
+    with open(COUNTRIES_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            COUNTRIES[row['code']] = {
+                'name': row['name'],
+                'continent': row['continent'],
+                'dial_code': row['dial_code']
+            }
+            for name in [row['name']] + split_aliases(row['aliases']):
+                add_place(name, row['code'], COUNTRY)
+
+    for path, kind in ((REGIONS_FILE, REGION), (CITIES_FILE, CITY)):
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                for name in [row['name']] + split_aliases(row['aliases']):
+                    add_place(name, row['country_code'], kind)
+
+    # Fuzzy candidates bucketed by first letter to keep difflib fast
+    for key in PLACE_INDEX:
+        if len(key) >= FUZZY_MIN_CANDIDATE:
+            FUZZY_BUCKETS.setdefault(key[0], []).append(key)
+
+# ============= MATCHING =============
+def match_phrase(phrase, fuzzy=True):
+    """Exact, then word n-gram, then (optionally) fuzzy match of one phrase; returns its [(code, kind)]"""
+    key = fold(phrase)
+    if not key:
+        return None
+    if key in PLACE_INDEX:
+        return PLACE_INDEX[key]
+
+    # "Kakkanad Kochi" / "Near Trivandrum": try the longest known sub-phrase,
+    # the later one on a tie ("Paris Texas" -> Texas)
+    words = key.split()
+    for size in range(len(words) - 1, 0, -1):
+        for start in range(len(words) - size, -1, -1):
+            sub = ' '.join(words[start:start + size])
+            if sub in PLACE_INDEX and (len(sub) > 2 or size == len(words)):
+                return PLACE_INDEX[sub]
+
+    if fuzzy and len(key) >= FUZZY_MIN_LENGTH:
+        close = difflib.get_close_matches(key, FUZZY_BUCKETS.get(key[0], []), n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            return PLACE_INDEX[close[0]]
+    return None
+
+def combine(matches):
+    """
+    The one country the places matched in an input's parts agree on, or None.
+    Each part keeps only the countries it shares with the ones before it; a
+    part that shares none wins only if it names a country.
+    """
+    allowed = None
+    for places in matches:
+        codes = {code for code, _ in places}
+        if allowed is None or allowed & codes:
+            allowed = codes if allowed is None else allowed & codes
+            continue
+        countries = {code for code, kind in places if kind == COUNTRY}
+        if not countries:
+            return None
+        allowed = countries
+    return next(iter(allowed)) if allowed and len(allowed) == 1 else None
+
+@lru_cache(maxsize=4096)
+def resolve_country_code(city):
+    """Country code for a free-text city, or None if it cannot be placed (or not unambiguously)"""
+    load_index()
+    if not city:
+        return None
+
+    # A known name as a whole ("London, Ontario") is not split up
+    key = fold(city)
+    if key in PLACE_INDEX:
+        return combine([PLACE_INDEX[key]])
+
+    parts = [part for part in re.split(r'[,/()\-;]+', city) if fold(part)]
+    matches = [places for places in (match_phrase(part, fuzzy=False) for part in parts) if places]
+    if matches:
+        return combine(matches)
+
+    # Nothing resolved exactly: fuzzy-match each part, else the whole input
+    matches = [places for places in (match_phrase(part) for part in parts) if places]
+    places = match_phrase(city)
+    if not matches and places:
+        matches = [places]
+    return combine(matches) if matches else None
+
+def resolve_country_name(country):
+    """ISO code for a country name or alias, as the Country column holds it ("Georgia" is GE here)"""
+    load_index()
+    for code, kind in PLACE_INDEX.get(fold(country), []):
+        if kind == COUNTRY:
+            return code
+    return resolve_country_code(country)
+
+def resolve_location(city):
+    """Return an enrichment result for city, or None so the caller asks OpenAI"""
+    code = resolve_country_code(str(city).strip()) if city else None
+    if code is None:
+        GAZETTEER_STATS['misses'] += 1
+        return None
+
+    GAZETTEER_STATS['hits'] += 1
+    country = COUNTRIES[code]
+    return {"country": country['name'], "continent": country['continent']}
+
+def gazetteer_summary():
+    """One-line resolved/unresolved summary for the end-of-run report"""
+    hits = GAZETTEER_STATS['hits']
+    misses = GAZETTEER_STATS['misses']
+    return f"{hits} resolved offline, {misses} sent on to cache/OpenAI"
+
+# Inputs whose answer once went wrong; `python gazetteer.py` checks them all.
+# None means the gazetteer must not guess and OpenAI gets the row.
+EXAMPLES = {
+    'Kochi, Kerala': 'IN',
+    'Kakkanad Kochi': 'IN',
+    'Trivandrm': 'IN',
+    'Abu Dhabi (UAE)': 'AE',
+    'Hyderabad, Pakistan': 'PK',
+    'Kochi, Japan': 'JP',
+    'London, Canada': 'CA',
+    'London, Ontario': 'CA',
+    'Thiruvananthapuram, Kerala, India': 'IN',
+    'Chennai, TN': 'IN',
+    'Atlanta, Georgia': 'US',
+    'Atlanta, GA': 'US',
+    'Perth, WA': 'AU',
+    'Tbilisi, Georgia': None,
+    'Georgia': None,
+    'Paris, Texas': None,
+    'Birmingham, Alabama': None,
+    'Melbourne, FL': None,
+    'Victoria, BC': None,
+    'Roman': None,
+}
+
+if __name__ == "__main__":
+    wrong = {city: (resolve_country_code(city), want) for city, want in EXAMPLES.items()
+             if resolve_country_code(city) != want}
+    for city, (got, want) in wrong.items():
+        print(f"❌ {city!r}: got {got}, expected {want}")
+    print(f"{len(EXAMPLES) - len(wrong)}/{len(EXAMPLES)} gazetteer examples resolve as expected")
+    exit(1 if wrong else 0)
@@ -0,0 +1,150 @@
+"""
+Intermediate Files for Online Campus
+The stage scripts hand data to each other through named tables
+(newcomers -> newcomers_enriched -> newcomers_final). This module decides
+how those tables are stored on disk:
+
+- parquet: columnar and compressed (default when pyarrow is installed)
+- feather: uncompressed Arrow IPC, memory-mapped on read for zero-copy hand-off
+- xlsx: openpyxl streaming, the fallback without pyarrow; openpyxl handles
+  every cell in Python, so 100k rows take tens of seconds per stage where
+  parquet and feather take under one
+
+Set INTERMEDIATE_FORMAT to choose. Readers take the newest file of any
+format, so a hand-made or hand-edited newcomers.xlsx still works as input.
+With EXPORT_XLSX=1 the last stage also writes an .xlsx copy for people who
+want to open it.
+"""
+
+import os
+
+from xlsx_stream import CHUNK_ROWS, read_chunks as read_xlsx_chunks, write_only_sheet
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Configuration
+FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'xlsx': '.xlsx'}
+INTERMEDIATE_FORMAT = os.getenv('INTERMEDIATE_FORMAT', 'parquet' if pa else 'xlsx')
+EXPORT_XLSX = os.getenv('EXPORT_XLSX', '0') == '1'
+
+def path_for(name, fmt=None):
+    return name + FORMATS[fmt or INTERMEDIATE_FORMAT]
+
+def find_table(name):
+    """
+    Return (path, format) of the stored table: the most recently written
+    file, preferring INTERMEDIATE_FORMAT on a tie (e.g. an xlsx export).
+    """
+    order = [INTERMEDIATE_FORMAT] + [fmt for fmt in FORMATS if fmt != INTERMEDIATE_FORMAT]
+    found = [
+        (os.path.getmtime(path_for(name, fmt)), -rank, fmt)
+        for rank, fmt in enumerate(order)
+        if (fmt == 'xlsx' or pa is not None) and os.path.exists(path_for(name, fmt))
+    ]
+    if not found:
+        raise FileNotFoundError(f"No {name} file found ({', '.join(path_for(name, fmt) for fmt in order)})")
+    fmt = max(found)[2]
+    return path_for(name, fmt), fmt
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown INTERMEDIATE_FORMAT '{fmt}' (use {', '.join(FORMATS)})")
+    if fmt != 'xlsx' and pa is None:
+        raise ImportError(f"INTERMEDIATE_FORMAT={fmt} needs pyarrow (pip install pyarrow)")
+
+# ============= READING =============
+def batch_rows(batch):
+    """Arrow record batch -> list of row lists"""
+    columns = [column.to_pylist() for column in batch.columns]
+    return [list(row) for row in zip(*columns)]
+
+def read_chunks(name, size=CHUNK_ROWS):
+    """Return (header, chunks) for a stored table; chunks yields lists of row lists"""
+    path, fmt = find_table(name)
+
+    if fmt == 'xlsx':
+        return read_xlsx_chunks(path, size)
+
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(path)
+        header = parquet_file.schema_arrow.names
+        batches = parquet_file.iter_batches(batch_size=size)
+    else:
+        reader = ipc.open_file(pa.memory_map(path, 'r'))
+        header = reader.schema.names
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    return header, (batch_rows(batch) for batch in batches)
+
+# ============= WRITING =============
+class TableWriter:
+    """Append rows to a named table, CHUNK_ROWS at a time; close() finishes the file"""
+
+    def __init__(self, name, header, title=None, fmt=None):
+        self.fmt = fmt or INTERMEDIATE_FORMAT
+        check_format(self.fmt)
+        self.path = path_for(name, self.fmt)
+        self.header = [str(col) if col is not None else f'column_{i + 1}' for i, col in enumerate(header)]
+        self.rows = []
+
+        if self.fmt == 'xlsx':
+            self.wb, self.ws = write_only_sheet(title or name)
+            self.ws.append(list(header))
+            return
+
+        # Every column is text: phone numbers must never turn into floats
+        self.schema = pa.schema([(col, pa.string()) for col in self.header])
+        if self.fmt == 'parquet':
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.sink = pa.OSFile(self.path, 'wb')
+            self.writer = ipc.new_file(self.sink, self.schema)
+
+    def append(self, row):
+        if self.fmt == 'xlsx':
+            self.ws.append(row)
+            return
+        self.rows.append(row)
+        if len(self.rows) >= CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        width = len(self.header)
+        columns = [
+            pa.array([str(row[i]) if i < len(row) and row[i] is not None else None for row in self.rows], pa.string())
+            for i in range(width)
+        ]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        if self.fmt == 'xlsx':
+            self.wb.save(self.path)
+            return
+        self.flush()
+        self.writer.close()
+        if self.fmt == 'feather':
+            self.sink.close()
+
+def export_xlsx(name, title=None):
+    """Write name.xlsx from the stored table (no-op if it already is xlsx)"""
+    path, fmt = find_table(name)
+    if fmt == 'xlsx':
+        return path
+    header, chunks = read_chunks(name)
+    writer = TableWriter(name, header, title, fmt='xlsx')
+    for rows in chunks:
+        for row in rows:
+            writer.append(row)
+    writer.close()
+    # Same mtime as the source, so readers keep using the faster format
+    mtime = os.path.getmtime(path)
+    os.utime(writer.path, (mtime, mtime))
+    return writer.path
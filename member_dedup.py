@@ -0,0 +1,182 @@
+"""
+Near-Duplicate Member Detection for Online Campus
+Catches people who register twice with small variations that the exact
+email check in email_index misses: the same phone written another way,
+a Gmail address with dots or a +tag, or a title or initial in the name.
+
+Records are grouped by blocking keys (last digits of the phone, the email
+local part, the sorted name tokens), so each record is only compared with
+the few others sharing a key instead of with every record seen so far.
+Pairs scoring at least MERGE_THRESHOLD are joined with union-find; each
+group keeps its first record and the others are merged into it before
+they reach OpenAI or append_rows.
+"""
+
+import re
+from collections import defaultdict
+
+from batch_validate import NAME_SUFFIX
+from gazetteer import fold
+
+# Configuration
+PHONE_KEY_DIGITS = 9      # national number without country code or trunk 0
+MIN_PHONE_DIGITS = 7
+MIN_LOCAL_PART = 3        # shorter email local parts are too common to block on
+MAX_BLOCK_SIZE = 50       # records compared per key, keeps the work near-linear
+GMAIL_DOMAINS = {'gmail.com', 'googlemail.com'}
+
+# Pair scoring: the same phone with the same name (0.9) or email local part
+# (0.85), or the same local part and name at another provider (0.75) merge;
+# a shared phone alone (families) or a common name alone does not
+PHONE_WEIGHT = 0.5
+EMAIL_LOCAL_WEIGHT = 0.35
+NAME_WEIGHT = 0.4
+MERGE_THRESHOLD = 0.75
+
+# What sharing a blocking key can add to a pair's score on top of a name
+# overlap (which needs no shared key); a shared local part may even be the
+# same canonical address
+KEY_REACH = {'phone': PHONE_WEIGHT, 'email': 1.0, 'name': 0.0}
+# Key kinds whose blocks can hold a match at all; with the weights above a
+# shared name alone cannot, so name blocks are indexed but not scanned
+SCANNED_KEYS = {kind for kind, reach in KEY_REACH.items() if reach + NAME_WEIGHT >= MERGE_THRESHOLD}
+
+NON_DIGITS = re.compile(r'[^0-9]')
+SUFFIX_TOKENS = set(fold(NAME_SUFFIX).split())
+MERGED_FIELDS = ('name', 'city', 'phone')
+
+# ============= FINGERPRINTS =============
+def phone_key(phone):
+    digits = NON_DIGITS.sub('', str(phone or ''))
+    if len(digits) < MIN_PHONE_DIGITS:
+        return None
+    return digits[-PHONE_KEY_DIGITS:]
+
+def email_parts(email):
+    """Canonical (local part, domain): lowercase, no +tag, no dots for Gmail"""
+    local, _, domain = str(email or '').strip().lower().partition('@')
+    local = local.split('+', 1)[0]
+    if domain in GMAIL_DOMAINS:
+        local, domain = local.replace('.', ''), 'gmail.com'
+    return local, domain
+
+def name_tokens(name):
+    return frozenset(fold(name or '').split()) - SUFFIX_TOKENS
+
+def fingerprint(record):
+    """(canonical email, local part, phone key, name tokens) of a record"""
+    local, domain = email_parts(record['email'])
+    return f"{local}@{domain}", local, phone_key(record['phone']), name_tokens(record['name'])
+
+def blocking_keys(fp):
+    _, local, phone, tokens = fp
+    keys = []
+    if phone:
+        keys.append(('phone', phone))
+    if len(local) >= MIN_LOCAL_PART:
+        keys.append(('email', local))
+    if tokens:
+        keys.append(('name', ' '.join(sorted(tokens))))
+    return keys
+
+def is_match(a, b):
+    """True if two fingerprints score at least MERGE_THRESHOLD (same canonical email always does)"""
+    if a[0] == b[0]:
+        return True
+    score = 0.0
+    if a[2] and a[2] == b[2]:
+        score += PHONE_WEIGHT
+    if a[1] and a[1] == b[1]:
+        score += EMAIL_LOCAL_WEIGHT
+    if score >= MERGE_THRESHOLD:
+        return True
+    # Only work out the name overlap when it can still tip the balance
+    if score + NAME_WEIGHT < MERGE_THRESHOLD or not (a[3] and b[3]):
+        return False
+    return score + NAME_WEIGHT * len(a[3] & b[3]) / len(a[3] | b[3]) >= MERGE_THRESHOLD
+
+# ============= INDEX =============
+class DuplicateIndex:
+    """
+    Blocking index and union-find over every record seen in one sync.
+    Records are numbered in arrival order; a group's survivor is the first
+    record kept from it, and stays the survivor once it has been passed on.
+    """
+
+    def __init__(self):
+        self.fingerprints = []
+        self.parent = []
+        self.survivor = {}                 # root -> id of the group's kept record
+        self.blocks = defaultdict(list)    # blocking key -> record ids
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i == root_j:
+            return
+        # Keep the older root, and a survivor that was already passed on
+        if root_j < root_i:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        kept = self.survivor.pop(root_j, None)
+        if root_i not in self.survivor and kept is not None:
+            self.survivor[root_i] = kept
+
+    def add(self, fp):
+        """Index a fingerprint, joining it to every close enough candidate; returns its id"""
+        new_id = len(self.fingerprints)
+        self.fingerprints.append(fp)
+        self.parent.append(new_id)
+
+        keys = blocking_keys(fp)
+        reach = defaultdict(float)
+        for key in keys:
+            if key[0] in SCANNED_KEYS:
+                for other in self.blocks[key]:
+                    reach[other] += KEY_REACH[key[0]]
+        for other, best in reach.items():
+            if best + NAME_WEIGHT >= MERGE_THRESHOLD and is_match(fp, self.fingerprints[other]):
+                self.union(new_id, other)
+
+        for key in keys:
+            block = self.blocks[key]
+            if len(block) < MAX_BLOCK_SIZE:
+                block.append(new_id)
+        return new_id
+
+def merge_fields(survivor, duplicate):
+    """Fill the survivor's empty fields from a duplicate"""
+    for field in MERGED_FIELDS:
+        if not str(survivor.get(field) or '').strip() and str(duplicate.get(field) or '').strip():
+            survivor[field] = duplicate[field]
+
+def merge_near_duplicates(index, records):
+    """
+    Split a chunk of records into (kept, merged), where merged is a list of
+    (duplicate, survivor email) pairs. A duplicate of a record from an earlier
+    chunk is dropped; within the chunk, the first record of each group
+    absorbs the empty fields of the others.
+    """
+    ids = [index.add(fingerprint(record)) for record in records]
+    by_id = dict(zip(ids, records))
+
+    kept, merged = [], []
+    for record_id, record in zip(ids, records):
+        root = index.find(record_id)
+        survivor_id = index.survivor.get(root)
+        if survivor_id is None:
+            index.survivor[root] = record_id
+            kept.append(record)
+            continue
+        survivor = by_id.get(survivor_id)
+        if survivor is None:
+            merged.append((record, index.fingerprints[survivor_id][0]))
+            continue
+        merge_fields(survivor, record)
+        merged.append((record, survivor['email']))
+    return kept, merged
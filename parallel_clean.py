@@ -0,0 +1,173 @@
+"""
+Parallel Cleaning for Online Campus
+Runs the CPU-bound cleaning (email validation and name cleaning from
+batch_validate, phone normalization from phone_normalize) on a pool of
+worker processes, for one-off historical imports of hundreds of thousands
+of rows where a single core is the bottleneck.
+
+A column is split into shards of CLEAN_SHARD_ROWS rows; each shard goes to
+a worker as one Arrow IPC buffer (a memcpy rather than pickling every
+string) and comes back the same way. Results are put back together in
+shard order, and every shard runs the same code as the single-process
+path, so the output is identical with or without the pool.
+
+With CLEAN_WORKERS unset (or 0/1) nothing changes: validate_batch() and
+normalize_phones() here just call the originals. Inputs smaller than
+CLEAN_MIN_ROWS also stay in-process: starting the pool and the Arrow
+hand-off cost more than the workers save on a 100k-row import, so the
+pool is only used for groups large enough to pay that back. Workers are started with "spawn", as the sync stages
+run in threads and forking a threaded process is unsafe.
+"""
+
+import atexit
+import os
+import threading
+
+from batch_validate import HAS_PYARROW, as_text, validate_arrays, validate_batch as validate_in_process
+from phone_normalize import normalize_phones as normalize_in_process
+from pipeline import rechunk
+
+# Configuration
+CLEAN_WORKERS = int(os.getenv('CLEAN_WORKERS', 0))
+CLEAN_SHARD_ROWS = int(os.getenv('CLEAN_SHARD_ROWS', 20_000))
+CLEAN_MIN_ROWS = int(os.getenv('CLEAN_MIN_ROWS', 200_000))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# ============= WORKER POOL =============
+def is_parallel(workers=CLEAN_WORKERS):
+    return workers > 1
+
+def use_pool(n_rows, workers=CLEAN_WORKERS, shard_rows=CLEAN_SHARD_ROWS, min_rows=CLEAN_MIN_ROWS):
+    """Whether a column of n_rows is worth sharding over the pool"""
+    return is_parallel(workers) and n_rows > shard_rows and n_rows >= min_rows
+
+def group_size(workers=CLEAN_WORKERS, shard_rows=CLEAN_SHARD_ROWS, min_rows=CLEAN_MIN_ROWS):
+    """Rows a stage gathers before cleaning, so one group keeps every worker busy"""
+    return max(workers * shard_rows, min_rows)
+
+def regroup(chunks, workers=CLEAN_WORKERS, shard_rows=CLEAN_SHARD_ROWS, min_rows=CLEAN_MIN_ROWS):
+    """Chunks regrouped into group_size() rows when the pool is on, else unchanged"""
+    if not is_parallel(workers):
+        return chunks
+    return rechunk(chunks, group_size(workers, shard_rows, min_rows))
+
+def get_pool(workers):
+    """The process-wide worker pool, started on first use"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warm_up
+            )
+            _pool_workers = workers
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+def warm_up():
+    """Load the gazetteer once per worker instead of in its first shard"""
+    from gazetteer import load_index
+    load_index()
+
+def shard_ranges(n_rows, shard_rows):
+    return [(start, min(start + shard_rows, n_rows)) for start in range(0, n_rows, shard_rows)]
+
+# ============= ARROW HAND-OFF =============
+def pack(columns):
+    """{name: list or pyarrow array} -> Arrow IPC stream bytes holding one record batch"""
+    import pyarrow as pa
+
+    batch = pa.record_batch(
+        [column if isinstance(column, pa.Array) else pa.array(column, pa.string()) for column in columns.values()],
+        names=list(columns)
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+def unpack(data):
+    """Arrow IPC stream bytes -> the record batch in it (zero-copy over the bytes)"""
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_next_batch()
+
+# ============= SHARD TASKS (run in the workers) =============
+# A payload is IPC bytes, or a tuple of plain lists without pyarrow
+def validate_shard(payload):
+    if isinstance(payload, tuple):
+        return validate_in_process(*payload)
+    batch = unpack(payload)
+    valid, stripped, cleaned, rejections = validate_arrays(batch.column('email'), batch.column('name'))
+    return pack({'valid': valid, 'email': stripped, 'name': cleaned}), rejections
+
+def phone_shard(payload):
+    if isinstance(payload, tuple):
+        return normalize_in_process(*payload)
+    batch = unpack(payload)
+    results = normalize_in_process(batch.column('phone').to_pylist(), batch.column('country').to_pylist())
+    return pack({'phone': [phone for phone, _ in results], 'status': [status for _, status in results]})
+
+# ============= PUBLIC API =============
+def validate_batch(emails, names, workers=CLEAN_WORKERS, shard_rows=CLEAN_SHARD_ROWS, min_rows=CLEAN_MIN_ROWS):
+    """batch_validate.validate_batch(), sharded across the worker pool when the column is large"""
+    emails, names = as_text(emails), as_text(names)
+    if not use_pool(len(emails), workers, shard_rows, min_rows):
+        return validate_in_process(emails, names)
+
+    if HAS_PYARROW:
+        payloads = [pack({'email': emails[a:b], 'name': names[a:b]}) for a, b in shard_ranges(len(emails), shard_rows)]
+    else:
+        payloads = [(emails[a:b], names[a:b]) for a, b in shard_ranges(len(emails), shard_rows)]
+
+    valid, stripped, cleaned, rejections = [], [], [], {}
+    for result in get_pool(workers).map(validate_shard, payloads):
+        if isinstance(result[0], bytes):
+            data, reasons = result
+            batch = unpack(data)
+            shard = [batch.column(name).to_pylist() for name in ('valid', 'email', 'name')]
+        else:
+            *shard, reasons = result
+        valid += shard[0]
+        stripped += shard[1]
+        cleaned += shard[2]
+        for reason, count in reasons.items():
+            rejections[reason] = rejections.get(reason, 0) + count
+    return valid, stripped, cleaned, rejections
+
+def normalize_phones(phones, countries, workers=CLEAN_WORKERS, shard_rows=CLEAN_SHARD_ROWS, min_rows=CLEAN_MIN_ROWS):
+    """phone_normalize.normalize_phones(), sharded across the worker pool when the column is large"""
+    phones, countries = list(phones), list(countries)
+    if not use_pool(len(phones), workers, shard_rows, min_rows):
+        return normalize_in_process(phones, countries)
+
+    # normalize_phone() reads both values as text, so sending them as strings changes nothing
+    phones, countries = as_text(phones), as_text(countries)
+    if HAS_PYARROW:
+        payloads = [pack({'phone': phones[a:b], 'country': countries[a:b]}) for a, b in shard_ranges(len(phones), shard_rows)]
+    else:
+        payloads = [(phones[a:b], countries[a:b]) for a, b in shard_ranges(len(phones), shard_rows)]
+
+    results = []
+    for result in get_pool(workers).map(phone_shard, payloads):
+        if isinstance(result, bytes):
+            batch = unpack(result)
+            result = list(zip(batch.column('phone').to_pylist(), batch.column('status').to_pylist()))
+        results += result
+    return results
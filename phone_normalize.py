@@ -0,0 +1,202 @@
+"""
+Local Phone Normalization for Online Campus
+Turns raw form phone numbers into E.164 using the member's resolved
+country, instead of asking OpenAI for a corrected number and stripping it
+with a regex afterwards.
+
+Each number is checked against the national number length and leading
+digit rules for its country. Numbers that fail are flagged with a status
+instead of being silently rewritten. Run this file to check a set of
+known-tricky numbers.
+"""
+
+import re
+
+from gazetteer import load_index, resolve_country_name, COUNTRIES
+
+# National significant number lengths, leading-digit pattern and trunk
+# prefix for the countries our members come from. Countries not listed
+# fall back to GENERIC_RULE.
+PHONE_RULES = {
+    'IN': {'lengths': (10,), 'prefix': r'[2-9]', 'trunk': '0'},
+    'AE': {'lengths': (8, 9), 'prefix': r'[1-9]', 'trunk': '0'},
+    'QA': {'lengths': (8,), 'prefix': r'[3-7]', 'trunk': ''},
+    'KW': {'lengths': (8,), 'prefix': r'[1-9]', 'trunk': ''},
+    'OM': {'lengths': (8,), 'prefix': r'[279]', 'trunk': ''},
+    'BH': {'lengths': (8,), 'prefix': r'[136-9]', 'trunk': ''},
+    'SA': {'lengths': (9,), 'prefix': r'[1-9]', 'trunk': '0'},
+    'GB': {'lengths': (9, 10), 'prefix': r'[1-9]', 'trunk': '0'},
+    'IE': {'lengths': (7, 8, 9), 'prefix': r'[1-9]', 'trunk': '0'},
+    'US': {'lengths': (10,), 'prefix': r'[2-9]', 'trunk': '1'},
+    'CA': {'lengths': (10,), 'prefix': r'[2-9]', 'trunk': '1'},
+    'AU': {'lengths': (9,), 'prefix': r'[2-478]', 'trunk': '0'},
+    'NZ': {'lengths': (8, 9, 10), 'prefix': r'[2-9]', 'trunk': '0'},
+    'SG': {'lengths': (8,), 'prefix': r'[3689]', 'trunk': ''},
+    'MY': {'lengths': (9, 10), 'prefix': r'[1-9]', 'trunk': '0'},
+    'DE': {'lengths': tuple(range(6, 12)), 'prefix': r'[1-9]', 'trunk': '0'},
+    'FR': {'lengths': (9,), 'prefix': r'[1-9]', 'trunk': '0'},
+    'IT': {'lengths': tuple(range(6, 12)), 'prefix': r'[0-9]', 'trunk': ''},
+    'NL': {'lengths': (9,), 'prefix': r'[1-9]', 'trunk': '0'},
+    'LK': {'lengths': (9,), 'prefix': r'[1-9]', 'trunk': '0'},
+}
+GENERIC_RULE = {'lengths': tuple(range(6, 13)), 'prefix': r'[1-9]', 'trunk': '0'}
+
+# A number without + or 00 is only read as international from this many
+# digits on; shorter ones are more likely a bad local number (a 10-digit
+# Indian mobile would otherwise pass as an Iranian +98 number)
+MIN_INTERNATIONAL_DIGITS = 11
+
+NON_DIGITS = re.compile(r'[^0-9]')
+COMPILED_PREFIXES = {}
+
+# Phone statuses
+OK = 'ok'
+EMPTY = 'empty'
+BAD_LENGTH = 'invalid_length'
+BAD_PREFIX = 'invalid_prefix'
+NO_COUNTRY = 'unknown_country'
+
+# ============= RULE LOOKUP =============
+def rule_for(code):
+    rule = PHONE_RULES.get(code, GENERIC_RULE)
+    key = rule['prefix']
+    if key not in COMPILED_PREFIXES:
+        COMPILED_PREFIXES[key] = re.compile(key)
+    return rule, COMPILED_PREFIXES[key]
+
+def dial_code_index():
+    """{dial code: [country codes]} for reading numbers that carry a +prefix"""
+    load_index()
+    index = {}
+    for code, country in COUNTRIES.items():
+        index.setdefault(country['dial_code'], []).append(code)
+    return index
+
+def country_code_for(country):
+    """ISO code for a country name (or alias) as written by the gazetteer or OpenAI"""
+    if not country or country == 'Unknown':
+        return None
+    return resolve_country_name(str(country).strip())
+
+def check_national(code, national):
+    """Validate a national significant number against a country's rules"""
+    rule, prefix = rule_for(code)
+    if len(national) not in rule['lengths']:
+        return BAD_LENGTH
+    if not prefix.match(national):
+        return BAD_PREFIX
+    return OK
+
+# ============= NORMALIZATION =============
+def normalize_international(digits, dial_codes):
+    """Split a number that already carries a country code and validate it"""
+    for size in (3, 2, 1):
+        dial = digits[:size]
+        if dial in dial_codes:
+            national = digits[size:]
+            statuses = [check_national(code, national) for code in dial_codes[dial]]
+            if OK in statuses:
+                return '+' + digits, OK
+            return '+' + digits, statuses[0]
+    return '+' + digits, BAD_PREFIX
+
+def bare_international(digits, dial_codes):
+    """E.164 for digits that are a valid international number written without the plus, else None"""
+    if len(digits) < MIN_INTERNATIONAL_DIGITS:
+        return None
+    e164, status = normalize_international(digits, dial_codes)
+    return e164 if status == OK else None
+
+def normalize_phone(phone, country_code, dial_codes):
+    """Return (E.164 string, status) for one phone number"""
+    raw = str(phone).strip() if phone is not None else ''
+    digits = NON_DIGITS.sub('', raw)
+    if not digits:
+        return '', EMPTY
+
+    # Explicit international format: +CC... or 00CC...
+    if raw.startswith('+'):
+        return normalize_international(digits, dial_codes)
+    if digits.startswith('00'):
+        return normalize_international(digits[2:], dial_codes)
+
+    if country_code is None:
+        # No country to anchor to: accept only if it already parses as international
+        e164 = bare_international(digits, dial_codes)
+        return (e164, OK) if e164 else (digits, NO_COUNTRY)
+
+    dial = COUNTRIES[country_code]['dial_code']
+    rule, _ = rule_for(country_code)
+
+    # Country code written without the plus
+    if digits.startswith(dial) and len(digits) - len(dial) in rule['lengths']:
+        national = digits[len(dial):]
+        if check_national(country_code, national) == OK:
+            return '+' + digits, OK
+
+    national = digits
+    if rule['trunk'] and national.startswith(rule['trunk']) and len(national) - len(rule['trunk']) in rule['lengths']:
+        national = national[len(rule['trunk']):]
+
+    status = check_national(country_code, national)
+    if status != OK:
+        # Might be a foreign number written without the plus
+        e164 = bare_international(digits, dial_codes)
+        return (e164, OK) if e164 else (digits, status)
+    return f"+{dial}{national}", OK
+
+def normalize_phones(phones, countries):
+    """
+    Normalize a whole column of phones against a matching column of countries.
+
+    Returns a list of (E.164 or cleaned digits, status) in input order.
+    Identical (phone, country) pairs are only worked out once.
+    """
+    dial_codes = dial_code_index()
+    country_codes = {}
+    memo = {}
+    results = []
+    for phone, country in zip(phones, countries):
+        key = (phone, country)
+        if key not in memo:
+            if country not in country_codes:
+                country_codes[country] = country_code_for(country)
+            memo[key] = normalize_phone(phone, country_codes[country], dial_codes)
+        results.append(memo[key])
+    return results
+
+def sheet_phone(e164):
+    """Digits-only form stored in Sheet2 (E.164 without the leading +)"""
+    return e164.lstrip('+')
+
+# ============= SELF-CHECK =============
+# (phone, country, expected (E.164 or cleaned digits, status))
+EXAMPLES = [
+    ('98470 12345', 'India', ('+919847012345', OK)),
+    ('+91 98470 12345', None, ('+919847012345', OK)),
+    ('919847012345', None, ('+919847012345', OK)),
+    # Ten bare digits with no country are not read as +98 (Iran); once the
+    # country resolves, unknown_backfill rewrites them
+    ('9876543210', None, ('9876543210', NO_COUNTRY)),
+    ('9876543210', 'India', ('+919876543210', OK)),
+    ('9876543210', 'United Arab Emirates', ('9876543210', BAD_LENGTH)),
+    ('050 123 4567', 'United Arab Emirates', ('+971501234567', OK)),
+    ('447700900123', 'India', ('+447700900123', OK)),
+    ('12345', None, ('12345', NO_COUNTRY)),
+    ('', 'India', ('', EMPTY)),
+]
+
+if __name__ == "__main__":
+    got = normalize_phones([phone for phone, _, _ in EXAMPLES], [country for _, country, _ in EXAMPLES])
+    wrong = [(example, result) for example, result in zip(EXAMPLES, got) if result != example[2]]
+    for (phone, country, want), result in wrong:
+        print(f"❌ {phone!r} ({country}): got {result}, expected {want}")
+    print(f"{len(EXAMPLES) - len(wrong)}/{len(EXAMPLES)} phone examples normalize as expected")
+
+    # The backfill rewrites a phone that only parses once the country is known
+    from unknown_backfill import build_patches
+    changes, _ = build_patches([{'dest_row': 2, 'email': 'a@example.com', 'phone': '9876543210'}],
+                               [{'country': 'India', 'continent': 'Asia'}])
+    backfilled = changes.get((2, 4)) == '919876543210'
+    print(f"{'✅' if backfilled else '❌'} unknown_backfill rewrites 9876543210 once the country resolves to India")
+    exit(1 if wrong or not backfilled else 0)
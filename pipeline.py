@@ -0,0 +1,120 @@
+"""
+Streaming Pipeline Helpers for Online Campus
+Small building blocks for running the weekly sync as a chain of generator
+stages (fetch -> validate -> clean name -> enrich -> clean phone -> upload)
+instead of building one full list per step.
+
+Stages pass chunks (lists of records) to each other. threaded() runs a
+stage in a background thread behind a bounded queue, so downstream stages
+(e.g. upload) start on early chunks while upstream ones are still working
+on later rows, and no more than QUEUE_SIZE chunks sit in memory between
+any two stages.
+
+Closing a threaded() generator (or the consumer failing) stops its worker:
+the worker stops putting into the queue, closes the stage it was running,
+and is joined before close() returns. A chain of threaded stages therefore
+winds down from the bottom up, and nothing still uses a stage's resources
+(e.g. its SQLite connection) once the pipeline has been closed.
+"""
+
+import os
+import queue
+import threading
+
+from source_watermark import SOURCE_RANGE_END, pad_row
+
+# Configuration
+PAGE_SIZE = int(os.getenv('SOURCE_PAGE_SIZE', 500))
+QUEUE_SIZE = 4
+STOP_POLL = 0.1  # seconds a blocked worker waits before checking whether it was stopped
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def threaded(iterable, maxsize=QUEUE_SIZE):
+    """Iterate `iterable` in a background thread and yield its items from a bounded queue"""
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        """Queue an item; False once the consumer has gone away"""
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=STOP_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in iterable:
+                if not put(item):
+                    break
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            # Close the stage here, in its own thread, so its upstream
+            # stages are stopped and joined in turn
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+            put(_DONE)
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                break
+        thread.join()
+
+def rechunk(chunks, size):
+    """Regroup a stream of chunks into chunks of exactly `size` (the last may be shorter)"""
+    buffer = []
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield buffer[:size]
+            buffer = buffer[size:]
+    if buffer:
+        yield buffer
+
+def fetch_pages(worksheet, first_row_number, rows, more, state, page_size=PAGE_SIZE):
+    """
+    Yield chunks of (row_number, row) starting with rows already read, then
+    page through the rest of the sheet with A{n}:E{n+page_size-1} range reads
+    while `more` says there may be further rows.
+
+    state['last'] is kept at the last (row_number, row) seen, for the watermark.
+    """
+    row_number = first_row_number
+    while True:
+        for start in range(0, len(rows), page_size):
+            chunk = [(row_number + offset, pad_row(row)) for offset, row in enumerate(rows[start:start + page_size], start)]
+            state['last'] = chunk[-1]
+            yield chunk
+        row_number += len(rows)
+
+        if not more:
+            return
+        rows = worksheet.get(f'A{row_number}:{SOURCE_RANGE_END}{row_number + page_size - 1}')
+        more = len(rows) == page_size
+        if not rows:
+            return
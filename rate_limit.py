@@ -0,0 +1,53 @@
+"""
+Token Bucket Rate Limiter for Online Campus
+Paces calls against a per-minute budget (requests or tokens). Callers
+reserve capacity up front and sleep for however long the bucket says,
+so the same bucket can be shared by threads and by asyncio tasks.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Refills at rate_per_minute / 60 per second, up to capacity"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        """Take amount from the bucket and return how long to wait before using it"""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def pause(self, seconds):
+        """Empty the bucket so nobody gets capacity for the next `seconds`"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def acquire(self, amount=1):
+        """Blocking acquire for threaded callers"""
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, amount=1):
+        """Non-blocking acquire for asyncio callers"""
+        wait = self.reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
@@ -0,0 +1,236 @@
+"""
+Run Instrumentation for Online Campus
+Collects metrics while a sync runs:
+
+- wall time per stage, and traced memory per stage when tracemalloc is on
+- Sheets API calls and bytes sent/received (counted by sheets_client)
+- OpenAI request latency percentiles and exact prompt/completion tokens
+- rows OpenAI had to be asked again for, and rows left Unknown
+- city cache and gazetteer hit rates
+
+finish_run() writes them to a JSON report in RUN_REPORT_DIR and to a row in
+the runs table of sync_tracker.db, so week-over-week regressions show up in
+a single query.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from enrichment_cache import CACHE_STATS
+from gazetteer import GAZETTEER_STATS
+
+# Configuration
+RUN_REPORT_DIR = os.getenv('RUN_REPORT_DIR', 'reports')
+# gpt-4o-mini pricing: $0.150 per 1M input tokens, $0.600 per 1M output tokens
+PRICE_PER_M_INPUT = 0.150
+PRICE_PER_M_OUTPUT = 0.600
+
+METRICS = {}
+_lock = threading.Lock()
+
+def reset_metrics():
+    with _lock:
+        METRICS.clear()
+        METRICS.update({
+            'stages': {},
+            'stage_memory': {},
+            'sheets': {'calls': 0, 'errors': 0, 'bytes_sent': 0, 'bytes_received': 0, 'by_method': {}},
+            'openai': {'calls': 0, 'errors': 0, 'latencies': [],
+                       'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0,
+                       'retried_rows': 0, 'unresolved_rows': 0},
+        })
+
+reset_metrics()
+
+# ============= RECORDING =============
+def add_stage_time(name, seconds):
+    with _lock:
+        METRICS['stages'][name] = METRICS['stages'].get(name, 0.0) + seconds
+
+def sample_stage_memory(name):
+    """
+    Keep the highest traced memory seen at stage `name`'s chunk boundaries.
+
+    Only runs while tracemalloc is tracing (the benchmark turns it on). The
+    sample is process-wide, so it includes whatever the stages running
+    alongside hold, and it misses allocations freed again inside one block.
+    """
+    if not tracemalloc.is_tracing():
+        return
+    current = tracemalloc.get_traced_memory()[0]
+    with _lock:
+        memory = METRICS['stage_memory']
+        memory[name] = max(memory.get(name, 0), current)
+
+@contextmanager
+def stage_timer(name):
+    """Add the wall time of the block to stage `name` (accumulates across chunks)"""
+    sample_stage_memory(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(name, time.perf_counter() - start)
+        sample_stage_memory(name)
+
+def timed(name, iterable):
+    """Yield from iterable, charging the time spent producing each item to stage `name`"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            add_stage_time(name, time.perf_counter() - start)
+            sample_stage_memory(name)
+        yield item
+
+def record_sheets_call(method, bytes_sent, bytes_received, ok=True):
+    with _lock:
+        sheets = METRICS['sheets']
+        sheets['calls'] += 1
+        sheets['errors'] += 0 if ok else 1
+        sheets['bytes_sent'] += bytes_sent
+        sheets['bytes_received'] += bytes_received
+        sheets['by_method'][method] = sheets['by_method'].get(method, 0) + 1
+
+def record_openai_call(latency, usage=None, ok=True):
+    """One chat completion request: its latency in seconds and usage object"""
+    with _lock:
+        openai = METRICS['openai']
+        openai['calls'] += 1
+        openai['errors'] += 0 if ok else 1
+        openai['latencies'].append(latency)
+        if usage:
+            openai['prompt_tokens'] += usage.prompt_tokens
+            openai['completion_tokens'] += usage.completion_tokens
+            openai['total_tokens'] += usage.total_tokens
+
+def record_openai_rows(retried=0, unresolved=0):
+    """Rows re-asked after failing validation, and rows that never passed it"""
+    with _lock:
+        METRICS['openai']['retried_rows'] += retried
+        METRICS['openai']['unresolved_rows'] += unresolved
+
+def percentiles(values):
+    """p50/p90/p99/max in milliseconds (nearest rank)"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for p in (50, 90, 99):
+        rank = max(1, math.ceil(p / 100 * len(ordered)))
+        result[f'p{p}'] = round(ordered[rank - 1] * 1000, 1)
+    result['max'] = round(ordered[-1] * 1000, 1)
+    return result
+
+def estimate_cost(prompt_tokens, completion_tokens):
+    return (prompt_tokens / 1_000_000) * PRICE_PER_M_INPUT + (completion_tokens / 1_000_000) * PRICE_PER_M_OUTPUT
+
+def hit_rate(stats, since):
+    """Hits and misses since the `since` snapshot of a *_STATS dict"""
+    hits = stats['hits'] - since['hits']
+    misses = stats['misses'] - since['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+# ============= DATABASE FUNCTIONS =============
+def init_runs(conn):
+    """Create the runs table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            script TEXT NOT NULL,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP NOT NULL,
+            status TEXT NOT NULL,
+            duration_s REAL,
+            records_read INTEGER,
+            records_uploaded INTEGER,
+            sheets_calls INTEGER,
+            sheets_bytes INTEGER,
+            openai_calls INTEGER,
+            openai_p50_ms REAL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            cost_usd REAL,
+            report_path TEXT,
+            report TEXT
+        )
+    ''')
+    conn.commit()
+    return conn
+
+# ============= REPORT =============
+def start_run(script):
+    """Reset the counters and return a handle for finish_run()"""
+    reset_metrics()
+    return {'script': script, 'started_at': datetime.now(), 'clock': time.perf_counter(),
+            'traced_memory': tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0,
+            'city_cache': dict(CACHE_STATS), 'gazetteer': dict(GAZETTEER_STATS)}
+
+def build_report(run, status, counts=None):
+    with _lock:
+        stages = {name: round(seconds, 3) for name, seconds in METRICS['stages'].items()}
+        # Above what was already traced when the run started, like the benchmark's totals
+        stage_memory = {name: round(max(traced - run['traced_memory'], 0) / 2 ** 20, 2)
+                        for name, traced in METRICS['stage_memory'].items()}
+        sheets = dict(METRICS['sheets'], by_method=dict(METRICS['sheets']['by_method']))
+        openai = dict(METRICS['openai'])
+        latencies = openai.pop('latencies')
+
+    openai['latency_ms'] = percentiles(latencies)
+    openai['cost_usd'] = round(estimate_cost(openai['prompt_tokens'], openai['completion_tokens']), 6)
+    return {
+        'script': run['script'],
+        'status': status,
+        'started_at': run['started_at'].isoformat(timespec='seconds'),
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'duration_s': round(time.perf_counter() - run['clock'], 3),
+        'counts': counts or {},
+        'stages_s': stages,
+        'stages_peak_mib': stage_memory,
+        'sheets': sheets,
+        'openai': openai,
+        'city_cache': hit_rate(CACHE_STATS, run['city_cache']),
+        'gazetteer': hit_rate(GAZETTEER_STATS, run['gazetteer']),
+    }
+
+def finish_run(conn, run, status, counts=None):
+    """Write the JSON report and the runs row; returns the report"""
+    report = build_report(run, status, counts)
+
+    os.makedirs(RUN_REPORT_DIR, exist_ok=True)
+    stamp = run['started_at'].strftime('%Y%m%d-%H%M%S-%f')
+    report_path = os.path.join(RUN_REPORT_DIR, f"{run['script']}-{stamp}.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    counts = report['counts']
+    init_runs(conn)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO runs (script, started_at, finished_at, status, duration_s, records_read, records_uploaded,
+                          sheets_calls, sheets_bytes, openai_calls, openai_p50_ms, prompt_tokens,
+                          completion_tokens, cost_usd, report_path, report)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        report['script'], report['started_at'], report['finished_at'], status, report['duration_s'],
+        counts.get('read'), counts.get('uploaded'),
+        report['sheets']['calls'], report['sheets']['bytes_sent'] + report['sheets']['bytes_received'],
+        report['openai']['calls'], report['openai']['latency_ms'].get('p50'),
+        report['openai']['prompt_tokens'], report['openai']['completion_tokens'], report['openai']['cost_usd'],
+        report_path, json.dumps(report)
+    ))
+    conn.commit()
+    print(f"📝 Run report: {report_path}")
+    return report
@@ -0,0 +1,133 @@
+"""
+Shared Google Sheets Access for Online Campus
+One authorized gspread client per process (its requests session keeps the
+HTTPS connection to Google alive between calls) and spreadsheet IDs
+resolved from titles cached in sync_tracker.db.
+
+gc.open(title) costs a Drive search plus a metadata read, and
+get_worksheet()/sheet1 read the metadata again. open_worksheet() reads the
+metadata once by cached ID and builds the worksheet from it, so opening a
+known sheet is a single Sheets API call. The Drive search only runs the
+first time, or when the cached ID stops working.
+
+gspread and google.oauth2 are imported on the first get_client() call, not
+at import time, so a run that never reaches Google Sheets does not pay for
+them. Every call made through the client draws from one SHEETS_RPM_LIMIT
+token bucket, shared by all the sync pairs running in the process.
+"""
+
+import os
+from http import HTTPStatus
+
+# Configuration
+SERVICE_ACCOUNT_FILE = 'credentials.json'
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+METADATA_PARAMS = {
+    'includeGridData': 'false',
+    'fields': 'spreadsheetId,properties,sheets.properties'
+}
+# Google's default quota is 60 requests per minute per user; 0 turns pacing off
+SHEETS_RPM_LIMIT = int(os.getenv('SHEETS_RPM_LIMIT', 60))
+
+_client = None
+
+# ============= DATABASE FUNCTIONS =============
+def init_sheet_ids(conn):
+    """Create the spreadsheet ID cache if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS spreadsheet_ids (
+            title TEXT PRIMARY KEY,
+            spreadsheet_id TEXT NOT NULL,
+            resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def get_cached_id(conn, title):
+    cursor = conn.cursor()
+    cursor.execute('SELECT spreadsheet_id FROM spreadsheet_ids WHERE title = ?', (title,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def save_cached_id(conn, title, spreadsheet_id):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO spreadsheet_ids (title, spreadsheet_id, resolved_at)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(title) DO UPDATE SET
+            spreadsheet_id = excluded.spreadsheet_id,
+            resolved_at = excluded.resolved_at
+    ''', (title, spreadsheet_id))
+    conn.commit()
+
+def forget_cached_id(conn, title):
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM spreadsheet_ids WHERE title = ?', (title,))
+    conn.commit()
+
+# ============= CLIENT =============
+def get_client():
+    """The process-wide authorized gspread client"""
+    global _client
+    if _client is None:
+        import gspread
+        from google.oauth2.service_account import Credentials
+        from sheets_gspread import InstrumentedHTTPClient
+
+        credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+        _client = gspread.authorize(credentials, http_client=InstrumentedHTTPClient)
+    return _client
+
+def service_account_email():
+    """The address the sheets must be shared with, for error messages"""
+    try:
+        return get_client().http_client.auth.service_account_email
+    except Exception:
+        return "the service account email"
+
+# ============= OPENING =============
+def resolve_id(gc, title):
+    """Drive search for a spreadsheet title (the call the cache avoids)"""
+    from gspread.exceptions import SpreadsheetNotFound
+
+    for file in gc.list_spreadsheet_files(title):
+        if file['name'] == title:
+            return file['id']
+    raise SpreadsheetNotFound(f"Spreadsheet '{title}' not found")
+
+def fetch_metadata(gc, spreadsheet_id):
+    return gc.http_client.fetch_sheet_metadata(spreadsheet_id, params=METADATA_PARAMS)
+
+def open_spreadsheet(conn, title):
+    """Open a spreadsheet by title, by its cached ID when we have one"""
+    from gspread.exceptions import APIError
+    from sheets_gspread import CachedSpreadsheet
+
+    gc = get_client()
+    spreadsheet_id = get_cached_id(conn, title)
+
+    if spreadsheet_id is not None:
+        try:
+            metadata = fetch_metadata(gc, spreadsheet_id)
+            if metadata['properties']['title'] == title:
+                return CachedSpreadsheet(gc.http_client, metadata)
+            print(f"      ⚠️  Spreadsheet {spreadsheet_id} is no longer titled '{title}', resolving again")
+        except APIError as e:
+            if e.response.status_code not in (HTTPStatus.NOT_FOUND, HTTPStatus.FORBIDDEN):
+                raise
+            print(f"      ⚠️  Cached ID for '{title}' no longer opens, resolving again")
+        forget_cached_id(conn, title)
+
+    spreadsheet_id = resolve_id(gc, title)
+    metadata = fetch_metadata(gc, spreadsheet_id)
+    save_cached_id(conn, title, spreadsheet_id)
+    return CachedSpreadsheet(gc.http_client, metadata)
+
+def open_worksheet(conn, title, index=0):
+    """Open worksheet `index` (0 = Sheet1, 1 = Sheet2) of a spreadsheet by title"""
+    return open_spreadsheet(conn, title).worksheet_at(index)
@@ -0,0 +1,74 @@
+"""
+gspread Extensions for Online Campus
+The gspread subclasses behind sheets_client: an HTTP client that counts
+every Sheets call in run_report, and a Spreadsheet built from metadata we
+already fetched.
+
+Importing gspread (and google.auth, requests) takes a noticeable part of
+a second, so sheets_client only imports this module the first time a
+script actually talks to Google Sheets.
+"""
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from gspread.spreadsheet import Spreadsheet
+from gspread.worksheet import Worksheet
+
+from rate_limit import TokenBucket
+from run_report import record_sheets_call
+from sheets_client import SHEETS_RPM_LIMIT
+
+# Shared by every thread (and sync pair) using the process-wide client
+SHEETS_BUCKET = TokenBucket(SHEETS_RPM_LIMIT) if SHEETS_RPM_LIMIT else None
+
+# ============= CLIENT =============
+def call_name(method, endpoint):
+    """Short label for a request: 'GET values', 'POST values:append', 'GET metadata', ..."""
+    if '/drive/' in endpoint:
+        return f"{method} drive"
+    path = endpoint.split('/spreadsheets/', 1)[-1].split('?', 1)[0]
+    spreadsheet, _, rest = path.partition('/')
+    if not rest:
+        action = spreadsheet.partition(':')[2]
+        return f"{method} {action or 'metadata'}"
+    kind = rest.split('/', 1)[0].split(':', 1)[0]
+    # Actions are camelCase verbs (append, batchUpdate); "A1:E5" is a range
+    action = rest.rpartition(':')[2] if ':' in rest else ''
+    if not (action.isalpha() and action[0].islower()):
+        action = ''
+    return f"{method} {kind}:{action}" if action else f"{method} {kind}"
+
+def body_size(response):
+    body = response.request.body if response.request is not None else None
+    return len(body) if body else 0
+
+class InstrumentedHTTPClient(HTTPClient):
+    """
+    gspread's HTTP client, paced by the shared Sheets rate limit and
+    counting every call and its bytes in run_report
+    """
+
+    def request(self, method, endpoint, *args, **kwargs):
+        if SHEETS_BUCKET is not None:
+            SHEETS_BUCKET.acquire()
+        name = call_name(method.upper(), endpoint)
+        try:
+            response = super().request(method, endpoint, *args, **kwargs)
+        except APIError as e:
+            record_sheets_call(name, body_size(e.response), len(e.response.content), ok=False)
+            raise
+        record_sheets_call(name, body_size(response), len(response.content))
+        return response
+
+# ============= SPREADSHEETS =============
+class CachedSpreadsheet(Spreadsheet):
+    """A gspread Spreadsheet built from metadata we already fetched"""
+
+    def __init__(self, http_client, metadata):
+        self.client = http_client
+        self._properties = dict(metadata['properties'], id=metadata['spreadsheetId'])
+        self._sheets = [sheet['properties'] for sheet in metadata.get('sheets', [])]
+
+    def worksheet_at(self, index):
+        """Like get_worksheet(index), without reading the metadata again"""
+        return Worksheet(self, self._sheets[index], self.id, self.client)
@@ -0,0 +1,230 @@
+"""
+Source Change Capture for Online Campus
+Keeps a snapshot of the form sheet in sync_tracker.db, one entry per
+response: a key made from the response's email (plus a counter for a
+second response with the same email), its current row number, and a hash
+of its A:E cells. A diff run reads the form in large range pages and
+compares each row with the snapshot in one pass:
+
+- insert: a key not in the snapshot (a new response)
+- update: a known key whose hash changed (an older response was edited)
+- delete: a key in the snapshot that is no longer in the sheet
+
+Keys do not depend on row numbers, so deleting or sorting rows does not
+make the rows below them look changed, and no single boundary email has
+to be found again. They do not include the Timestamp either: Google Forms
+rewrites it when a respondent uses "edit response", and the edit must
+come through as an update of the member, not as a new one. A response
+whose email is edited shows up as a delete plus an insert.
+
+Reading the whole form costs one range read per SNAPSHOT_PAGE_SIZE rows,
+even when nothing changed, so the sync only diffs when asked to (or every
+Nth run, see weekly_sync.py). The other runs read the rows after the
+watermark and add them to the snapshot with append_rows(), so the next
+diff does not take them for new responses.
+
+The snapshot is only written by commit_scan(), once the run has
+finished, so a run that dies half way sees the same changes again next
+time (the stage checkpoints then skip what it already did). The scan
+itself does not touch the database, so it can run in a pipeline thread.
+"""
+
+import os
+
+from source_watermark import SOURCE_RANGE_END, pad_row, row_checksum
+
+# Configuration
+SNAPSHOT_PAGE_SIZE = int(os.getenv('SNAPSHOT_PAGE_SIZE', 5000))
+FIRST_DATA_ROW = 2   # row 1 is the form header
+
+KEY_SEPARATOR = '\x1f'
+
+# Change kinds
+INSERT = 'insert'
+UPDATE = 'update'
+
+# ============= DATABASE FUNCTIONS =============
+def init_snapshot(conn):
+    """Create the source snapshot table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS source_snapshot (
+            source_sheet TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            source_row INTEGER NOT NULL,
+            row_hash TEXT NOT NULL,
+            email_norm TEXT,
+            PRIMARY KEY (source_sheet, row_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS snapshot_runs (
+            source_sheet TEXT PRIMARY KEY,
+            runs_since_diff INTEGER NOT NULL DEFAULT 0,
+            diffed_at TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def diff_due(conn, source_sheet, every):
+    """Whether this run should diff: every Nth run of the source (never with every=0)"""
+    if every <= 0:
+        return False
+    cursor = conn.cursor()
+    cursor.execute('SELECT runs_since_diff FROM snapshot_runs WHERE source_sheet = ?', (source_sheet,))
+    row = cursor.fetchone()
+    return row is None or row[0] + 1 >= every
+
+def record_run(conn, source_sheet, diffed):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO snapshot_runs (source_sheet, runs_since_diff, diffed_at)
+        VALUES (?, ?, CASE WHEN ? THEN CURRENT_TIMESTAMP END)
+        ON CONFLICT(source_sheet) DO UPDATE SET
+            runs_since_diff = CASE WHEN ? THEN 0 ELSE runs_since_diff + 1 END,
+            diffed_at = COALESCE(excluded.diffed_at, diffed_at)
+    ''', (source_sheet, 0 if diffed else 1, diffed, diffed))
+    conn.commit()
+
+def snapshot_size(conn, source_sheet):
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM source_snapshot WHERE source_sheet = ?', (source_sheet,))
+    return cursor.fetchone()[0]
+
+def load_snapshot(conn, source_sheet):
+    """{row_key: (source_row, row_hash, email_norm)} for one source sheet"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT row_key, source_row, row_hash, email_norm FROM source_snapshot WHERE source_sheet = ?',
+        (source_sheet,)
+    )
+    return {key: (source_row, row_hash, email) for key, source_row, row_hash, email in cursor.fetchall()}
+
+# ============= ROW IDENTITY =============
+def email_key(email_norm, occurrence=0):
+    return f'{email_norm}{KEY_SEPARATOR}{occurrence}'
+
+def row_key(row, occurrence=0):
+    """Identity of a response: its email, plus a counter for a later response with the same email"""
+    return email_key(str(row[1]).strip().lower(), occurrence)
+
+def is_blank(row):
+    return not any(str(cell).strip() for cell in row)
+
+# ============= SCAN =============
+def read_pages(worksheet, page_size=SNAPSHOT_PAGE_SIZE):
+    """Yield (first_row_number, rows) for the whole form, one range read per page"""
+    row_number = FIRST_DATA_ROW
+    while True:
+        rows = worksheet.get(f'A{row_number}:{SOURCE_RANGE_END}{row_number + page_size - 1}')
+        if rows:
+            yield row_number, [pad_row(row) for row in rows]
+        if len(rows) < page_size:
+            return
+        row_number += page_size
+
+def scan_changes(snapshot, worksheet, state, baseline_row=None, page_size=SNAPSHOT_PAGE_SIZE):
+    """
+    Compare the form with its snapshot (from load_snapshot), page by page.
+
+    Yields chunks of (row_number, row) for inserted responses, so they can
+    stream into the pipeline while later pages are still being read;
+    edited responses are collected in state['updates']. state['last'] is
+    the last (row_number, row) of the sheet, for the watermark, and
+    state['entries'] the snapshot rows commit_scan() has to write.
+
+    With baseline_row (no snapshot yet), rows up to it are taken as already
+    synced and only recorded, and the rows after it are inserts.
+    """
+    state.update({'snapshot': snapshot, 'seen': set(), 'entries': [], 'updates': [], 'last': None})
+    occurrences = {}
+
+    for first_row, rows in read_pages(worksheet, page_size):
+        inserts = []
+        for row_number, row in enumerate(rows, first_row):
+            if is_blank(row):
+                continue
+            state['last'] = (row_number, row)
+            base = row_key(row)
+            occurrence = occurrences.get(base, 0)
+            occurrences[base] = occurrence + 1
+            key = base if occurrence == 0 else row_key(row, occurrence)
+            state['seen'].add(key)
+
+            checksum = row_checksum(row)
+            known = snapshot.get(key)
+            if known is None:
+                change = None if baseline_row is not None and row_number <= baseline_row else INSERT
+            elif known[1] != checksum:
+                change = UPDATE
+            elif known[0] == row_number:
+                continue                   # unchanged and not moved
+            else:
+                change = None
+
+            state['entries'].append((key, row_number, checksum, row[1].strip().lower()))
+            if change == INSERT:
+                inserts.append((row_number, row))
+            elif change == UPDATE:
+                state['updates'].append((row_number, row))
+
+        if inserts:
+            yield inserts
+
+# ============= TAIL READS =============
+def track_rows(chunks, state):
+    """Pass chunks of (row_number, row) through, noting each row in state['tail'] for append_rows()"""
+    for chunk in chunks:
+        state['tail'].extend(
+            (row_number, row_checksum(row), str(row[1]).strip().lower())
+            for row_number, row in chunk if not is_blank(row)
+        )
+        yield chunk
+
+def append_rows(conn, source_sheet, tail):
+    """
+    Add rows read after the watermark to an existing snapshot. They come
+    after every row already in it, so their occurrence counters continue
+    from the entries stored for the same email.
+    """
+    cursor = conn.cursor()
+    occurrences = {}
+    entries = []
+    for row_number, checksum, email in tail:
+        if email not in occurrences:
+            cursor.execute('SELECT COUNT(*) FROM source_snapshot WHERE source_sheet = ? AND email_norm = ?',
+                           (source_sheet, email))
+            occurrences[email] = cursor.fetchone()[0]
+        entries.append((source_sheet, email_key(email, occurrences[email]), row_number, checksum, email))
+        occurrences[email] += 1
+    cursor.executemany('''
+        INSERT INTO source_snapshot (source_sheet, row_key, source_row, row_hash, email_norm)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(source_sheet, row_key) DO UPDATE SET
+            source_row = excluded.source_row,
+            row_hash = excluded.row_hash,
+            email_norm = excluded.email_norm
+    ''', entries)
+    conn.commit()
+
+def commit_scan(conn, source_sheet, state):
+    """
+    Settle a finished scan: new, edited and moved rows are written, and
+    responses no longer in the sheet removed, in one transaction. Returns
+    the deleted responses as (source_row, email_norm) pairs.
+    """
+    deleted = [key for key in state['snapshot'] if key not in state['seen']]
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO source_snapshot (source_sheet, row_key, source_row, row_hash, email_norm)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(source_sheet, row_key) DO UPDATE SET
+            source_row = excluded.source_row,
+            row_hash = excluded.row_hash,
+            email_norm = excluded.email_norm
+    ''', [(source_sheet,) + entry for entry in state['entries']])
+    cursor.executemany('DELETE FROM source_snapshot WHERE source_sheet = ? AND row_key = ?',
+                       [(source_sheet, key) for key in deleted])
+    conn.commit()
+    return sorted(state['snapshot'][key][0::2] for key in deleted)
@@ -0,0 +1,165 @@
+"""
+Source Sheet Watermark for Online Campus
+Remembers the sheet row of the last synced form response, plus a checksum
+of that row, in sync_tracker.db. The next run reads only A{row}:E instead of
+calling get_all_values() on the whole form history.
+
+The first row of that range is the old boundary row itself. If its checksum
+no longer matches (the row was edited, or rows above it were deleted) the
+watermark is discarded and the caller falls back to the full email scan.
+
+The stage scripts write the newcomers file in one step and upload it in
+another, so test_sheets.py stages the source row behind each file row and
+upload_to_sheets.py moves the watermark past every chunk it commits.
+"""
+
+import hashlib
+
+# Source columns: Timestamp, Email Address, Name, City, Phone number
+SOURCE_COLUMNS = 5
+SOURCE_RANGE_END = 'E'
+
+# ============= DATABASE FUNCTIONS =============
+def init_watermark(conn):
+    """Create the source watermark and staged rows tables if they do not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS source_watermark (
+            source_sheet TEXT PRIMARY KEY,
+            last_row INTEGER NOT NULL,
+            row_checksum TEXT NOT NULL,
+            last_email TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS staged_rows (
+            source_sheet TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            source_row INTEGER NOT NULL,
+            row_checksum TEXT NOT NULL,
+            last_email TEXT,
+            PRIMARY KEY (source_sheet, position)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def get_watermark(conn, source_sheet):
+    """Return (last_row, row_checksum) for a source sheet, or None"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT last_row, row_checksum FROM source_watermark WHERE source_sheet = ?',
+        (source_sheet,)
+    )
+    return cursor.fetchone()
+
+def save_watermark(conn, source_sheet, row_number, row):
+    """Store the sheet row number and checksum of the last synced source row"""
+    email = row[1].strip() if len(row) > 1 else None
+    write_watermark(conn, source_sheet, row_number, row_checksum(row), email)
+
+def write_watermark(conn, source_sheet, row_number, checksum, email):
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO source_watermark (source_sheet, last_row, row_checksum, last_email, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source_sheet) DO UPDATE SET
+            last_row = excluded.last_row,
+            row_checksum = excluded.row_checksum,
+            last_email = excluded.last_email,
+            updated_at = excluded.updated_at
+    ''', (source_sheet, row_number, checksum, email))
+    conn.commit()
+
+def clear_watermark(conn, source_sheet):
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM source_watermark WHERE source_sheet = ?', (source_sheet,))
+    conn.commit()
+
+# ============= STAGED ROWS =============
+def stage_rows(conn, source_sheet, numbered_rows):
+    """Remember the (row_number, row) behind each row of the newcomers file, replacing the last batch"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM staged_rows WHERE source_sheet = ?', (source_sheet,))
+    cursor.executemany('''
+        INSERT INTO staged_rows (source_sheet, position, source_row, row_checksum, last_email)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [
+        (source_sheet, position, row_number, row_checksum(row), row[1].strip() if len(row) > 1 else None)
+        for position, (row_number, row) in enumerate(numbered_rows)
+    ])
+    conn.commit()
+
+def advance_watermark(conn, source_sheet, uploaded):
+    """
+    Move the watermark to the source row of the last of the first `uploaded`
+    staged rows, once they are in the destination. Never moves it back.
+    """
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT source_row, row_checksum, last_email FROM staged_rows
+        WHERE source_sheet = ? AND position = ?
+    ''', (source_sheet, uploaded - 1))
+    staged = cursor.fetchone()
+    watermark = get_watermark(conn, source_sheet)
+    if staged is None or (watermark is not None and watermark[0] >= staged[0]):
+        return
+    write_watermark(conn, source_sheet, *staged)
+
+# ============= RANGE READS =============
+def row_checksum(row):
+    """Stable hash of a source row's A:E cells (trailing blanks ignored)"""
+    cells = [str(cell).strip() for cell in list(row)[:SOURCE_COLUMNS]]
+    while cells and cells[-1] == '':
+        cells.pop()
+    return hashlib.sha1('\x1f'.join(cells).encode('utf-8')).hexdigest()
+
+def pad_row(row):
+    """Range reads drop trailing empty cells; pad back to the A:E width"""
+    row = list(row)
+    return row + [''] * (SOURCE_COLUMNS - len(row))
+
+def read_since_watermark(conn, source_sheet_name, worksheet, limit=None):
+    """
+    Read the rows after the stored watermark with one range request.
+
+    Returns (first_row_number, rows) where first_row_number is the sheet row
+    of rows[0], or None when there is no usable watermark and the caller
+    has to locate the boundary with a full scan. With `limit`, at most that
+    many rows after the watermark are read; the caller pages for the rest.
+    """
+    watermark = get_watermark(conn, source_sheet_name)
+    if watermark is None:
+        return None
+
+    last_row, checksum = watermark
+    end_row = last_row + limit if limit else ''
+    values = worksheet.get(f'A{last_row}:{SOURCE_RANGE_END}{end_row}')
+
+    if not values or row_checksum(values[0]) != checksum:
+        print(f"      ⚠️  Source row {last_row} changed since last sync, rescanning")
+        clear_watermark(conn, source_sheet_name)
+        return None
+
+    return last_row + 1, [pad_row(row) for row in values[1:]]
+
+def count_since_watermark(conn, source_sheet_name, worksheet):
+    """
+    Count the rows after the stored watermark without reading them: one
+    batchGet of the boundary row (to check its checksum) and of column A
+    below it. Returns None when there is no usable watermark; unlike
+    read_since_watermark, a stale watermark is left for the next sync.
+    """
+    watermark = get_watermark(conn, source_sheet_name)
+    if watermark is None:
+        return None
+
+    last_row, checksum = watermark
+    boundary, below = worksheet.batch_get([
+        f'A{last_row}:{SOURCE_RANGE_END}{last_row}',
+        f'A{last_row + 1}:A'
+    ])
+    if not boundary or row_checksum(boundary[0]) != checksum:
+        return None
+    return len(below)
@@ -0,0 +1,106 @@
+"""
+Per-Record Stage Checkpoints for Online Campus
+Records how far each new source row got through the weekly sync
+(validated -> enriched -> uploaded, or merged into a near-duplicate) in
+sync_tracker.db, keyed by source sheet row and email.
+
+The source watermark only advances once a whole run finishes, so a run
+that dies half way reads the same rows again next time. With these
+checkpoints those rows resume where they stopped: enriched rows reuse the
+stored country/continent instead of calling OpenAI again, and uploaded or
+merged rows are skipped. Checkpoints at or before the watermark are
+pruned at the end of a successful run.
+"""
+
+from email_index import normalize_email
+
+VALIDATED = 'validated'
+ENRICHED = 'enriched'
+UPLOADED = 'uploaded'
+MERGED = 'merged'
+
+# ============= DATABASE FUNCTIONS =============
+def init_checkpoints(conn):
+    """Create the record stage table if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS record_stages (
+            source_sheet TEXT NOT NULL,
+            source_row INTEGER NOT NULL,
+            email_norm TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            country TEXT,
+            continent TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_sheet, source_row)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def load_checkpoints(conn, source_sheet, records):
+    """
+    Return {source_row: (stage, country, continent)} for records that
+    already have a checkpoint under the same email.
+    """
+    if not records:
+        return {}
+    rows = [record['source_row'] for record in records]
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT source_row, email_norm, stage, country, continent FROM record_stages '
+        'WHERE source_sheet = ? AND source_row BETWEEN ? AND ?',
+        (source_sheet, min(rows), max(rows))
+    )
+    stored = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    checkpoints = {}
+    for record in records:
+        entry = stored.get(record['source_row'])
+        # A different email means the sheet changed under us: start that row over
+        if entry and entry[0] == normalize_email(record['email']):
+            checkpoints[record['source_row']] = entry[1:]
+    return checkpoints
+
+def save_checkpoints(conn, source_sheet, records, stage):
+    """Move records to `stage` (never backwards), storing enrichment if present"""
+    entries = [
+        (source_sheet, record['source_row'], normalize_email(record['email']), stage,
+         record.get('country'), record.get('continent'))
+        for record in records
+    ]
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO record_stages (source_sheet, source_row, email_norm, stage, country, continent, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source_sheet, source_row) DO UPDATE SET
+            email_norm = excluded.email_norm,
+            stage = CASE
+                WHEN record_stages.email_norm != excluded.email_norm THEN excluded.stage
+                WHEN record_stages.stage IN ('uploaded', 'merged') THEN record_stages.stage
+                WHEN record_stages.stage = 'enriched' AND excluded.stage = 'validated' THEN record_stages.stage
+                ELSE excluded.stage
+            END,
+            country = COALESCE(excluded.country, record_stages.country),
+            continent = COALESCE(excluded.continent, record_stages.continent),
+            updated_at = excluded.updated_at
+    ''', entries)
+    conn.commit()
+
+def prune_checkpoints(conn, source_sheet, through_row):
+    """Drop checkpoints the source watermark has moved past"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'DELETE FROM record_stages WHERE source_sheet = ? AND source_row <= ?',
+        (source_sheet, through_row)
+    )
+    conn.commit()
+
+def pending_checkpoints(conn, source_sheet):
+    """Count of checkpoints left by an interrupted run, by stage"""
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT stage, COUNT(*) FROM record_stages WHERE source_sheet = ? GROUP BY stage',
+        (source_sheet,)
+    )
+    return dict(cursor.fetchall())
@@ -0,0 +1,137 @@
+"""
+Sync Pairs Configuration for Online Campus
+Which form sheets feed which destination sheets. Each pair names a source
+spreadsheet (the Google Form responses) and a destination spreadsheet,
+plus the worksheet index of each:
+
+    {
+        "max_parallel": 4,
+        "pairs": [
+            {"name": "tkt", "source_sheet": "TKT_EFAMILY _FORM", "dest_sheet": "EFAMILY MAIN_20-10-25"},
+            {"name": "kochi", "source_sheet": "KOCHI_FORM", "dest_sheet": "KOCHI MAIN", "dest_tab": 0}
+        ]
+    }
+
+Without a config file the single built-in pair below is synced, so
+existing setups keep working unchanged. All state in sync_tracker.db is
+keyed by source or destination title, so every pair keeps its own
+watermark, checkpoints and member index. Two pairs cannot share a source
+sheet; pairs sharing a destination are synced one after the other.
+"""
+
+import json
+import os
+
+# Configuration
+SYNC_CONFIG = os.getenv('SYNC_CONFIG', 'sync_pairs.json')
+DEFAULT_SOURCE_SHEET = "TKT_EFAMILY _FORM"
+DEFAULT_DEST_SHEET = "EFAMILY MAIN_20-10-25"
+SOURCE_TAB = 0  # Form Responses 1
+DEST_TAB = 1    # Sheet2
+MAX_PARALLEL_PAIRS = int(os.getenv('MAX_PARALLEL_PAIRS', 4))
+
+DEFAULT_PAIR = {
+    'name': 'default',
+    'source_sheet': DEFAULT_SOURCE_SHEET,
+    'dest_sheet': DEFAULT_DEST_SHEET,
+    'source_tab': SOURCE_TAB,
+    'dest_tab': DEST_TAB,
+}
+
+# ============= LOADING =============
+def load_config(path=SYNC_CONFIG, names=None):
+    """
+    Return (pairs, max_parallel): the built-in pair when there is no config
+    file, and only the pairs called `names` when given.
+    """
+    if not os.path.exists(path):
+        return select_pairs([dict(DEFAULT_PAIR)], names), MAX_PARALLEL_PAIRS
+
+    with open(path) as f:
+        config = json.load(f)
+    entries = config.get('pairs') if isinstance(config, dict) else None
+    if not entries:
+        raise ValueError(f"{path}: expected a non-empty \"pairs\" list")
+
+    pairs = []
+    for n, entry in enumerate(entries, 1):
+        missing = [key for key in ('source_sheet', 'dest_sheet') if not entry.get(key)]
+        if missing:
+            raise ValueError(f"{path}: pair {n} is missing {', '.join(missing)}")
+        pairs.append({
+            'name': str(entry.get('name') or f"pair{n}"),
+            'source_sheet': entry['source_sheet'],
+            'dest_sheet': entry['dest_sheet'],
+            'source_tab': int(entry.get('source_tab', SOURCE_TAB)),
+            'dest_tab': int(entry.get('dest_tab', DEST_TAB)),
+        })
+
+    # Watermarks and checkpoints are keyed by source title
+    for key in ('name', 'source_sheet'):
+        seen = set()
+        for pair in pairs:
+            if pair[key] in seen:
+                raise ValueError(f"{path}: {key} '{pair[key]}' is used by more than one pair")
+            seen.add(pair[key])
+
+    return select_pairs(pairs, names), int(config.get('max_parallel', MAX_PARALLEL_PAIRS))
+
+def select_pairs(pairs, names=None):
+    if not names:
+        return pairs
+    unknown = set(names) - {pair['name'] for pair in pairs}
+    if unknown:
+        raise ValueError(f"Unknown sync pair(s): {', '.join(sorted(unknown))}")
+    return [pair for pair in pairs if pair['name'] in names]
+
+def load_pairs(path=SYNC_CONFIG, names=None):
+    """The configured pairs, optionally only those called `names`"""
+    return load_config(path, names)[0]
+
+def first_pair(path=SYNC_CONFIG):
+    """The pair the single-pair stage scripts work on"""
+    return load_pairs(path)[0]
+
+def pair_groups(pairs):
+    """
+    Split pairs into groups that can run concurrently: pairs appending to
+    the same destination share a group and run in order, since both would
+    move the same destination tail.
+    """
+    groups = {}
+    for pair in pairs:
+        groups.setdefault(pair['dest_sheet'], []).append(pair)
+    return list(groups.values())
+
+# ============= DATABASE FUNCTIONS =============
+def init_last_sync(conn):
+    """Create the last_sync table (one row per sync, tagged with its destination)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS last_sync (
+            id INTEGER PRIMARY KEY,
+            last_email TEXT,
+            sync_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(last_sync)')}
+    if 'dest_sheet' not in columns:
+        # Rows from before multi-pair syncs belong to the built-in pair
+        cursor.execute('ALTER TABLE last_sync ADD COLUMN dest_sheet TEXT')
+        cursor.execute('UPDATE last_sync SET dest_sheet = ? WHERE dest_sheet IS NULL', (DEFAULT_DEST_SHEET,))
+    conn.commit()
+    return conn
+
+def get_last_email(conn, dest_sheet):
+    cursor = conn.cursor()
+    cursor.execute(
+        'SELECT last_email FROM last_sync WHERE dest_sheet = ? ORDER BY id DESC LIMIT 1',
+        (dest_sheet,)
+    )
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+def save_last_email(conn, dest_sheet, email):
+    cursor = conn.cursor()
+    cursor.execute('INSERT INTO last_sync (last_email, dest_sheet) VALUES (?, ?)', (email, dest_sheet))
+    conn.commit()
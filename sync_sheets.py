@@ -1,115 +1,98 @@
-import gspread
-from google.oauth2.service_account import Credentials
 import sqlite3
-from openpyxl import Workbook
+from intermediate import TableWriter
 from datetime import datetime
+from source_watermark import init_watermark, read_since_watermark, save_watermark, stage_rows
+from dest_tail import init_dest_tail, get_dest_tail
+from chunked_upload import upload_rows, prune_upload_log
+from sheets_client import init_sheet_ids, open_worksheet
+from sync_config import first_pair, init_last_sync, get_last_email, save_last_email
 
 # Configuration
-SERVICE_ACCOUNT_FILE = 'credentials.json'
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
 DB_FILE = 'sync_tracker.db'
-SOURCE_SHEET = "TKT_EFAMILY _FORM"
-DEST_SHEET = "EFAMILY MAIN_20-10-25"
 
 # Setup database
 def init_db():
     conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS last_sync (
-            id INTEGER PRIMARY KEY,
-            last_email TEXT,
-            sync_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
+    init_last_sync(conn)
+    init_watermark(conn)
+    init_dest_tail(conn)
+    init_sheet_ids(conn)
     return conn
 
-def get_last_email(conn):
-    cursor = conn.cursor()
-    cursor.execute('SELECT last_email FROM last_sync ORDER BY id DESC LIMIT 1')
-    result = cursor.fetchone()
-    return result[0] if result else None
-
-def save_last_email(conn, email):
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO last_sync (last_email) VALUES (?)', (email,))
-    conn.commit()
-
 # Main sync logic
 def sync_sheets():
+    # The stage scripts hand off through fixed file names, so they sync one pair
+    pair = first_pair()
+    source, dest = pair['source_sheet'], pair['dest_sheet']
+    
     # Connect to database
     conn = init_db()
     
-    # Connect to Google Sheets
-    credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    
     # Open destination sheet and get last email
-    dest_workbook = gc.open(DEST_SHEET)
-    dest_sheet = dest_workbook.get_worksheet(1)  # Sheet2
-    dest_data = dest_sheet.get_all_values()
+    dest_sheet = open_worksheet(conn, dest, pair['dest_tab'])
+    dest_last_row, current_last_email = get_dest_tail(conn, dest, dest_sheet)
     
-    if len(dest_data) > 0:
-        current_last_email = dest_data[-1][0]  # Email is in first column
+    if dest_last_row > 0:
         print(f"Current last email in destination: {current_last_email}")
     else:
-        current_last_email = None
         print("Destination sheet is empty")
     
     # Get stored last email from database
-    stored_last_email = get_last_email(conn)
+    stored_last_email = get_last_email(conn, dest)
     print(f"Stored last email from previous run: {stored_last_email}")
     
     # Open source sheet
-    source_workbook = gc.open(SOURCE_SHEET)
-    source_sheet = source_workbook.sheet1
-    source_data = source_sheet.get_all_values()
-    
-    print(f"Total records in source: {len(source_data)}")
-    
-    # Find the position of stored email in source sheet
-    start_index = 0
-    if stored_last_email:
-        for i, row in enumerate(source_data):
-            if row[0] == stored_last_email:
-                start_index = i + 1  # Start from next record
-                print(f"Found last synced email at row {i+1}")
-                break
+    source_sheet = open_worksheet(conn, source, pair['source_tab'])
     
-    # Get new records to copy
-    new_records = source_data[start_index:]
+    # Read only the rows after the stored watermark when we have one
+    since_watermark = read_since_watermark(conn, source, source_sheet)
+    if since_watermark is not None:
+        first_row_number, new_records = since_watermark
+        header = source_sheet.row_values(1)
+        print(f"Reading source from row {first_row_number} (watermark)")
+    else:
+        source_data = source_sheet.get_all_values()
+        header = source_data[0] if len(source_data) > 0 else None
+        
+        print(f"Total records in source: {len(source_data)}")
+        
+        # Find the position of stored email in source sheet
+        start_index = 0
+        if stored_last_email:
+            for i, row in enumerate(source_data):
+                if row[0] == stored_last_email:
+                    start_index = i + 1  # Start from next record
+                    print(f"Found last synced email at row {i+1}")
+                    break
+        
+        # Get new records to copy
+        first_row_number = start_index + 1
+        new_records = source_data[start_index:]
     
     if len(new_records) > 0:
         print(f"Found {len(new_records)} new records to copy")
         
         # Append new records to destination
-        dest_sheet.append_rows(new_records)
+        upload_rows(conn, dest, dest_sheet, new_records)
         print(f"Copied {len(new_records)} records to destination")
         
-        # Save new records to Excel file
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Newcomers"
-        
-        # Add headers if available
-        if len(source_data) > 0:
-            ws.append(source_data[0])  # Assuming first row is header
+        # Save new records for the next stage (first row is the header)
+        output = TableWriter("newcomers", header or [f"Column {i + 1}" for i in range(len(new_records[0]))], title="Newcomers")
         
         # Add new records
         for record in new_records:
-            ws.append(record)
+            output.append(record)
         
-        filename = f"newcomers.xlsx"
-        wb.save(filename)
-        print(f"Saved {len(new_records)} new records to {filename}")
+        output.close()
+        print(f"Saved {len(new_records)} new records to {output.path}")
         
         # Save the new last email
         new_last_email = new_records[-1][0]
-        save_last_email(conn, new_last_email)
+        save_last_email(conn, dest, new_last_email)
+        prune_upload_log(conn, dest)
+        save_watermark(conn, source, first_row_number + len(new_records) - 1, new_records[-1])
+        # These rows are uploaded already, so upload_to_sheets has no watermark to move
+        stage_rows(conn, source, [])
         print(f"Saved new last email: {new_last_email}")
     else:
         print("No new records to copy")
@@ -1,94 +1,66 @@
-import gspread
-from google.oauth2.service_account import Credentials
-from openpyxl import Workbook
-import re
-
-# Path to your JSON credentials file
-SERVICE_ACCOUNT_FILE = 'credentials.json'  # Update this path
-
-# Setup credentials
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
-credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-
-# Connect to Google Sheets
-gc = gspread.authorize(credentials)
+from intermediate import TableWriter
+from source_watermark import init_watermark, read_since_watermark, save_watermark, stage_rows
+from dest_tail import init_dest_tail, get_dest_tail
+from email_index import init_email_index, reindex_source, find_source_row, locate_boundary
+from batch_validate import validate_batch
+from sheets_client import init_sheet_ids, open_worksheet, service_account_email
+from sync_config import first_pair
+import sqlite3
 
 # Configuration
-SOURCE_SHEET = "TKT_EFAMILY _FORM"
-DEST_SHEET = "EFAMILY MAIN_20-10-25"
-
-# Email validation function
-def is_valid_email(email):
-    if not email or len(email) < 3:
-        return False
-    # Strip whitespace before validation
-    email = email.strip()
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-# Name cleaning function
-def clean_name(name):
-    if not name:
-        return name
-    
-    # Remove titles like Dr., Mr., Mrs., Ms., Prof., etc.
-    name = re.sub(r'^(Dr\.?|Mr\.?|Mrs\.?|Ms\.?|Prof\.?|Rev\.?)\s+', '', name, flags=re.IGNORECASE)
-    
-    # Split name into parts
-    parts = name.split()
-    
-    # Remove single letter initials (with or without dot)
-    cleaned_parts = []
-    for part in parts:
-        # Remove dots and check if it's a single letter
-        clean_part = part.replace('.', '')
-        if len(clean_part) > 1:  # Keep only parts with more than 1 character
-            cleaned_parts.append(part)
-    
-    # Join the cleaned parts and add TKT ONLINE CAMPUS
-    cleaned_name = ' '.join(cleaned_parts)
-    if cleaned_name:
-        cleaned_name += ' TKT ONLINE CAMPUS'
-    
-    return cleaned_name
+DB_FILE = 'sync_tracker.db'
 
 try:
-    # Step 1: Get last email from EFAMILY MAIN Sheet2
-    print("Step 1: Getting last email from destination sheet...")
-    dest_workbook = gc.open(DEST_SHEET)
-    dest_sheet2 = dest_workbook.get_worksheet(1)
-    dest_data = dest_sheet2.get_all_values()
-    
-    if len(dest_data) == 0:
-        print("Destination sheet is empty!")
-        exit()
-    
-    last_email = dest_data[-1][0]
-    print(f"Last email in destination: {last_email}")
-    
-    # Step 2: Find that email in TKT_EFAMILY_FORM
-    print("\nStep 2: Searching for email in source sheet...")
-    source_workbook = gc.open(SOURCE_SHEET)
-    source_sheet = source_workbook.sheet1
-    source_data = source_sheet.get_all_values()
-    
-    # Find the row with last_email
-    start_row = None
-    for i, row in enumerate(source_data):
-        if len(row) > 0 and row[1] == last_email:  # Email Address is column 2 (index 1)
-            start_row = i + 1  # Start from next row
-            print(f"Found email at row {i+1}, will copy from row {start_row+1}")
-            break
-    
-    if start_row is None:
-        print(f"Email {last_email} not found in source sheet!")
-        exit()
-    
-    # Step 3: Get new records (skip timestamp column)
-    new_records = source_data[start_row:]
+    # The stage scripts hand off through fixed file names, so they sync one pair
+    pair = first_pair()
+    source, dest = pair['source_sheet'], pair['dest_sheet']
+    conn = init_sheet_ids(init_email_index(init_dest_tail(init_watermark(sqlite3.connect(DB_FILE)))))
+    source_sheet = open_worksheet(conn, source, pair['source_tab'])
+    
+    # Step 1: Try a range read after the stored watermark
+    print("Step 1: Checking sync watermark...")
+    since_watermark = read_since_watermark(conn, source, source_sheet)
+    
+    if since_watermark is not None:
+        start_row, new_records = since_watermark
+        print(f"Watermark valid, reading source from row {start_row}")
+    else:
+        # No usable watermark: get last email from EFAMILY MAIN Sheet2
+        print("No watermark, getting last email from destination sheet...")
+        dest_sheet2 = open_worksheet(conn, dest, pair['dest_tab'])
+        dest_last_row, last_email = get_dest_tail(conn, dest, dest_sheet2)
+        
+        if dest_last_row == 0:
+            print("Destination sheet is empty!")
+            exit()
+        
+        print(f"Last email in destination: {last_email}")
+        
+        # Step 2: Find that email in TKT_EFAMILY_FORM
+        print("\nStep 2: Searching for email in source sheet...")
+        boundary = locate_boundary(conn, source, source_sheet, last_email)
+        
+        if boundary is None:
+            # Not indexed yet: read the whole sheet once and index every email
+            source_data = source_sheet.get_all_values()
+            reindex_source(conn, source, source_data)
+            found_row = find_source_row(conn, source, last_email)  # Email Address is column 2 (index 1)
+            if found_row is not None:
+                boundary = (found_row, source_data[found_row - 1:])
+        
+        if boundary is None:
+            print(f"Email {last_email} not found in source sheet!")
+            exit()
+        
+        found_row, rows = boundary
+        start_row = found_row + 1
+        print(f"Found email at row {found_row}, will copy from row {start_row}")
+        
+        # The destination already has this row, so it is a safe watermark
+        save_watermark(conn, source, found_row, rows[0])
+        
+        # Step 3: Get new records (skip timestamp column)
+        new_records = rows[1:]
     
     if len(new_records) == 0:
         print("\nNo new records to copy!")
@@ -96,35 +68,36 @@ try:
     
     print(f"\nStep 3: Found {len(new_records)} new records")
     
-    # Step 4: Create Excel file with specific columns
+    # Step 4: Create the newcomers table with specific columns
     # Columns: Email Address (1), Name (2), City (3), Phone number (4)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Newcomers"
-    
-    # Add headers
-    ws.append(["Email Address", "Name", "City", "Phone number  (WhatsApp Number preferred with country code) e.g.:  +91 90000 3355"])
+    output = TableWriter(
+        "newcomers",
+        ["Email Address", "Name", "City", "Phone number  (WhatsApp Number preferred with country code) e.g.:  +91 90000 3355"],
+        title="Newcomers"
+    )
     
     # Add new records (skip timestamp column 0, take columns 1-4)
-    # Filter out invalid emails
-    valid_count = 0
-    invalid_count = 0
-    
-    for record in new_records:
-        if len(record) >= 5:
-            email = record[1].strip()  # Strip whitespace
-            if is_valid_email(email):
-                name = clean_name(record[2])  # Clean the name
-                ws.append([email, name, record[3], record[4]])
-                valid_count += 1
-            else:
-                invalid_count += 1
-                print(f"Skipped invalid email: '{record[1]}'")
-    
-    filename = "newcomers.xlsx"
-    wb.save(filename)
-    print(f"\nSaved {valid_count} valid records to {filename}")
-    print(f"Skipped {invalid_count} records with invalid emails")
+    # Validate emails and clean names for all records at once
+    numbered = [(row_number, record) for row_number, record in enumerate(new_records, start_row) if len(record) >= 5]
+    valid, emails, names, rejections = validate_batch(
+        [record[1] for _, record in numbered],
+        [record[2] for _, record in numbered]
+    )
+    
+    staged = []
+    for (row_number, record), is_valid, email, name in zip(numbered, valid, emails, names):
+        if is_valid:
+            output.append([email, name, record[3], record[4]])
+            staged.append((row_number, record))
+        else:
+            print(f"Skipped invalid email: '{record[1]}'")
+    valid_count = len(staged)
+    
+    output.close()
+    # upload_to_sheets moves the watermark onto these rows as it uploads them
+    stage_rows(conn, source, staged)
+    print(f"\nSaved {valid_count} valid records to {output.path}")
+    print(f"Skipped {sum(rejections.values())} records with invalid emails {rejections}")
     print("Columns: Email Address, Name, City, Phone number")
         
 except Exception as e:
@@ -132,4 +105,4 @@ except Exception as e:
     print("\nMake sure to:")
     print("1. Put your JSON file in the same directory as this script")
     print("2. Update SHEET_NAME with your actual sheet name")
-    print("3. Share your sheet with:", credentials.service_account_email if 'credentials' in locals() else "the service account email")
\ No newline at end of file
+    print("3. Share your sheet with:", service_account_email())
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Unknown Row Backfill for Online Campus
+Keeps an index of destination rows uploaded with Country/Continent
+"Unknown" (OpenAI errored, or the city could not be placed), keyed by
+destination sheet and row number, with the row's email, city and phone.
+
+Running this file re-enriches only those rows through the gazetteer, city
+cache and batched OpenAI path, and patches them in place with one
+batch_update of their Country/Continent cells (and the phone, when it
+could only be normalized once the country is known), written through
+dest_patch so neighbouring rows go out as one range. The sheet is not
+downloaded or uploaded again: the only read is a check that each indexed
+row still holds the same email.
+
+    python unknown_backfill.py                # backfill every pair
+    python unknown_backfill.py --pair kochi   # one pair
+    python unknown_backfill.py --scan         # first index Unknown rows already in the sheet
+"""
+
+import argparse
+import os
+import sqlite3
+
+from dotenv import load_dotenv
+
+from dest_patch import patch_cells, read_rows, PHONE, COUNTRY, CONTINENT
+from email_index import normalize_email
+from phone_normalize import normalize_phones, sheet_phone, OK as PHONE_OK
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+DB_FILE = 'sync_tracker.db'
+MAX_BACKFILL_ATTEMPTS = int(os.getenv('MAX_BACKFILL_ATTEMPTS', 3))  # then left for a --retry-all run
+UNKNOWN_VALUE = 'Unknown'
+DEST_RANGE_END = 'F'
+
+# ============= DATABASE FUNCTIONS =============
+def init_failed_rows(conn):
+    """Create the failed row index if it does not exist"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS failed_rows (
+            dest_sheet TEXT NOT NULL,
+            dest_row INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            city TEXT,
+            phone TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (dest_sheet, dest_row)
+        )
+    ''')
+    conn.commit()
+    return conn
+
+def record_failed_rows(conn, dest_sheet, first_dest_row, rows):
+    """Index the Unknown rows of a block just written at first_dest_row; returns how many"""
+    entries = [
+        (dest_sheet, first_dest_row + offset, row[0], row[2], str(row[3]))
+        for offset, row in enumerate(rows)
+        if len(row) > 4 and row[4] == UNKNOWN_VALUE
+    ]
+    cursor = conn.cursor()
+    # A row number seen again means the sheet was rewritten there: the new row wins
+    cursor.executemany('''
+        INSERT OR REPLACE INTO failed_rows (dest_sheet, dest_row, email, city, phone)
+        VALUES (?, ?, ?, ?, ?)
+    ''', entries)
+    conn.commit()
+    return len(entries)
+
+def load_failed_rows(conn, dest_sheet, max_attempts=MAX_BACKFILL_ATTEMPTS):
+    """Indexed rows for a destination as dicts, in sheet order"""
+    cursor = conn.cursor()
+    query = 'SELECT dest_row, email, city, phone, attempts FROM failed_rows WHERE dest_sheet = ?'
+    params = [dest_sheet]
+    if max_attempts:
+        query += ' AND attempts < ?'
+        params.append(max_attempts)
+    cursor.execute(query + ' ORDER BY dest_row', params)
+    return [
+        {'dest_row': dest_row, 'email': email, 'city': city or '', 'phone': phone or '', 'attempts': attempts}
+        for dest_row, email, city, phone, attempts in cursor.fetchall()
+    ]
+
+def drop_failed_rows(conn, dest_sheet, dest_rows):
+    cursor = conn.cursor()
+    cursor.executemany(
+        'DELETE FROM failed_rows WHERE dest_sheet = ? AND dest_row = ?',
+        [(dest_sheet, dest_row) for dest_row in dest_rows]
+    )
+    conn.commit()
+
+def count_attempts(conn, dest_sheet, dest_rows):
+    cursor = conn.cursor()
+    cursor.executemany(
+        'UPDATE failed_rows SET attempts = attempts + 1 WHERE dest_sheet = ? AND dest_row = ?',
+        [(dest_sheet, dest_row) for dest_row in dest_rows]
+    )
+    conn.commit()
+
+# ============= SHEET ACCESS =============
+def scan_destination(conn, dest_sheet, worksheet):
+    """One full read of the destination, indexing every Unknown row in it"""
+    values = worksheet.get(f'A2:{DEST_RANGE_END}')
+    return record_failed_rows(conn, dest_sheet, 2, values)
+
+def still_in_place(worksheet, entries):
+    """
+    Split entries into (in place, moved): a row is in place if column A
+    still holds its email. One batch_get of the email cells, consecutive
+    rows read as one range.
+    """
+    current = read_rows(worksheet, [entry['dest_row'] for entry in entries], last_column='A')
+
+    in_place, moved = [], []
+    for entry in entries:
+        row = current.get(entry['dest_row'])
+        same = bool(row) and normalize_email(row[0]) == normalize_email(entry['email'])
+        (in_place if same else moved).append(entry)
+    return in_place, moved
+
+def build_patches(entries, infos):
+    """
+    {(row, col): value} cell changes for the rows that now resolve, plus
+    their row numbers. The phone is rewritten only when it did not parse
+    without a country and does with the new one.
+    """
+    resolved = [(entry, info) for entry, info in zip(entries, infos) if info['country'] != UNKNOWN_VALUE]
+    phones = [entry['phone'] for entry, _ in resolved]
+    before = normalize_phones(phones, [UNKNOWN_VALUE] * len(phones))
+    after = normalize_phones(phones, [info['country'] for _, info in resolved])
+
+    changes = {}
+    for (entry, info), (_, old_status), (phone, new_status) in zip(resolved, before, after):
+        row = entry['dest_row']
+        changes[(row, COUNTRY + 1)] = info['country']
+        changes[(row, CONTINENT + 1)] = info['continent']
+        if old_status != PHONE_OK and new_status == PHONE_OK:
+            changes[(row, PHONE + 1)] = sheet_phone(phone)
+    return changes, [entry['dest_row'] for entry, _ in resolved]
+
+# ============= BACKFILL =============
+def backfill_pair(conn, pair, max_attempts=MAX_BACKFILL_ATTEMPTS, scan=False):
+    """Re-enrich and patch one destination's Unknown rows; returns its counts"""
+    from async_enrich import enrich_concurrent
+    from run_report import stage_timer
+    from sheets_client import open_worksheet
+
+    dest = pair['dest_sheet']
+    counts = {'indexed': 0, 'moved': 0, 'patched': 0, 'still_unknown': 0}
+    print(f"\n▶️  {pair['name']}: {dest}")
+    worksheet = open_worksheet(conn, dest, pair['dest_tab'])
+
+    if scan:
+        with stage_timer('scan'):
+            found = scan_destination(conn, dest, worksheet)
+        print(f"      Indexed {found} Unknown rows from the sheet")
+
+    entries = load_failed_rows(conn, dest, max_attempts)
+    counts['indexed'] = len(entries)
+    if not entries:
+        print("✅ No Unknown rows to backfill!")
+        return counts
+
+    with stage_timer('verify'):
+        entries, moved = still_in_place(worksheet, entries)
+    if moved:
+        # Rows were deleted or sorted since the upload; --scan indexes them again
+        drop_failed_rows(conn, dest, [entry['dest_row'] for entry in moved])
+        counts['moved'] = len(moved)
+        print(f"      ⚠️  {len(moved)} rows no longer hold the indexed email, dropped from the index")
+    if not entries:
+        return counts
+
+    print(f"      Re-enriching {len(entries)} rows...")
+    with stage_timer('enrich'):
+        infos, _ = enrich_concurrent(entries, conn)
+
+    changes, patched = build_patches(entries, infos)
+    if changes:
+        with stage_timer('upload'):
+            patch_cells(worksheet, changes)
+        drop_failed_rows(conn, dest, patched)
+    counts['patched'] = len(patched)
+    counts['still_unknown'] = len(entries) - len(patched)
+    patched = set(patched)
+    count_attempts(conn, dest, [entry['dest_row'] for entry in entries if entry['dest_row'] not in patched])
+
+    print(f"      Patched: {counts['patched']}, Still Unknown: {counts['still_unknown']}")
+    return counts
+
+def backfill_unknown(pair_names=None, max_attempts=MAX_BACKFILL_ATTEMPTS, scan=False):
+    from run_report import init_runs, start_run, finish_run
+    from sheets_client import init_sheet_ids
+    from enrichment_cache import init_cache
+    from sync_config import load_pairs
+
+    print("=" * 60)
+    print("ONLINE CAMPUS UNKNOWN ROW BACKFILL")
+    print("=" * 60)
+
+    conn = init_failed_rows(init_runs(init_cache(init_sheet_ids(sqlite3.connect(DB_FILE)))))
+    run = start_run('unknown_backfill')
+    totals = {'indexed': 0, 'moved': 0, 'patched': 0, 'still_unknown': 0}
+    status = 'failed'
+    try:
+        for pair in load_pairs(names=pair_names):
+            for key, value in backfill_pair(conn, pair, max_attempts, scan).items():
+                totals[key] += value
+        status = 'completed' if totals['patched'] else 'no_new_records'
+    finally:
+        finish_run(conn, run, status, dict(totals, read=totals['indexed'], uploaded=totals['patched']))
+        conn.close()
+    return totals
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-enrich destination rows left with an Unknown country")
+    parser.add_argument('--pair', action='append', dest='pairs', metavar='NAME',
+                        help="only backfill this pair from the sync config (repeatable)")
+    parser.add_argument('--scan', action='store_true',
+                        help="first read the destination once and index the Unknown rows already in it")
+    parser.add_argument('--retry-all', action='store_true',
+                        help=f"also retry rows that stayed Unknown {MAX_BACKFILL_ATTEMPTS} times")
+    args = parser.parse_args()
+
+    try:
+        backfill_unknown(args.pairs, 0 if args.retry_all else MAX_BACKFILL_ATTEMPTS, args.scan)
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        exit(1)
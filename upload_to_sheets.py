@@ -1,80 +1,69 @@
-import gspread
-from google.oauth2.service_account import Credentials
-from openpyxl import load_workbook
+from chunked_upload import init_upload_log, upload_rows, prune_upload_log, UPLOAD_CHUNK_SIZE
+from intermediate import read_chunks
+from sheets_client import init_sheet_ids, open_worksheet
+from source_watermark import init_watermark, advance_watermark
+from sync_config import first_pair, init_last_sync, save_last_email
+from unknown_backfill import init_failed_rows, record_failed_rows
+import itertools
 import sqlite3
 
 # Configuration
-SERVICE_ACCOUNT_FILE = 'credentials.json'
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
-INPUT_FILE = "newcomers_final.xlsx"
-DEST_SHEET = "EFAMILY MAIN_20-10-25"
+INPUT_NAME = "newcomers_final"
 DB_FILE = 'sync_tracker.db'
 
 def init_db():
     """Initialize database for tracking last email"""
     conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS last_sync (
-            id INTEGER PRIMARY KEY,
-            last_email TEXT,
-            sync_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
+    init_last_sync(conn)
+    init_upload_log(conn)
+    init_sheet_ids(conn)
+    init_failed_rows(conn)
+    init_watermark(conn)
     return conn
 
-def save_last_email(conn, email):
-    """Save the last processed email to database"""
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO last_sync (last_email) VALUES (?)', (email,))
-    conn.commit()
-
 def upload_to_sheets():
+    # The stage scripts hand off through fixed file names, so they sync one pair
+    pair = first_pair()
+    source, dest = pair['source_sheet'], pair['dest_sheet']
+    
     # Initialize database
     conn = init_db()
     
-    # Load Excel file
-    print(f"Loading {INPUT_FILE}...")
-    wb = load_workbook(INPUT_FILE)
-    ws = wb.active
-    
-    # Read all data except header
-    data = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        data.append(list(row))
+    # Stream the final table one upload chunk at a time
+    print(f"Loading {INPUT_NAME}...")
+    _, chunks = read_chunks(INPUT_NAME, UPLOAD_CHUNK_SIZE)
+    first_chunk = next(chunks, None)
     
-    print(f"Found {len(data)} records to upload")
-    
-    if len(data) == 0:
+    if first_chunk is None:
         print("No data to upload!")
         return
     
-    # Connect to Google Sheets
-    print("\nConnecting to Google Sheets...")
-    credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    
     # Open destination sheet
-    print(f"Opening {DEST_SHEET}...")
-    dest_workbook = gc.open(DEST_SHEET)
-    dest_sheet2 = dest_workbook.get_worksheet(1)  # Sheet2
-    
-    # Append all records
-    print(f"\nUploading {len(data)} records to Sheet2...")
-    dest_sheet2.append_rows(data)
+    print(f"\nOpening {dest}...")
+    dest_sheet2 = open_worksheet(conn, dest, pair['dest_tab'])
     
-    # Get the last email
-    last_email = data[-1][0]  # Email is in first column
+    # Append each chunk as it is read, resumable per chunk; once a chunk is in,
+    # the source watermark moves past the form rows it came from
+    print("\nUploading records to Sheet2...")
+    uploaded = 0
+    unknown = 0
+    last_email = None
+    for data in itertools.chain([first_chunk], chunks):
+        for first_dest_row, chunk in upload_rows(conn, dest, dest_sheet2, data):
+            if first_dest_row:
+                unknown += record_failed_rows(conn, dest, first_dest_row, chunk)
+            uploaded += len(chunk)
+            advance_watermark(conn, source, uploaded)
+        last_email = data[-1][0]  # Email is in first column
     
     # Save to database
-    save_last_email(conn, last_email)
+    save_last_email(conn, dest, last_email)
+    prune_upload_log(conn, dest)
     
-    print(f"\n✅ Successfully uploaded {len(data)} records to {DEST_SHEET} Sheet2")
+    print(f"\n✅ Successfully uploaded {uploaded} records to {dest} Sheet2")
     print(f"📧 Last email stored: {last_email}")
+    if unknown:
+        print(f"❓ {unknown} rows with an Unknown country (run unknown_backfill.py to retry them)")
     
     conn.close()
 
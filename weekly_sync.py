@@ -1,278 +1,653 @@
 """
 Complete Weekly Sync Script for Online Campus
-This script performs the following steps:
-1. Get last email from EFAMILY MAIN Sheet2
-2. Find that email in TKT_EFAMILY_FORM and extract new records
-3. Validate emails and clean names
-4. Enrich data with OpenAI (country, continent, phone validation)
-5. Clean phone numbers (remove spaces, +, -)
-6. Upload to Google Sheets Sheet2
-7. Store last email for next sync
+For every source/destination pair in the sync config (see sync_config.py;
+by default TKT_EFAMILY_FORM -> EFAMILY MAIN Sheet2), this script performs
+the following steps:
+1. Read the source rows after the stored watermark (or, on the first run,
+   after the last email of the destination sheet); on a full-diff run,
+   compare the whole form with its snapshot (see source_snapshot.py) to
+   also find edited and deleted responses
+2. Stream the inserted rows, page by page, through the pipeline stages:
+   - validate emails and clean names
+   - merge near-duplicate registrations (same phone and name, Gmail aliases)
+   - enrich data (country, continent) from the gazetteer, cache, then OpenAI
+   - normalize phone numbers to E.164 for the member's country
+   - upload to the destination sheet in chunks
+3. Patch the destination rows of members whose response was edited
+4. Settle the snapshot and store last email and source watermark
+
+A run with nothing new is one small range read. The diff reads the whole
+form (one range read per SNAPSHOT_PAGE_SIZE rows), so it only runs with
+--full-diff, or every SOURCE_DIFF_EVERY-th run of a pair when that is
+set; edits and deletes made in between are picked up by the next diff.
+
+Stages are connected by bounded queues (see pipeline.py), so memory stays
+flat and the first rows are uploaded while later ones are still enriching.
+Pairs with different destinations sync concurrently, sharing the OpenAI
+and Sheets rate limits.
+
+`python weekly_sync.py --check` only reports how many source rows are
+waiting. gspread, openai and pyarrow are imported when a stage first needs
+them, so the check and runs with nothing to sync start quickly.
 """
 
-import gspread
-from google.oauth2.service_account import Credentials
-from openpyxl import Workbook
-from openai import OpenAI
 from dotenv import load_dotenv
+from sheets_client import init_sheet_ids, open_worksheet
+from enrichment_cache import init_cache, cache_summary
+from gazetteer import gazetteer_summary
+from batch_enrich import BATCH_SIZE
+from async_enrich import enrich_concurrent, MAX_IN_FLIGHT
+from source_watermark import (
+    init_watermark, read_since_watermark, save_watermark,
+    get_watermark, count_since_watermark
+)
+from dest_tail import init_dest_tail, get_dest_tail, get_cached_tail
+from chunked_upload import init_upload_log, upload_rows, prune_upload_log, UPLOAD_CHUNK_SIZE
+from pipeline import PAGE_SIZE, threaded, rechunk, fetch_pages
+from email_index import (
+    init_email_index, index_source_rows, index_numbered_rows, reindex_source, find_source_row, locate_boundary,
+    find_member_rows, normalize_email,
+    member_count, seed_from_destination, drop_known_members, add_members
+)
+from stage_checkpoint import (
+    init_checkpoints, load_checkpoints, save_checkpoints, prune_checkpoints, pending_checkpoints,
+    VALIDATED, ENRICHED, UPLOADED, MERGED
+)
+from member_dedup import DuplicateIndex, merge_near_duplicates
+from parallel_clean import validate_batch, normalize_phones, regroup
+from run_report import init_runs, start_run, finish_run, stage_timer, timed, estimate_cost
+from phone_normalize import sheet_phone, OK as PHONE_OK
+from sync_config import load_config, load_pairs, pair_groups, init_last_sync, save_last_email
+from unknown_backfill import init_failed_rows, record_failed_rows
+from source_snapshot import (
+    init_snapshot, snapshot_size, load_snapshot, scan_changes, commit_scan,
+    diff_due, record_run, track_rows, append_rows
+)
+from dest_patch import read_rows, diff_rows, patch_cells, CITY, COUNTRY, CONTINENT
+import argparse
+import itertools
 import sqlite3
-import json
-import re
 import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
 # Configuration
-SERVICE_ACCOUNT_FILE = 'credentials.json'
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
-SOURCE_SHEET = "TKT_EFAMILY _FORM"
-DEST_SHEET = "EFAMILY MAIN_20-10-25"
 DB_FILE = 'sync_tracker.db'
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+ENRICH_BATCH_SIZE = int(os.getenv('ENRICH_BATCH_SIZE', BATCH_SIZE))
+ENRICH_GROUP_SIZE = ENRICH_BATCH_SIZE * MAX_IN_FLIGHT
+DB_TIMEOUT = 30  # seconds a stage waits for another stage's write to finish
+SOURCE_DIFF_EVERY = int(os.getenv('SOURCE_DIFF_EVERY', 0))  # 0: only with --full-diff
 
 # ============= DATABASE FUNCTIONS =============
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS last_sync (
-            id INTEGER PRIMARY KEY,
-            last_email TEXT,
-            sync_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
+def connect_db():
+    """
+    A connection for one pipeline stage. sqlite3 connections must not be
+    used by two threads at once, so every threaded stage gets its own (made
+    here, used only by the stage's worker thread). WAL lets the stages read
+    while another one writes; every write commits immediately.
+    """
+    conn = sqlite3.connect(DB_FILE, timeout=DB_TIMEOUT, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
     return conn
 
-def save_last_email(conn, email):
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO last_sync (last_email) VALUES (?)', (email,))
-    conn.commit()
+def init_db():
+    conn = connect_db()
+    init_last_sync(conn)
+    init_cache(conn)
+    init_watermark(conn)
+    init_dest_tail(conn)
+    init_upload_log(conn)
+    init_email_index(conn)
+    init_checkpoints(conn)
+    init_sheet_ids(conn)
+    init_runs(conn)
+    init_failed_rows(conn)
+    init_snapshot(conn)
+    return conn
 
-# ============= VALIDATION FUNCTIONS =============
-def is_valid_email(email):
-    if not email or len(email) < 3:
-        return False
-    email = email.strip()
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+# ============= PIPELINE STAGES =============
+# Each stage takes an iterable of chunks and yields chunks, so the whole
+# sync streams: the first upload starts while later pages are still being
+# read and enriched.
 
-def clean_name(name):
-    if not name:
-        return name
+def validate_chunk(conn, pair, chunk, stats):
+    index_numbered_rows(conn, pair['source_sheet'], chunk)
+    stats['read'] += len(chunk)
     
-    # Remove titles
-    name = re.sub(r'^(Dr\.?|Mr\.?|Mrs\.?|Ms\.?|Prof\.?|Rev\.?)\s+', '', name, flags=re.IGNORECASE)
+    # Validate emails and clean names a whole chunk at a time
+    chunk = [(row_number, record) for row_number, record in chunk if len(record) >= 5]
+    valid, emails, names, rejections = validate_batch(
+        [record[1] for _, record in chunk],
+        [record[2] for _, record in chunk]
+    )
+    stats['rejections'].update(rejections)
+    records = [
+        {
+            'source_row': row_number,
+            'email': email,
+            'name': name,
+            'city': record[3],
+            'phone': record[4]
+        }
+        for (row_number, record), is_valid, email, name in zip(chunk, valid, emails, names)
+        if is_valid
+    ]
     
-    # Split and remove single letter initials
-    parts = name.split()
-    cleaned_parts = []
-    for part in parts:
-        clean_part = part.replace('.', '')
-        if len(clean_part) > 1:
-            cleaned_parts.append(part)
+    # Resume rows an interrupted run already took further
+    checkpoints = load_checkpoints(conn, pair['source_sheet'], records)
+    fresh, kept = [], []
+    for record in records:
+        checkpoint = checkpoints.get(record['source_row'])
+        if checkpoint is None:
+            fresh.append(record)
+        elif checkpoint[0] in (UPLOADED, MERGED):
+            # Passed on only so merge_stage can match later rows against it
+            stats['resumed_uploaded'] += 1
+            record['uploaded'] = True
+        elif checkpoint[0] == ENRICHED:
+            record['country'], record['continent'] = checkpoint[1:]
+            stats['resumed_enriched'] += 1
+        kept.append(record)
     
-    # Add TKT ONLINE CAMPUS
-    cleaned_name = ' '.join(cleaned_parts)
-    if cleaned_name:
-        cleaned_name += ' TKT ONLINE CAMPUS'
-    
-    return cleaned_name
+    save_checkpoints(conn, pair['source_sheet'], fresh, VALIDATED)
+    return kept
 
-def clean_phone_number(phone):
-    if not phone:
-        return phone
-    return re.sub(r'[^0-9]', '', str(phone))
+def validate_stage(conn, pair, chunks, stats):
+    """(row_number, row) chunks -> record dicts with a valid email and cleaned name"""
+    for chunk in regroup(chunks):
+        with stage_timer('validate'):
+            kept = validate_chunk(conn, pair, chunk, stats)
+        if kept:
+            yield kept
 
-# ============= OPENAI ENRICHMENT =============
-def get_location_and_phone_info(city, phone):
-    prompt = f"""Given the following information:
-City: {city}
-Phone: {phone}
+def merge_stage(conn, pair, chunks, stats):
+    """Merge near-duplicate registrations into the first one seen"""
+    index = DuplicateIndex()
+    for records in chunks:
+        with stage_timer('merge'):
+            records, merged = merge_near_duplicates(index, records)
+            merged = [(duplicate, survivor) for duplicate, survivor in merged if not duplicate.get('uploaded')]
+            save_checkpoints(conn, pair['source_sheet'], [duplicate for duplicate, _ in merged], MERGED)
+        stats['near_duplicates'] += len(merged)
+        for duplicate, survivor in merged:
+            print(f"      🔗 {duplicate['email']} merged into {survivor}")
+        records = [record for record in records if not record.get('uploaded')]
+        if records:
+            yield records
 
-Please provide a JSON response with:
-1. country: The country name for this city
-2. continent: The continent name
-3. phone_corrected: The phone number with proper country code (if missing, add it based on the country)
+def drop_known_stage(conn, pair, chunks, stats):
+    """Drop members already in the destination, and repeats across chunks"""
+    seen = set()
+    for records in chunks:
+        with stage_timer('dedupe'):
+            records, duplicates = drop_known_members(conn, pair['dest_sheet'], records, seen)
+        stats['duplicates'] += len(duplicates)
+        if records:
+            yield records
 
-Format the response as valid JSON only, no additional text:
-{{
-    "country": "country name",
-    "continent": "continent name",
-    "phone_corrected": "phone with country code"
-}}"""
+def enrich_stage(conn, pair, chunks, stats, group_size=ENRICH_GROUP_SIZE):
+    """Enrich groups big enough to keep every concurrent OpenAI slot busy"""
+    for records in rechunk(chunks, group_size):
+        # Rows enriched before a crash keep their checkpointed result
+        pending = [record for record in records if 'country' not in record]
+        if pending:
+            with stage_timer('enrich'):
+                infos, usage = enrich_concurrent(pending, conn, ENRICH_BATCH_SIZE)
+                for key, value in usage.items():
+                    stats['usage'][key] = stats['usage'].get(key, 0) + value
+                for record, info in zip(pending, infos):
+                    record['country'] = info['country']
+                    record['continent'] = info['continent']
+                save_checkpoints(conn, pair['source_sheet'], pending, ENRICHED)
+        yield records
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that provides geographic and phone number information. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        return result, response.usage
-    except Exception as e:
-        print(f"  ⚠️  Error with OpenAI: {e}")
-        return {
-            "country": "Unknown",
-            "continent": "Unknown",
-            "phone_corrected": phone
-        }, None
+def phone_stage(chunks, stats):
+    for records in regroup(chunks):
+        with stage_timer('phones'):
+            phones = normalize_phones(
+                [record['phone'] for record in records],
+                [record['country'] for record in records]
+            )
+            for record, (phone, status) in zip(records, phones):
+                if status != PHONE_OK:
+                    stats['flagged'] += 1
+                    print(f"      ⚠️  {record['email']}: phone '{record['phone']}' flagged ({status})")
+                record['row'] = [
+                    record['email'],
+                    record['name'],
+                    record['city'],
+                    sheet_phone(phone),
+                    record['country'],
+                    record['continent']
+                ]
+        yield records
+
+def upload_stage(conn, pair, worksheet, chunks, stats):
+    """Append each UPLOAD_CHUNK_SIZE block as soon as it is ready"""
+    dest = pair['dest_sheet']
+    for records in rechunk(chunks, UPLOAD_CHUNK_SIZE):
+        rows = [record['row'] for record in records]
+        with stage_timer('upload'):
+            for first_dest_row, chunk in upload_rows(conn, dest, worksheet, rows):
+                add_members(conn, dest, [row[0] for row in chunk], first_dest_row)
+                if first_dest_row:
+                    stats['unknown'] += record_failed_rows(conn, dest, first_dest_row, chunk)
+            save_checkpoints(conn, pair['source_sheet'], records, UPLOADED)
+        stats['uploaded'] += len(rows)
+        stats['last_email'] = rows[-1][0]
+
+def update_stage(conn, pair, worksheet, updates, stats):
+    """
+    Patch the destination rows of members whose form response was edited.
+    The edited row is validated and cleaned like a new one; it is only
+    enriched again if its city changed (otherwise the destination's
+    country, possibly corrected by hand, is kept), and only the cells that
+    differ are written.
+    """
+    stats['edited'] += len(updates)
+    valid, emails, names, _ = validate_batch([row[1] for _, row in updates], [row[2] for _, row in updates])
+    records = [
+        {'source_row': row_number, 'email': email, 'name': name, 'city': row[3], 'phone': row[4]}
+        for (row_number, row), is_valid, email, name in zip(updates, valid, emails, names)
+        if is_valid
+    ]
+    
+    # Responses that never became a member row (merged, or dropped as repeats) have nothing to patch
+    member_rows = find_member_rows(conn, pair['dest_sheet'], [record['email'] for record in records])
+    records = [record for record in records if normalize_email(record['email']) in member_rows]
+    for record in records:
+        record['dest_row'] = member_rows[normalize_email(record['email'])]
+    current = read_rows(worksheet, [record['dest_row'] for record in records])
+    records = [
+        record for record in records
+        if current[record['dest_row']] and normalize_email(current[record['dest_row']][0]) == normalize_email(record['email'])
+    ]
+    if not records:
+        return
+    
+    for record in records:
+        row = current[record['dest_row']] + [''] * (CONTINENT + 1 - len(current[record['dest_row']]))
+        if row[CITY] == record['city']:
+            record['country'], record['continent'] = row[COUNTRY], row[CONTINENT]
+    pending = [record for record in records if 'country' not in record]
+    if pending:
+        infos, usage = enrich_concurrent(pending, conn, ENRICH_BATCH_SIZE)
+        for key, value in usage.items():
+            stats['usage'][key] = stats['usage'].get(key, 0) + value
+        for record, info in zip(pending, infos):
+            record['country'], record['continent'] = info['country'], info['continent']
+    
+    phones = normalize_phones([record['phone'] for record in records], [record['country'] for record in records])
+    changes = {}
+    for record, (phone, _) in zip(records, phones):
+        desired = [None, record['name'], record['city'], sheet_phone(phone), record['country'], record['continent']]
+        changes.update(diff_rows([current[record['dest_row']]], [desired], record['dest_row']))
+    if changes:
+        patch_cells(worksheet, changes)
+    stats['updated'] += len({row for row, _ in changes})
 
 # ============= MAIN SYNC FUNCTION =============
-def sync_weekly():
+# Pair statuses that mean the pair ran to the end
+OK_STATUSES = ('completed', 'no_new_records', 'no_valid_records')
+COUNT_KEYS = ('read', 'duplicates', 'near_duplicates', 'flagged', 'uploaded', 'unknown',
+              'edited', 'updated', 'deleted', 'resumed_enriched', 'resumed_uploaded')
+
+def new_stats():
+    return {'read': 0, 'rejections': Counter(), 'duplicates': 0, 'near_duplicates': 0, 'flagged': 0, 'uploaded': 0, 'unknown': 0,
+            'edited': 0, 'updated': 0, 'deleted': 0,
+            'resumed_enriched': 0, 'resumed_uploaded': 0, 'last_email': None, 'usage': {}}
+
+def pair_counts(stats):
+    counts = {key: stats[key] for key in COUNT_KEYS}
+    counts['invalid'] = sum(stats['rejections'].values())
+    return counts
+
+def overall_status(statuses):
+    """
+    One status for the run report from the status of every pair. A pair
+    that did not finish (failed, boundary_not_found, empty_destination)
+    makes the run partial if another pair uploaded rows, else failed.
+    """
+    if len(set(statuses)) == 1:
+        return statuses[0]
+    if any(status not in OK_STATUSES for status in statuses):
+        return 'partial' if 'completed' in statuses else 'failed'
+    return 'completed' if 'completed' in statuses else 'no_new_records'
+
+def sync_weekly(pair_names=None, full_diff=False):
     print("=" * 60)
     print("ONLINE CAMPUS WEEKLY SYNC")
     print("=" * 60)
     
     # Initialize database
     conn = init_db()
+    pairs, max_parallel = load_config(names=pair_names)
     
-    # Connect to Google Sheets
-    print("\n[1/7] Connecting to Google Sheets...")
-    credentials = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=SCOPES)
-    gc = gspread.authorize(credentials)
-    
-    # Step 1: Get last email from destination
-    print("[2/7] Getting last email from EFAMILY MAIN Sheet2...")
-    dest_workbook = gc.open(DEST_SHEET)
-    dest_sheet2 = dest_workbook.get_worksheet(1)
-    dest_data = dest_sheet2.get_all_values()
-    
-    if len(dest_data) == 0:
-        print("❌ Destination sheet is empty!")
-        return
-    
-    last_email = dest_data[-1][0]
-    print(f"      Last email: {last_email}")
-    
-    # Step 2: Find email in source and get new records
-    print("[3/7] Searching for new records in TKT_EFAMILY_FORM...")
-    source_workbook = gc.open(SOURCE_SHEET)
-    source_sheet = source_workbook.sheet1
-    source_data = source_sheet.get_all_values()
+    # Every run, including failed ones, leaves a report and a row in runs
+    run = start_run('weekly_sync')
+    results = {pair['name']: {'status': 'failed', 'stats': new_stats(), 'seconds': None} for pair in pairs}
+    errors = []
+    try:
+        # Pairs with different destinations are independent and run side by
+        # side; OpenAI and Sheets calls share the process-wide rate limits
+        groups = pair_groups(pairs)
+        if len(groups) == 1:
+            sync_group(groups[0], results, errors, full_diff)
+        else:
+            print(f"\nSyncing {len(pairs)} pairs, up to {min(max_parallel, len(groups))} at a time")
+            with ThreadPoolExecutor(max_workers=min(max_parallel, len(groups))) as pool:
+                list(pool.map(lambda group: sync_group(group, results, errors, full_diff), groups))
+    finally:
+        counts = {key: 0 for key in COUNT_KEYS + ('invalid',)}
+        for result in results.values():
+            for key, value in pair_counts(result['stats']).items():
+                counts[key] += value
+        if len(pairs) > 1:
+            counts['pairs'] = {
+                name: dict(pair_counts(result['stats']), status=result['status'], seconds=result['seconds'])
+                for name, result in results.items()
+            }
+        finish_run(conn, run, overall_status([result['status'] for result in results.values()]), counts)
+        conn.close()
     
-    start_row = None
-    for i, row in enumerate(source_data):
-        if len(row) > 0 and row[1] == last_email:
-            start_row = i + 1
-            break
+    if len(pairs) > 1:
+        print_pair_summary(results)
+    if errors:
+        raise errors[0]
+
+def sync_group(group, results, errors, full_diff=False):
+    """Sync pairs that share a destination, one after the other"""
+    for pair in group:
+        result = results[pair['name']]
+        start = time.perf_counter()
+        conn = connect_db()
+        try:
+            result['status'] = run_sync(conn, pair, result['stats'], full_diff)
+        except Exception as e:
+            errors.append(e)
+            print(f"\n❌ {pair['name']}: {e}")
+        finally:
+            conn.close()
+            result['seconds'] = round(time.perf_counter() - start, 3)
+
+def print_pair_summary(results):
+    print("\n" + "=" * 60)
+    print(f"{'pair':<20}{'status':<18}{'read':>8}{'uploaded':>10}{'seconds':>10}")
+    for name, result in results.items():
+        stats = result['stats']
+        print(f"{name:<20}{result['status']:<18}{stats['read']:>8}{stats['uploaded']:>10}{result['seconds'] or 0:>10.1f}")
+    print("=" * 60)
+
+def run_sync(conn, pair, stats, full_diff=False):
+    """Sync one source/destination pair; returns its status for the run report"""
+    source, dest = pair['source_sheet'], pair['dest_sheet']
+    print(f"\n▶️  {pair['name']}: {source} → {dest}")
     
-    if start_row is None:
-        print(f"❌ Email {last_email} not found in source sheet!")
-        return
+    # Connect to Google Sheets
+    print("[1/4] Connecting to Google Sheets...")
+    with stage_timer('connect'):
+        dest_sheet2 = open_worksheet(conn, dest, pair['dest_tab'])
+        source_sheet = open_worksheet(conn, source, pair['source_tab'])
     
-    new_records = source_data[start_row:]
+    # Step 1: Find the inserted (and, on a diff run, edited) source rows
+    state = {'updates': [], 'diff': full_diff or diff_due(conn, source, SOURCE_DIFF_EVERY), 'tail': [], 'last': None}
+    if state['diff']:
+        print(f"[2/4] Comparing {source} with its snapshot...")
+        with stage_timer('locate'):
+            chunks = find_changes(conn, pair, dest_sheet2, source_sheet, state)
+        if isinstance(chunks, str):
+            return chunks
+    else:
+        print(f"[2/4] Checking sync watermark for {source}...")
+        with stage_timer('locate'):
+            boundary = find_new_records(conn, pair, dest_sheet2, source_sheet)
+        if isinstance(boundary, str):
+            return boundary
+        first_row_number, new_records, more = boundary
+        chunks = None
+        if new_records:
+            chunks = timed('fetch', track_rows(fetch_pages(source_sheet, first_row_number, new_records, more, state), state))
     
-    if len(new_records) == 0:
+    if chunks is None and not state['updates']:
+        settle_source(conn, pair, state, stats)
         print("✅ No new records to sync!")
-        return
-    
-    print(f"      Found {len(new_records)} new records")
-    
-    # Step 3: Validate emails and clean names
-    print("[4/7] Validating emails and cleaning names...")
-    validated_records = []
-    invalid_count = 0
-    
-    for record in new_records:
-        if len(record) >= 5:
-            email = record[1].strip()
-            if is_valid_email(email):
-                name = clean_name(record[2])
-                validated_records.append({
-                    'email': email,
-                    'name': name,
-                    'city': record[3],
-                    'phone': record[4]
-                })
-            else:
-                invalid_count += 1
-    
-    print(f"      Valid: {len(validated_records)}, Invalid: {invalid_count}")
-    
-    if len(validated_records) == 0:
-        print("❌ No valid records to process!")
-        return
+        return 'no_new_records'
     
-    # Step 4: Enrich with OpenAI
-    print(f"[5/7] Enriching data with OpenAI ({len(validated_records)} records)...")
-    enriched_records = []
-    total_tokens = 0
+    # Drop members who are already in the destination (repeat submissions)
+    if member_count(conn, dest) == 0:
+        print(f"      Seeding email index from {dest}...")
+        with stage_timer('seed_index'):
+            seed_from_destination(conn, dest, dest_sheet2)
     
-    for idx, record in enumerate(validated_records, 1):
-        print(f"      [{idx}/{len(validated_records)}] {record['name'][:30]}...")
+    # Step 2: fetch -> validate and clean names -> merge near-duplicates -> drop members -> enrich -> phone -> upload
+    if chunks is not None:
+        print("[4/4] Streaming records: validate, enrich, normalize phones, upload...")
+        interrupted = pending_checkpoints(conn, source)
+        if interrupted:
+            print(f"      Resuming interrupted run: {interrupted}")
         
-        info, usage = get_location_and_phone_info(record['city'], record['phone'])
-        
-        if usage:
-            total_tokens += usage.total_tokens
-        
-        enriched_records.append({
-            'email': record['email'],
-            'name': record['name'],
-            'city': record['city'],
-            'phone': info['phone_corrected'],
-            'country': info['country'],
-            'continent': info['continent']
-        })
+        validate_conn, enrich_conn = connect_db(), connect_db()
+        pipeline = None
+        try:
+            with stage_timer('pipeline'):
+                chunks = threaded(validate_stage(validate_conn, pair, chunks, stats))
+                chunks = merge_stage(enrich_conn, pair, chunks, stats)
+                chunks = drop_known_stage(enrich_conn, pair, chunks, stats)
+                chunks = threaded(enrich_stage(enrich_conn, pair, chunks, stats))
+                pipeline = threaded(phone_stage(chunks, stats))
+                upload_stage(conn, pair, dest_sheet2, pipeline, stats)
+        finally:
+            # Stop and join the stage threads (e.g. after an upload error)
+            # before closing the connections they use
+            if pipeline is not None:
+                pipeline.close()
+            validate_conn.close()
+            enrich_conn.close()
     
-    print(f"      Tokens used: {total_tokens:,}")
+    # Step 3: Patch the rows of members who edited their response
+    if state['updates']:
+        print(f"      Patching {len(state['updates'])} edited responses in {dest}...")
+        with stage_timer('update'):
+            update_stage(conn, pair, dest_sheet2, state['updates'], stats)
     
-    # Step 5: Clean phone numbers
-    print("[6/7] Cleaning phone numbers...")
-    final_records = []
-    for record in enriched_records:
-        final_records.append([
-            record['email'],
-            record['name'],
-            record['city'],
-            clean_phone_number(record['phone']),
-            record['country'],
-            record['continent']
-        ])
+    usage = stats['usage']
+    total_tokens = usage.get('total_tokens', 0)
+    invalid = sum(stats['rejections'].values())
+    print(f"      Read: {stats['read']}, Invalid: {invalid}, Already members: {stats['duplicates']}, "
+          f"Near-duplicates merged: {stats['near_duplicates']}")
+    if invalid:
+        print(f"      Rejected: {dict(stats['rejections'])}")
+    if stats['edited']:
+        print(f"      Edited responses: {stats['edited']}, destination rows patched: {stats['updated']}")
+    if stats['resumed_enriched'] or stats['resumed_uploaded']:
+        print(f"      Resumed from checkpoints: {stats['resumed_enriched']} enriched, "
+              f"{stats['resumed_uploaded']} already uploaded or merged")
+    print(f"      Tokens used: {total_tokens:,}")
+    print(f"      City cache: {cache_summary()}")
+    print(f"      Gazetteer: {gazetteer_summary()}")
+    print(f"      Valid phones: {stats['uploaded'] - stats['flagged']}, Flagged: {stats['flagged']}")
+    if stats['unknown']:
+        print(f"      Unknown countries: {stats['unknown']} (run unknown_backfill.py to retry them)")
     
-    # Step 6: Upload to Google Sheets
-    print(f"[7/7] Uploading {len(final_records)} records to Google Sheets...")
-    dest_sheet2.append_rows(final_records)
+    # Every row read has been handled, so the watermark always advances
+    settle_source(conn, pair, state, stats)
+    if stats['uploaded'] == 0 and stats['updated'] == 0:
+        print("❌ No valid records to process!")
+        return 'no_valid_records'
     
-    # Save last email
-    last_email_new = final_records[-1][0]
-    save_last_email(conn, last_email_new)
+    # Save last email for the stage scripts
+    last_email_new = stats['last_email']
+    if last_email_new:
+        save_last_email(conn, dest, last_email_new)
+    prune_upload_log(conn, dest)
     
     print("\n" + "=" * 60)
-    print("✅ SYNC COMPLETED SUCCESSFULLY!")
+    print(f"✅ SYNC COMPLETED SUCCESSFULLY! ({pair['name']})")
     print("=" * 60)
-    print(f"📊 Records processed: {len(final_records)}")
+    print(f"📊 Records processed: {stats['uploaded']}")
+    if stats['updated']:
+        print(f"✏️  Rows updated in place: {stats['updated']}")
     print(f"📧 Last email stored: {last_email_new}")
     print(f"🤖 OpenAI tokens used: {total_tokens:,}")
     
-    # Calculate cost
-    input_cost = (total_tokens * 0.5 / 1_000_000) * 0.150
-    output_cost = (total_tokens * 0.5 / 1_000_000) * 0.600
-    total_cost = input_cost + output_cost
+    # Calculate cost from the exact prompt/completion split
+    total_cost = estimate_cost(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
     print(f"💰 Estimated cost: ${total_cost:.4f}")
     print("=" * 60)
+    return 'completed'
+
+def find_changes(conn, pair, dest_sheet2, source_sheet, state):
+    """
+    Start comparing the source with its snapshot. Returns the stream of
+    inserted-row chunks (None when there are none), or a status string
+    when there is nothing to sync from. Edited rows are in
+    state['updates'] once the stream has been read to the end.
+    """
+    source = pair['source_sheet']
+    baseline_row = None
+    if snapshot_size(conn, source) == 0:
+        # First run with a snapshot: start after the rows synced so far
+        print("      No snapshot yet, locating the last synced row once...")
+        boundary = find_new_records(conn, pair, dest_sheet2, source_sheet)
+        if isinstance(boundary, str):
+            return boundary
+        baseline_row = boundary[0] - 1
+        print(f"      Recording rows up to {baseline_row} as already synced")
     
-    conn.close()
+    print(f"[3/4] Reading {source} in pages and diffing row hashes...")
+    inserts = timed('fetch', scan_changes(load_snapshot(conn, source), source_sheet, state, baseline_row))
+    first = next(inserts, None)
+    if first is None:
+        return None
+    return itertools.chain([first], inserts)
+
+def settle_source(conn, pair, state, stats):
+    """After a finished run: settle the snapshot, then the watermark and checkpoints"""
+    source = pair['source_sheet']
+    if state['diff']:
+        deleted = commit_scan(conn, source, state)
+        stats['deleted'] += len(deleted)
+        if deleted:
+            # The destination keeps its members; the form rows are only forgotten
+            print(f"      Responses deleted from {source}: {len(deleted)} "
+                  f"(e.g. {', '.join(email for _, email in deleted[:3])})")
+    elif state['tail'] and snapshot_size(conn, source):
+        # Keep the snapshot current, so the next diff does not take these rows for new ones
+        append_rows(conn, source, state['tail'])
+    record_run(conn, source, state['diff'])
+    if state['last'] is not None:
+        save_watermark(conn, source, *state['last'])
+        prune_checkpoints(conn, source, state['last'][0])
+
+def find_new_records(conn, pair, dest_sheet2, source_sheet):
+    """
+    Return (first_row_number, new_records, more), or a status string when
+    there is nothing to sync from.
+    """
+    source, dest = pair['source_sheet'], pair['dest_sheet']
+    since_watermark = read_since_watermark(conn, source, source_sheet, limit=PAGE_SIZE)
+    
+    if since_watermark is not None:
+        first_row_number, new_records = since_watermark
+        more = len(new_records) == PAGE_SIZE
+        print(f"      Resuming after source row {first_row_number - 1}")
+        print("[3/4] Skipping full scan, watermark is valid")
+    else:
+        # Step 2: No usable watermark, locate last email from destination in source
+        print(f"      No watermark, getting last email from {dest}...")
+        dest_last_row, last_email = get_dest_tail(conn, dest, dest_sheet2)
+        
+        if dest_last_row == 0:
+            print("❌ Destination sheet is empty!")
+            return 'empty_destination'
+        
+        print(f"      Last email: {last_email} (row {dest_last_row})")
+        
+        print(f"[3/4] Searching for new records in {source}...")
+        boundary = locate_boundary(conn, source, source_sheet, last_email)
+        
+        if boundary is None:
+            # Not indexed yet: one full read, indexed in bulk so later lookups are O(1)
+            source_data = source_sheet.get_all_values()
+            reindex_source(conn, source, source_data)
+            start_row = find_source_row(conn, source, last_email)
+            if start_row is not None:
+                boundary = (start_row, source_data[start_row - 1:])
+        
+        if boundary is None:
+            print(f"❌ Email {last_email} not found in source sheet!")
+            return 'boundary_not_found'
+        
+        start_row, rows = boundary
+        print(f"      Found email at source row {start_row}")
+        
+        # Remember the boundary so the next run can do a range read
+        save_watermark(conn, source, start_row, rows[0])
+        first_row_number = start_row + 1
+        new_records = rows[1:]
+        more = False
+    
+    return first_row_number, new_records, more
+
+# ============= CHECK ONLY =============
+def check_pending(pair_names=None):
+    """Report how many source rows the next sync would read, without syncing"""
+    conn = init_db()
+    try:
+        return {pair['name']: count_pending(conn, pair) for pair in load_pairs(names=pair_names)}
+    finally:
+        conn.close()
+
+def count_pending(conn, pair):
+    source = pair['source_sheet']
+    source_sheet = open_worksheet(conn, source, pair['source_tab'])
+    pending = count_since_watermark(conn, source, source_sheet)
+    if pending is not None:
+        print(f"📋 {pair['name']}: {pending} pending rows (after source row {get_watermark(conn, source)[0]})")
+    else:
+        # No usable watermark: count from where the last synced email was indexed
+        tail = get_cached_tail(conn, pair['dest_sheet'])
+        start_row = find_source_row(conn, source, tail[1]) if tail else None
+        if start_row is None:
+            print(f"📋 {pair['name']}: pending rows unknown (no watermark yet, the next sync will scan the source)")
+            return None
+        pending = len(source_sheet.get(f'A{start_row + 1}:A'))
+        print(f"📋 {pair['name']}: {pending} pending rows (after source row {start_row}, from the email index)")
+    
+    interrupted = pending_checkpoints(conn, source)
+    if interrupted:
+        print(f"      Interrupted run to resume: {interrupted}")
+    return pending
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync new form responses into their destination sheets")
+    parser.add_argument('--check', action='store_true',
+                        help="only report how many source rows are waiting to be synced")
+    parser.add_argument('--pair', action='append', dest='pairs', metavar='NAME',
+                        help="only sync this pair from the sync config (repeatable)")
+    parser.add_argument('--full-diff', action='store_true',
+                        help="diff the whole form against its snapshot to also pick up edited and deleted responses")
+    args = parser.parse_args()
+    
+    if args.check:
+        try:
+            check_pending(args.pairs)
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            exit(1)
+        exit(0)
+    
     if not OPENAI_API_KEY:
         print("❌ Error: OPENAI_API_KEY not found in .env file")
         exit(1)
     
     try:
-        sync_weekly()
+        sync_weekly(args.pairs, args.full_diff)
     except Exception as e:
         print(f"\n❌ Error: {e}")
         import traceback
@@ -0,0 +1,52 @@
+"""
+Streaming Excel I/O for Online Campus
+The newcomers*.xlsx hand-off files are read with openpyxl's read-only
+mode and written with write-only workbooks, so each stage script holds
+at most one chunk of rows in memory no matter how large the export is.
+openpyxl is imported on first use, as most runs hand off Parquet instead.
+"""
+
+import os
+
+# Configuration
+CHUNK_ROWS = int(os.getenv('XLSX_CHUNK_ROWS', 5000))
+
+def iter_rows(path):
+    """
+    Yield every row of the active sheet as a list, header first, skipping
+    blank rows. The workbook is opened once: files from write-only
+    workbooks carry no dimension tag, so each open scans the whole sheet.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            if any(cell is not None for cell in row):
+                yield list(row)
+    finally:
+        wb.close()
+
+def read_chunks(path, size=CHUNK_ROWS):
+    """Return (header, chunks) where chunks yields lists of up to `size` data rows"""
+    rows = iter_rows(path)
+    header = next(rows, [])
+
+    def chunks():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    return header, chunks()
+
+def write_only_sheet(title):
+    """Return (workbook, worksheet) for streaming appends; save with wb.save()"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    return wb, wb.create_sheet(title)